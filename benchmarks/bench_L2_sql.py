@@ -0,0 +1,94 @@
+"""
+Benchmark of the L2 SQL layouts of KrackedWriter (L2_sql_layout="wide", "long", "blob").
+
+Writes synthetic L2 books through the writer's micro-batched SQL path, then reports
+for each layout and depth the insert rate (books/second), the database size, the rate
+at which all books of a symbol are read back as a wide DataFrame (KrackedDB.read_L2),
+and the rate of a top-of-book query over a time range. The wide layout cannot be
+created beyond SQLite's default limit of 2000 columns, i.e. at depth 1000.
+
+Usage:
+    python benchmarks/bench_L2_sql.py
+"""
+import os
+import queue
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from kracked.io import KrackedWriter, L2_unpack_blobs
+
+
+TOP_OF_BOOK = {
+    "wide": "SELECT ts_recv, bid_px_0, ask_px_0 FROM L2 WHERE symbol = ? AND ts_recv BETWEEN ? AND ?",
+    "long": "SELECT ts_recv, side, px FROM L2_long WHERE symbol = ? AND ts_recv BETWEEN ? AND ? AND level = 0",
+    "blob": "SELECT ts_recv, book FROM L2_blob WHERE symbol = ? AND ts_recv BETWEEN ? AND ?",
+}
+
+
+def _payloads(n_books, depth, seed=0):
+    rng = np.random.default_rng(seed)
+    levels = np.zeros((n_books, depth, 4))
+    levels[:, :, 0] = 60000.1 + np.arange(depth) * 0.1
+    levels[:, :, 2] = 60000.0 - np.arange(depth) * 0.1
+    levels[:, :, 1] = rng.random((n_books, depth))
+    levels[:, :, 3] = rng.random((n_books, depth))
+    return [{
+        "channel": "L2",
+        "symbol": "BTC/USD",
+        "depth": depth,
+        "timestamp": f"2026-10-17T00:00:00.{i:06d}Z",
+        "ts_recv": f"2026-10-17T00:00:00.{i:06d}+00:00",
+        "book": levels[i].reshape(-1),
+    } for i in range(n_books)]
+
+
+def _top_of_book(con, layout, start, end):
+    rows = con.execute(TOP_OF_BOOK[layout], ("BTC/USD", start, end)).fetchall()
+    if layout == "blob":
+        block = L2_unpack_blobs([r[1] for r in rows], len(rows[0][1]) // 32) if rows else None
+        return 0 if block is None else len(block[:, [0, 2]])
+    return len(rows)
+
+
+def main(batch=500):
+    print(f"{'layout':6s} {'depth':>6s} {'books':>7s} {'insert/s':>10s} {'MB':>8s} {'read/s':>10s} {'top q/s':>9s}")
+    for depth, n_books in [(10, 20000), (100, 5000), (1000, 500)]:
+        payloads = _payloads(n_books, depth)
+        for layout in ["wide", "long", "blob"]:
+            if layout == "wide" and 4 * depth + 3 > 2000:
+                print(f"{layout:6s} {depth:6d} {'n/a: more than 2000 columns':>48s}")
+                continue
+
+            with tempfile.TemporaryDirectory() as directory:
+                writer = KrackedWriter(queue.Queue(), output_directory=directory, output_mode="sql",
+                                       L2_sql_layout=layout, commit_every_rows=10**9)
+                start = time.perf_counter()
+                for i in range(0, n_books, batch):
+                    writer._dispatch_many(payloads[i:i + batch])
+                writer.commit()
+                insert_rate = n_books / (time.perf_counter() - start)
+
+                start = time.perf_counter()
+                df = writer.db.read_L2("BTC/USD", layout=layout, depth=depth)
+                read_rate = len(df) / (time.perf_counter() - start)
+                assert len(df) == n_books
+                writer.close()
+
+                db_path = f"{directory}/kracked_outputs.db"
+                size_mb = os.path.getsize(db_path) / 2**20
+                con = sqlite3.connect(db_path)
+                windows = [(payloads[i]["ts_recv"], payloads[i + 99]["ts_recv"]) for i in range(0, n_books - 100, 50)]
+                start = time.perf_counter()
+                for window in windows:
+                    _top_of_book(con, layout, *window)
+                query_rate = len(windows) / (time.perf_counter() - start)
+                con.close()
+
+            print(f"{layout:6s} {depth:6d} {n_books:7d} {insert_rate:10,.0f} {size_mb:8.1f} {read_rate:10,.0f} {query_rate:9,.0f}")
+
+
+if __name__ == "__main__":
+    main()
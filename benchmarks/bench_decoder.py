@@ -0,0 +1,95 @@
+"""
+Benchmark of the websocket message decoders available to the feeds.
+
+Builds synthetic Kraken v2 book (depth 100 snapshot and small update) and level3
+messages, then reports messages/second for each decoder backend, both for the raw
+decode and for the full KrakenL2._on_message path. With msgspec installed, the typed
+kracked.schema Structs are included as the "schema" backend.
+
+Usage:
+    python benchmarks/bench_decoder.py
+"""
+import json
+import queue
+import time
+
+from kracked.core import make_decoder, orjson, msgspec
+from kracked.feeds import KrakenL2
+
+if msgspec is not None:
+    from kracked.schema import make_struct_decoder
+
+
+def _book_snapshot(depth=100):
+    return json.dumps({"channel": "book", "type": "snapshot", "data": [{
+        "symbol": "BTC/USD", "checksum": 0, "timestamp": "2026-10-17T00:00:00.000000Z",
+        "bids": [{"price": 60000.1 - i * 0.1, "qty": 0.12345678} for i in range(depth)],
+        "asks": [{"price": 60000.2 + i * 0.1, "qty": 0.12345678} for i in range(depth)],
+    }]})
+
+
+def _book_update(i):
+    return json.dumps({"channel": "book", "type": "update", "data": [{
+        "symbol": "BTC/USD", "checksum": 0, "timestamp": "2026-10-17T00:00:01.000000Z",
+        "bids": [{"price": 60000.1 - (i % 100) * 0.1, "qty": 0.5 + (i % 7)}],
+        "asks": [],
+    }]})
+
+
+def _level3_update():
+    return json.dumps({"channel": "level3", "type": "update", "data": [{
+        "symbol": "BTC/USD", "checksum": 0,
+        "bids": [{"event": "add", "order_id": f"OABCDE-FGHIJ-KLMN{i}", "limit_price": 60000.1,
+                  "order_qty": 0.01, "timestamp": "2026-10-17T00:00:01.000000Z"} for i in range(5)],
+        "asks": [],
+    }]})
+
+
+def _rate(fn, messages, repeat=3):
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for m in messages:
+            fn(m)
+        best = max(best, len(messages) / (time.perf_counter() - start))
+    return best
+
+
+def main():
+    backends = ["json"]
+    if orjson is not None:
+        backends.append("orjson")
+    if msgspec is not None:
+        backends.append("msgspec")
+
+    samples = {
+        "book snapshot (depth 100)": [_book_snapshot()] * 2000,
+        "book update": [_book_update(i) for i in range(50000)],
+        "level3 update": [_level3_update()] * 50000,
+    }
+
+    print(f"{'message':28s} {'backend':8s} {'msgs/s':>12s}")
+    for name, messages in samples.items():
+        for backend in backends:
+            decode = make_decoder(backend)
+            print(f"{name:28s} {backend:8s} {_rate(decode, messages):12,.0f}")
+        if msgspec is not None:
+            decode = make_struct_decoder("level3" if name.startswith("level3") else "book")
+            print(f"{name:28s} {'schema':8s} {_rate(decode, messages):12,.0f}")
+
+    print()
+    print(f"{'KrakenL2._on_message':28s} {'backend':8s} {'msgs/s':>12s}")
+    updates = [_book_update(i) for i in range(50000)]
+    for backend in backends + (["schema"] if msgspec is not None else []):
+        feed = KrakenL2("BTC/USD", depth=100, log_book_every=1000, checksum_every=0)
+        feed.output_queue = queue.Queue()
+        if backend == "schema":
+            feed.set_decoder(use_schema=True)
+        else:
+            feed.set_decoder(backend)
+        feed._on_message(None, _book_snapshot())
+        print(f"{'book update':28s} {backend:8s} {_rate(lambda m: feed._on_message(None, m), updates, 1):12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
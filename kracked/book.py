@@ -0,0 +1,575 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from decimal import Decimal
+from operator import itemgetter, attrgetter
+from zlib import crc32 as CRC32
+from typing import List, Tuple, Union, Callable
+
+import numpy as np
+
+
+# Number of levels per side that Kraken includes in the book checksum.
+CHECKSUM_LEVELS = 10
+
+# Quantity precision of most Kraken pairs, used when the pair metadata is unknown.
+DEFAULT_QTY_PRECISION = 8
+
+# Level getters returning (price, qty) from decoded dict levels or typed struct levels.
+DICT_LEVEL = itemgetter("price", "qty")
+STRUCT_LEVEL = attrgetter("price", "qty")
+
+# Order getters returning (order_id, price, qty) from decoded dict or typed struct orders.
+DICT_ORDER = itemgetter("order_id", "limit_price", "order_qty")
+STRUCT_ORDER = attrgetter("order_id", "limit_price", "order_qty")
+
+
+def _checksum_digits(value: Union[float, str, Decimal], precision: Union[int, None]) -> str:
+    """
+    Format a price or quantity the way Kraken does for the book checksum: as text with
+    the pair precision, with the decimal point and any leading zeros removed. Text and
+    Decimal values are formatted through Decimal, so they keep their exact digits.
+    """
+    if precision is None:
+        text = str(value)
+    elif isinstance(value, (str, Decimal)):
+        text = f"{Decimal(value):.{precision}f}"
+    else:
+        text = f"{value:.{precision}f}"
+    return text.replace(".", "").lstrip("0")
+
+
+def _decimals(value: float) -> int:
+    """Number of decimals in the shortest text representation of a number."""
+    text = repr(value) if isinstance(value, float) else str(value)
+    if "e" in text or "." not in text:
+        return 0
+    return len(text) - text.index(".") - 1
+
+
+class BookSide:
+    """
+    One side of a price-level (L2) orderbook, kept sorted best-first.
+
+    Prices and quantities are stored in parallel lists alongside a list of sort
+    keys (the price for asks, the negated price for bids), so that a level can be
+    located with a binary search and inserted or deleted in place. This avoids the
+    re-sorting and dictionary rebuilding that would otherwise be required on every
+    update from the exchange.
+
+    A further parallel list caches the checksum text of each level. Entries are reset
+    whenever their level changes and only re-encoded when a checksum is requested.
+
+    Parameters
+    ----------
+    descending: bool
+        True for the bid side (best price is the highest), False for the ask side.
+    depth: int
+        The number of levels to retain after truncation.
+    """
+
+    def __init__(self, descending: bool, depth: int):
+        self.descending = descending
+        self.depth = depth
+        self._keys = []
+        self.prices = []
+        self.qtys = []
+        self._encoded = []
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def clear(self) -> None:
+        """Remove all levels from this side of the book."""
+        self._keys = []
+        self.prices = []
+        self.qtys = []
+        self._encoded = []
+
+    def update(self, price: float, qty: float, raw: Union[Tuple, None] = None) -> None:
+        """
+        Apply a single level update. A quantity of zero removes the level, any other
+        quantity inserts or replaces it.
+
+        Parameters
+        ----------
+        price: float
+            Price of the level.
+        qty: float
+            New total quantity resting at the level.
+        raw: Tuple or None
+            The (price, qty) as decoded from the message when they are not floats
+            (e.g. exact text), used for the checksum instead of the float values.
+        """
+        key = -price if self.descending else price
+        keys = self._keys
+        i = bisect_left(keys, key)
+        found = i < len(keys) and keys[i] == key
+
+        if qty == 0:
+            if found:
+                del keys[i]
+                del self.prices[i]
+                del self.qtys[i]
+                del self._encoded[i]
+        elif found:
+            self.qtys[i] = qty
+            self._encoded[i] = raw
+        else:
+            keys.insert(i, key)
+            self.prices.insert(i, price)
+            self.qtys.insert(i, qty)
+            self._encoded.insert(i, raw)
+
+    def truncate(self) -> List[float]:
+        """
+        Drop any levels beyond the configured depth.
+
+        Returns
+        -------
+        List[float]: The prices of the levels that were dropped (worst last).
+        """
+        if len(self._keys) <= self.depth:
+            return []
+
+        dropped = self.prices[self.depth:]
+        del self._keys[self.depth:]
+        del self.prices[self.depth:]
+        del self.qtys[self.depth:]
+        del self._encoded[self.depth:]
+        return dropped
+
+    def encoded_levels(self, n: int, encode: Callable) -> List[str]:
+        """
+        Return the checksum text of the best n levels, encoding only the levels that
+        changed since they were last encoded.
+
+        Parameters
+        ----------
+        n: int
+            Number of levels to return.
+        encode: Callable
+            Function mapping (price, qty) to the checksum text of a level.
+        """
+        encoded = self._encoded
+        for i in range(min(n, len(encoded))):
+            slot = encoded[i]
+            if slot is None:
+                encoded[i] = encode(self.prices[i], self.qtys[i])
+            elif type(slot) is tuple:
+                encoded[i] = encode(*slot)
+        return encoded[:n]
+
+    def items(self) -> List[Tuple[float, float]]:
+        """Return the (price, qty) levels ordered best-first."""
+        return list(zip(self.prices, self.qtys))
+
+    def to_dict(self) -> dict:
+        """Return a {price: qty} dictionary ordered best-first."""
+        return dict(zip(self.prices, self.qtys))
+
+
+class L2Book:
+    """
+    Price-level orderbook for a single symbol, maintained from Kraken v2 ``book``
+    snapshots and updates.
+
+    Levels are given as the dictionaries found in the Kraken messages, i.e.
+    ``{"price": float, "qty": float}``, or as any objects together with a level getter
+    returning (price, qty), e.g. STRUCT_LEVEL for the kracked.schema structs. Prices
+    and quantities decoded as text or Decimal are converted to float for the book,
+    while their exact text is kept for the checksum.
+
+    Alongside the sorted sides, the book owns a preallocated float64 array of
+    shape (depth, 4) holding ask px, ask sz, bid px and bid sz per level. Flattened,
+    a row of this array has the same column order as the wide L2 layout
+    (ask_px_0, ask_sz_0, bid_px_0, bid_sz_0, ask_px_1, ...), so a snapshot of the
+    book can be emitted as a single contiguous array without any formatting.
+
+    Parameters
+    ----------
+    depth: int
+        The number of levels to maintain on each side of the book.
+    price_precision: int or None
+        Number of decimals of the pair price (the price_precision of the Kraken
+        instrument channel), used when formatting the checksum text. If None, it is
+        inferred from the prices in each snapshot, which fails for snapshots whose
+        prices all end in zero.
+    qty_precision: int or None
+        Number of decimals of the pair quantity (qty_precision of the instrument
+        channel), used for the checksum text. If None, DEFAULT_QTY_PRECISION.
+    """
+
+    def __init__(self, depth: int, price_precision: Union[int, None] = None, qty_precision: Union[int, None] = None):
+        self.depth = depth
+        self.bids = BookSide(descending=True, depth=depth)
+        self.asks = BookSide(descending=False, depth=depth)
+        self.levels = np.zeros((depth, 4), dtype=np.float64)
+        self.price_precision = price_precision
+        self.qty_precision = DEFAULT_QTY_PRECISION if qty_precision is None else qty_precision
+        self._infer_precision = price_precision is None
+
+    def set_precision(self, price_precision: Union[int, None] = None, qty_precision: Union[int, None] = None) -> None:
+        """
+        Set the price and quantity precision of the pair, e.g. once its metadata is
+        known. None leaves a precision unchanged.
+        """
+        if price_precision is not None:
+            self.price_precision = price_precision
+            self._infer_precision = False
+        if qty_precision is not None:
+            self.qty_precision = qty_precision
+
+    @property
+    def ask_px(self) -> np.ndarray:
+        """View of the ask prices in the level array, shape (depth,)."""
+        return self.levels[:, 0]
+
+    @property
+    def ask_sz(self) -> np.ndarray:
+        """View of the ask sizes in the level array, shape (depth,)."""
+        return self.levels[:, 1]
+
+    @property
+    def bid_px(self) -> np.ndarray:
+        """View of the bid prices in the level array, shape (depth,)."""
+        return self.levels[:, 2]
+
+    @property
+    def bid_sz(self) -> np.ndarray:
+        """View of the bid sizes in the level array, shape (depth,)."""
+        return self.levels[:, 3]
+
+    def refresh_levels(self) -> np.ndarray:
+        """
+        Copy the current sorted levels into the preallocated level array. Levels
+        missing from a side that is shallower than the depth are left as zero.
+
+        Returns
+        -------
+        np.ndarray: The (depth, 4) level array, updated in place.
+        """
+        levels = self.levels
+        n_ask = len(self.asks)
+        n_bid = len(self.bids)
+        levels[:n_ask, 0] = self.asks.prices
+        levels[:n_ask, 1] = self.asks.qtys
+        levels[:n_bid, 2] = self.bids.prices
+        levels[:n_bid, 3] = self.bids.qtys
+        if n_ask < self.depth:
+            levels[n_ask:, 0:2] = 0.0
+        if n_bid < self.depth:
+            levels[n_bid:, 2:4] = 0.0
+        return levels
+
+    def snapshot(self) -> np.ndarray:
+        """
+        Return a flat copy of the book in the wide L2 column order, shape (4*depth,).
+        The copy is a single contiguous memcpy of the level array, so it can be safely
+        handed to another thread while the book keeps updating.
+        """
+        return self.refresh_levels().reshape(-1).copy()
+
+    def load_snapshot(self, bids: List[dict], asks: List[dict], level: Callable = DICT_LEVEL) -> None:
+        """
+        Reset the book from a snapshot message.
+
+        Parameters
+        ----------
+        bids: List[dict]
+            Bid levels from the snapshot.
+        asks: List[dict]
+            Ask levels from the snapshot.
+        level: Callable
+            Getter returning (price, qty) from a level.
+        """
+        self.bids.clear()
+        self.asks.clear()
+        if self._infer_precision:
+            self.price_precision = max(
+                [_decimals(level(lvl)[0]) for lvl in bids] + [_decimals(level(lvl)[0]) for lvl in asks],
+                default=None,
+            )
+        self.apply(bids, asks, level)
+
+    def apply(self, bids: List[dict], asks: List[dict], level: Callable = DICT_LEVEL) -> Tuple[List[float], List[float]]:
+        """
+        Apply the level updates from a single book message and truncate both sides
+        back to the book depth.
+
+        Parameters
+        ----------
+        bids: List[dict]
+            Bid level updates.
+        asks: List[dict]
+            Ask level updates.
+        level: Callable
+            Getter returning (price, qty) from a level.
+
+        Returns
+        -------
+        (List[float], List[float]): Prices of the bid and ask levels dropped by truncation.
+        """
+        bid_side = self.bids
+        for price, qty in map(level, bids):
+            if isinstance(price, float):
+                bid_side.update(price, qty)
+            else:
+                bid_side.update(float(price), float(qty), (price, qty))
+        dropped_bids = bid_side.truncate()
+
+        ask_side = self.asks
+        for price, qty in map(level, asks):
+            if isinstance(price, float):
+                ask_side.update(price, qty)
+            else:
+                ask_side.update(float(price), float(qty), (price, qty))
+        dropped_asks = ask_side.truncate()
+
+        return dropped_bids, dropped_asks
+
+    def _encode_level(self, price, qty) -> str:
+        return _checksum_digits(price, self.price_precision) + _checksum_digits(qty, self.qty_precision)
+
+    def checksum(self) -> int:
+        """
+        Compute the Kraken v2 CRC32 checksum of the book, built from the top 10 asks
+        followed by the top 10 bids.
+
+        Returns
+        -------
+        int: The unsigned CRC32 checksum.
+        """
+        text = "".join(self.asks.encoded_levels(CHECKSUM_LEVELS, self._encode_level))
+        text += "".join(self.bids.encoded_levels(CHECKSUM_LEVELS, self._encode_level))
+        return CRC32(text.encode("utf-8"))
+
+    def is_full(self) -> bool:
+        """Whether both sides of the book hold the full depth of levels."""
+        return len(self.bids) == self.depth and len(self.asks) == self.depth
+
+    def to_dict(self) -> dict:
+        """Return a {"bids": {...}, "asks": {...}} copy of the book."""
+        return {"bids": self.bids.to_dict(), "asks": self.asks.to_dict()}
+
+
+class L3Side:
+    """
+    One side of an order-by-order (L3) orderbook.
+
+    Each price level holds an OrderedDict of {order_id: qty} in time priority, so orders
+    join the back of the queue and can be removed from anywhere in it in O(1). The
+    prices of the non-empty levels are kept in a sorted list of keys (the price for
+    asks, the negated price for bids), so levels are created and removed with a binary
+    search and the best level is always the first key.
+
+    Parameters
+    ----------
+    descending: bool
+        True for the bid side (best price is the highest), False for the ask side.
+    """
+
+    def __init__(self, descending: bool):
+        self.descending = descending
+        self._keys = []
+        self.levels = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self) -> None:
+        """Remove all orders from this side of the book."""
+        self._keys = []
+        self.levels = {}
+
+    def add(self, order_id: str, price: float, qty: float) -> None:
+        """Append an order to the back of the queue at its price level."""
+        level = self.levels.get(price)
+        if level is None:
+            key = -price if self.descending else price
+            keys = self._keys
+            keys.insert(bisect_left(keys, key), key)
+            level = self.levels[price] = OrderedDict()
+        level[order_id] = qty
+
+    def remove(self, order_id: str, price: float) -> None:
+        """Remove an order from its price level, dropping the level once it is empty."""
+        level = self.levels[price]
+        del level[order_id]
+        if not level:
+            del self.levels[price]
+            key = -price if self.descending else price
+            keys = self._keys
+            del keys[bisect_left(keys, key)]
+
+    def prices(self, n: Union[int, None] = None) -> List[float]:
+        """Return the prices of the best n levels (all levels if None), best-first."""
+        keys = self._keys if n is None else self._keys[:n]
+        return [-k for k in keys] if self.descending else list(keys)
+
+    def best(self) -> Union[Tuple[float, float], None]:
+        """Return the (price, total qty) of the best level, or None if the side is empty."""
+        if not self._keys:
+            return None
+        price = -self._keys[0] if self.descending else self._keys[0]
+        return price, sum(self.levels[price].values())
+
+    def aggregate(self, n: Union[int, None] = None) -> List[Tuple[float, float, int]]:
+        """
+        Return the (price, total qty, number of orders) of the best n levels (all levels
+        if None), best-first.
+        """
+        out = []
+        for price in self.prices(n):
+            level = self.levels[price]
+            out.append((price, sum(level.values()), len(level)))
+        return out
+
+
+class L3Book:
+    """
+    Order-by-order orderbook for a single symbol, maintained from Kraken v2 ``level3``
+    snapshots and add/modify/delete events.
+
+    Orders are indexed by order_id in a dictionary holding their side and price, so
+    any event finds its order in O(1). Price levels are maintained in O(log n) by the
+    two L3Side instances, which also keep the FIFO queue of every level. Orders are
+    given as the dictionaries found in the Kraken messages, or as any objects together
+    with an order getter returning (order_id, price, qty), e.g. STRUCT_ORDER for the
+    kracked.schema structs.
+
+    Kraken keeps the queue priority of an order whose quantity is modified, so a
+    modify at the same price updates the order in place. A modify to a new price
+    moves the order to the back of the queue at that price.
+    """
+
+    def __init__(self):
+        self.bids = L3Side(descending=True)
+        self.asks = L3Side(descending=False)
+        self.orders = {}
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self.orders
+
+    def _side(self, side: str) -> L3Side:
+        if side == "b":
+            return self.bids
+        elif side == "a":
+            return self.asks
+        raise ValueError(f"Invalid side: {side}, select 'b' or 'a'.")
+
+    def load_snapshot(self, bids: List[dict], asks: List[dict], order: Callable = DICT_ORDER) -> None:
+        """
+        Reset the book from a snapshot message. Orders within a level are listed in
+        time priority by Kraken.
+
+        Parameters
+        ----------
+        bids: List[dict]
+            Bid orders from the snapshot.
+        asks: List[dict]
+            Ask orders from the snapshot.
+        order: Callable
+            Getter returning (order_id, price, qty) from an order.
+        """
+        self.bids.clear()
+        self.asks.clear()
+        self.orders = {}
+        for side, orders in (("b", bids), ("a", asks)):
+            for order_id, price, qty in map(order, orders):
+                self.add(side, order_id, float(price), float(qty))
+
+    def add(self, side: str, order_id: str, price: float, qty: float) -> None:
+        """Add a new order at the back of the queue at its price."""
+        if order_id in self.orders:
+            self.delete(order_id)
+        self._side(side).add(order_id, price, qty)
+        self.orders[order_id] = (side, price)
+
+    def modify(self, order_id: str, price: float, qty: float) -> None:
+        """Change the quantity or price of an order. Unknown order ids are ignored."""
+        entry = self.orders.get(order_id)
+        if entry is None:
+            return
+        side, old_price = entry
+        if price == old_price:
+            self._side(side).levels[price][order_id] = qty
+        else:
+            self.delete(order_id)
+            self.add(side, order_id, price, qty)
+
+    def delete(self, order_id: str) -> None:
+        """Remove an order from the book. Unknown order ids are ignored."""
+        entry = self.orders.pop(order_id, None)
+        if entry is not None:
+            side, price = entry
+            self._side(side).remove(order_id, price)
+
+    def apply_event(self, side: str, event: str, order_id: str, price: float, qty: float) -> None:
+        """
+        Apply a single level3 event.
+
+        Parameters
+        ----------
+        side: str
+            "b" for bids, "a" for asks.
+        event: str
+            "add", "modify" or "delete".
+        order_id: str
+            The Kraken order id.
+        price: float
+            The limit price of the order.
+        qty: float
+            The remaining quantity of the order.
+        """
+        if event == "add":
+            self.add(side, order_id, price, qty)
+        elif event == "modify":
+            self.modify(order_id, price, qty)
+        elif event == "delete":
+            self.delete(order_id)
+        else:
+            raise ValueError(f"Invalid L3 event: {event}")
+
+    def best_bid(self) -> Union[Tuple[float, float], None]:
+        """Return the (price, total qty) of the best bid, or None."""
+        return self.bids.best()
+
+    def best_ask(self) -> Union[Tuple[float, float], None]:
+        """Return the (price, total qty) of the best ask, or None."""
+        return self.asks.best()
+
+    def order(self, order_id: str) -> Union[Tuple[str, float, float], None]:
+        """Return the (side, price, qty) of an order, or None if it is not in the book."""
+        entry = self.orders.get(order_id)
+        if entry is None:
+            return None
+        side, price = entry
+        return side, price, self._side(side).levels[price][order_id]
+
+    def queue_position(self, order_id: str) -> Union[Tuple[int, float], None]:
+        """
+        Return the number of orders and the total quantity ahead of an order in the
+        queue at its price level, or None if the order is not in the book.
+        """
+        entry = self.orders.get(order_id)
+        if entry is None:
+            return None
+        side, price = entry
+        n_ahead = 0
+        qty_ahead = 0.0
+        for oid, qty in self._side(side).levels[price].items():
+            if oid == order_id:
+                break
+            n_ahead += 1
+            qty_ahead += qty
+        return n_ahead, qty_ahead
+
+    def to_dict(self, n: Union[int, None] = None) -> dict:
+        """Return {"bids": {price: qty}, "asks": {price: qty}} aggregates of the best n levels."""
+        return {
+            "bids": {p: q for p, q, _ in self.bids.aggregate(n)},
+            "asks": {p: q for p, q, _ in self.asks.aggregate(n)},
+        }
@@ -0,0 +1,194 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from typing import List, Tuple, Union
+
+
+# Column layouts of the tick buffers, as (name, kind). See ColumnarBuffer for the kinds.
+L3_COLUMNS = [
+    ("side", "category"),
+    ("ts_event", "iso_timestamp"),
+    ("ts_recv", "timestamp"),
+    ("price", "float64"),
+    ("size", "float64"),
+    ("action", "category"),
+    ("order_id", "string"),
+    ("symbol", "category"),
+]
+
+TRADE_COLUMNS = [
+    ("ts_event", "iso_timestamp"),
+    ("ts_recv", "timestamp"),
+    ("symbol", "category"),
+    ("price", "float64"),
+    ("qty", "float64"),
+    ("side", "category"),
+    ("ord_type", "category"),
+    ("trade_id", "int64"),
+]
+
+_NUMPY_KINDS = {"float64": np.float64, "int64": np.int64, "timestamp": np.int64, "category": np.int32}
+
+
+class ColumnarBuffer:
+    """
+    Growable, column-oriented buffer of ticks that is emitted as a pyarrow RecordBatch.
+
+    Each numeric column is a preallocated NumPy array that doubles in size when full,
+    so appending a tick writes a handful of scalars instead of allocating a new row
+    list. Low-cardinality text (sides, actions, symbols) is stored as int32 codes
+    into a per-column list of categories and becomes a dictionary array in the batch.
+    Timestamps are int64 epoch nanoseconds. Exchange timestamps arrive as ISO-8601
+    text and are kept as received, then parsed once per batch by Arrow.
+
+    Column kinds
+    ------------
+    "float64", "int64": Stored in a NumPy array of that type.
+    "timestamp": Epoch nanoseconds (e.g. time.time_ns()), stored as int64.
+    "iso_timestamp": ISO-8601 text, emitted as a UTC nanosecond timestamp column.
+    "category": Repeated strings, stored as int32 codes.
+    "string": Arbitrary text (e.g. order ids), kept in a list.
+
+    Parameters
+    ----------
+    columns: List[Tuple[str, str]]
+        The (name, kind) of each column, in row order.
+    capacity: int
+        The initial number of rows to preallocate.
+    """
+
+    def __init__(self, columns: List[Tuple[str, str]], capacity: int = 1024):
+        self.columns = columns
+        self.names = [name for name, _ in columns]
+        self.kinds = [kind for _, kind in columns]
+        self.capacity = max(int(capacity), 1)
+        self.n = 0
+
+        self._data = []
+        self._categories = {}
+        for name, kind in columns:
+            if kind in _NUMPY_KINDS:
+                self._data.append(np.zeros(self.capacity, dtype=_NUMPY_KINDS[kind]))
+            elif kind in ["string", "iso_timestamp"]:
+                self._data.append([])
+            else:
+                raise ValueError(f"Invalid column kind: {kind}")
+            if kind == "category":
+                self._categories[name] = {}
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _grow(self) -> None:
+        self.capacity *= 2
+        for i, kind in enumerate(self.kinds):
+            if kind in _NUMPY_KINDS:
+                grown = np.zeros(self.capacity, dtype=self._data[i].dtype)
+                grown[:self.n] = self._data[i][:self.n]
+                self._data[i] = grown
+
+    def append(self, row) -> None:
+        """
+        Append a single tick, given in column order.
+        """
+        n = self.n
+        if n == self.capacity:
+            self._grow()
+
+        data = self._data
+        for i, kind in enumerate(self.kinds):
+            value = row[i]
+            if kind == "category":
+                codes = self._categories[self.names[i]]
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(codes)
+                data[i][n] = code
+            elif kind in ["string", "iso_timestamp"]:
+                data[i].append(value)
+            else:
+                data[i][n] = value
+        self.n = n + 1
+
+    def clear(self) -> None:
+        """
+        Empty the buffer, keeping the allocated arrays and the category codes.
+        """
+        self.n = 0
+        for i, kind in enumerate(self.kinds):
+            if kind in ["string", "iso_timestamp"]:
+                self._data[i] = []
+
+    def to_record_batch(self) -> pa.RecordBatch:
+        """
+        Return the buffered ticks as a pyarrow RecordBatch. Numeric columns are copied
+        out of the buffer, so it can be cleared and reused straight away.
+        """
+        n = self.n
+        arrays = []
+        for i, (name, kind) in enumerate(self.columns):
+            data = self._data[i]
+            if kind == "category":
+                categories = list(self._categories[name])
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(data[:n].copy(), type=pa.int32()),
+                    pa.array(categories, type=pa.string()),
+                ))
+            elif kind == "timestamp":
+                arrays.append(pa.array(data[:n].copy(), type=pa.timestamp("ns", tz="UTC")))
+            elif kind == "iso_timestamp":
+                arrays.append(pc.cast(pa.array(data, type=pa.string()), pa.timestamp("ns", tz="UTC")))
+            elif kind == "string":
+                arrays.append(pa.array(data, type=pa.string()))
+            else:
+                arrays.append(pa.array(data[:n].copy()))
+        return pa.RecordBatch.from_arrays(arrays, names=self.names)
+
+
+def as_table(batch: Union[pa.RecordBatch, pa.Table]) -> pa.Table:
+    """Wrap a RecordBatch in a Table, Tables are returned as is."""
+    if isinstance(batch, pa.RecordBatch):
+        return pa.Table.from_batches([batch])
+    return batch
+
+
+def concat_batches(batches: List[Union[pa.RecordBatch, pa.Table]]) -> pa.Table:
+    """
+    Concatenate RecordBatches (or Tables) of the same columns into a single Table,
+    unifying the dictionaries of their category columns.
+    """
+    return pa.concat_tables([as_table(b) for b in batches]).unify_dictionaries().combine_chunks()
+
+
+def format_timestamps(batch: Union[pa.RecordBatch, pa.Table], timestamp_format: str = "iso") -> pa.Table:
+    """
+    Return a Table with the timestamp columns of batch formatted for the text and SQL
+    outputs: as ISO-8601 UTC text (e.g. "2026-10-17T00:00:00.123456789Z"), or cast to
+    int64 epoch nanoseconds if timestamp_format is "ns".
+    """
+    table = as_table(batch)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            column = table.column(i).cast(pa.timestamp("ns", tz="UTC"))
+            if timestamp_format == "ns":
+                column = column.cast(pa.int64())
+            else:
+                column = pc.strftime(column, format="%Y-%m-%dT%H:%M:%SZ")
+            table = table.set_column(i, field.name, column)
+    return table
+
+
+def record_batch_rows(batch: Union[pa.RecordBatch, pa.Table], timestamp_format: str = "iso") -> List[tuple]:
+    """
+    Convert a RecordBatch or Table to a list of row tuples for SQL inserts, with
+    dictionary columns decoded and timestamps formatted as ISO-8601 text, or given
+    as integer epoch nanoseconds if timestamp_format is "ns".
+    """
+    columns = []
+    for column in format_timestamps(batch, timestamp_format).columns:
+        column = column.combine_chunks()
+        if pa.types.is_dictionary(column.type):
+            column = column.dictionary_decode()
+        columns.append(column.to_pylist())
+    return list(zip(*columns))
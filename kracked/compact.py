@@ -0,0 +1,271 @@
+"""
+Compaction of the parquet datasets written by KrackedWriter.
+
+Batched outputs (trades, L3 ticks, L2 deltas) are appended to their datasets with one
+parquet file per batch, which leaves many small files whose per-file overhead dominates
+read times. Compaction merges the small files of each dataset directory into files of
+a target size, sorted by symbol and event time.
+
+New files are written under hidden names (leading ".", ignored by pyarrow and pandas),
+renamed into place once complete, and only then are the merged files removed, so the
+dataset stays readable throughout. A reader listing the directory between the rename
+and the removal may briefly see both copies of the rows. The dataset's manifest, if it
+has one (see kracked.manifest), is updated to list the compacted files instead of the
+merged ones, and its journal is folded into it.
+
+Usage:
+    python -m kracked.compact data/trades.parquet data/L3_ticks.parquet
+    python -m kracked.compact data --target-mb 256 --interval 3600
+"""
+import argparse
+import os
+import threading
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from typing import List, Union
+
+from kracked.manifest import DatasetManifest, file_entry, journal_path, manifest_for, manifest_path, partition_symbol
+
+
+# Columns the compacted files are sorted by, when present.
+SORT_COLUMNS = ["symbol", "ts_event", "timestamp", "ts_recv", "seq"]
+
+
+def _is_visible(name: str) -> bool:
+    return not name.startswith((".", "_"))
+
+
+def find_datasets(output_directory: str) -> List[str]:
+    """
+    Return the parquet dataset directories (folders named *.parquet) in an output directory.
+    """
+    return sorted(
+        os.path.join(output_directory, name)
+        for name in os.listdir(output_directory)
+        if name.endswith(".parquet") and os.path.isdir(os.path.join(output_directory, name))
+    )
+
+
+def _sort_table(table: pa.Table) -> pa.Table:
+    """Sort a table by the SORT_COLUMNS it contains. Dictionary columns sort by value."""
+    keys = [c for c in SORT_COLUMNS if c in table.column_names]
+    if not keys:
+        return table
+
+    key_columns = {}
+    for c in keys:
+        column = table.column(c).combine_chunks()
+        if pa.types.is_dictionary(column.type):
+            column = column.dictionary_decode()
+        key_columns[c] = column
+    indices = pc.sort_indices(pa.table(key_columns), sort_keys=[(c, "ascending") for c in keys])
+    return table.take(indices)
+
+
+def compact_directory(
+    directory: str,
+    target_bytes: int = 128 * 2**20,
+    small_file_bytes: Union[int, None] = None,
+    min_age: float = 60.0,
+    compression: str = "snappy",
+    manifest: Union[DatasetManifest, None] = None,
+) -> int:
+    """
+    Merge the small parquet files directly inside one directory.
+
+    Parameters
+    ----------
+    directory: str
+        The directory holding the parquet files (a dataset root or one partition).
+    target_bytes: int
+        Approximate size of the compacted files.
+    small_file_bytes: int or None
+        Files smaller than this are merged. Defaults to half of target_bytes.
+    min_age: float
+        Files modified less than this many seconds ago are skipped, so that files
+        still being written by KrackedWriter are never touched.
+    compression: str
+        Parquet compression codec of the compacted files.
+    manifest: DatasetManifest or None
+        The manifest of the dataset the directory belongs to, updated once the
+        compacted files are in place.
+
+    Returns
+    -------
+    int: The number of files that were merged (0 if there was nothing to do).
+    """
+    if small_file_bytes is None:
+        small_file_bytes = target_bytes // 2
+
+    now = time.time()
+    small = []
+    for entry in os.scandir(directory):
+        if not entry.is_file() or not _is_visible(entry.name) or not entry.name.endswith(".parquet"):
+            continue
+        stat = entry.stat()
+        if stat.st_size < small_file_bytes and now - stat.st_mtime >= min_age:
+            small.append((entry.path, stat.st_size))
+
+    if len(small) < 2:
+        return 0
+
+    tables = [pq.read_table(path) for path, _ in small]
+    table = pa.concat_tables(tables, promote_options="default").unify_dictionaries()
+    table = _sort_table(table).combine_chunks()
+
+    # Rows per output file, from the on-disk size of the inputs.
+    total_bytes = sum(size for _, size in small)
+    rows_per_file = max(1, int(len(table) * target_bytes / max(total_bytes, 1)))
+
+    written = []
+    try:
+        for start in range(0, len(table), rows_per_file):
+            name = f"compacted-{uuid.uuid4().hex}.parquet"
+            hidden = os.path.join(directory, "." + name)
+            pq.write_table(table.slice(start, rows_per_file), hidden, compression=compression)
+            written.append((hidden, os.path.join(directory, name), start))
+    except Exception:
+        for hidden, _, _ in written:
+            os.remove(hidden)
+        raise
+
+    for hidden, path, _ in written:
+        os.replace(hidden, path)
+    for path, _ in small:
+        os.remove(path)
+
+    if manifest is not None:
+        symbol = partition_symbol(manifest.relative(directory))
+        manifest.update(
+            added={
+                path: file_entry(table.slice(start, rows_per_file), None if symbol is None else [symbol])
+                for _, path, start in written
+            },
+            removed=[path for path, _ in small],
+        )
+
+    return len(small)
+
+
+def compact_dataset(path: str, **kwargs) -> int:
+    """
+    Compact a parquet dataset, including every partition directory below it.
+    Keyword arguments are passed to compact_directory.
+
+    Returns
+    -------
+    int: The number of files that were merged.
+    """
+    if os.path.exists(manifest_path(path)) or os.path.exists(journal_path(path)):
+        kwargs.setdefault("manifest", manifest_for(path))
+
+    merged = 0
+    for root, dirs, _ in os.walk(path):
+        dirs[:] = [d for d in dirs if _is_visible(d)]
+        merged += compact_directory(root, **kwargs)
+    if kwargs.get("manifest") is not None:
+        kwargs["manifest"].fold()
+    return merged
+
+
+class Compactor:
+    """
+    Periodically compacts parquet datasets from a background thread.
+
+    Parameters
+    ----------
+    paths: List[str] or str
+        Dataset directories, or output directories whose *.parquet datasets (found
+        again on every pass) are compacted.
+    interval: float
+        Seconds between compaction passes.
+    **kwargs:
+        Passed to compact_directory.
+    """
+
+    def __init__(self, paths: Union[List[str], str], interval: float = 3600.0, **kwargs):
+        if type(paths) == str:
+            paths = [paths]
+        self.paths = paths
+        self.interval = interval
+        self.kwargs = kwargs
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _datasets(self) -> List[str]:
+        datasets = []
+        for path in self.paths:
+            if path.rstrip("/").endswith(".parquet"):
+                datasets.append(path)
+            elif os.path.isdir(path):
+                datasets.extend(find_datasets(path))
+        return datasets
+
+    def run_once(self) -> int:
+        """Compact every dataset once, returning the number of files merged."""
+        merged = 0
+        for dataset in self._datasets():
+            if os.path.isdir(dataset):
+                try:
+                    merged += compact_dataset(dataset, **self.kwargs)
+                except Exception as e:
+                    print(f"Compaction of {dataset} failed: {e}")
+        return merged
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        """Start the background compaction thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background compaction thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact the parquet datasets written by kracked.")
+    parser.add_argument("paths", nargs="+",
+                        help="Dataset directories, or output directories containing *.parquet datasets.")
+    parser.add_argument("--target-mb", type=float, default=128, help="Target size of compacted files in MB.")
+    parser.add_argument("--small-mb", type=float, default=None,
+                        help="Only merge files smaller than this, in MB (default: half the target).")
+    parser.add_argument("--min-age", type=float, default=60.0,
+                        help="Skip files modified less than this many seconds ago.")
+    parser.add_argument("--compression", default="snappy", help="Parquet compression codec.")
+    parser.add_argument("--interval", type=float, default=None,
+                        help="Keep running, compacting every INTERVAL seconds.")
+    args = parser.parse_args(argv)
+
+    compactor = Compactor(
+        args.paths,
+        interval=args.interval or 0,
+        target_bytes=int(args.target_mb * 2**20),
+        small_file_bytes=None if args.small_mb is None else int(args.small_mb * 2**20),
+        min_age=args.min_age,
+        compression=args.compression,
+    )
+
+    while True:
+        merged = compactor.run_once()
+        print(f"Compacted {merged} files.")
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Conversion of the Arrow IPC segments written by KrackedWriter(output_mode="arrow")
+to parquet.
+
+Closed segments (<start_ns>.arrows) of an arrows directory are each written to one
+parquet file of the matching dataset, e.g. trades.arrows/ to trades.parquet/, and then
+removed. The segment still being written (.arrows.open) is left alone. Parquet files
+are written under hidden names and renamed into place once complete, then added to
+the manifest of the dataset (see kracked.manifest).
+
+Usage:
+    python -m kracked.convert data/trades.arrows
+    python -m kracked.convert data --interval 600
+"""
+import argparse
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from typing import List, Union
+
+from kracked.manifest import file_entry, manifest_for
+from kracked.reader import list_segments, read_segment
+
+
+def find_segment_directories(output_directory: str) -> List[str]:
+    """
+    Return the arrows directories (folders named *.arrows) in an output directory.
+    """
+    return sorted(
+        os.path.join(output_directory, name)
+        for name in os.listdir(output_directory)
+        if name.endswith(".arrows") and os.path.isdir(os.path.join(output_directory, name))
+    )
+
+
+def convert_segments(
+    path: str,
+    parquet_path: Union[str, None] = None,
+    compression: str = "snappy",
+    remove: bool = True,
+) -> int:
+    """
+    Convert the closed Arrow IPC segments of an arrows directory to parquet.
+
+    Parameters
+    ----------
+    path: str
+        The arrows directory, e.g. "data/trades.arrows".
+    parquet_path: str or None
+        The parquet dataset directory to write into. Defaults to path with the
+        .arrows extension replaced by .parquet.
+    compression: str
+        Parquet compression codec.
+    remove: bool
+        Whether to remove the segments once converted.
+
+    Returns
+    -------
+    int: The number of segments converted.
+    """
+    if parquet_path is None:
+        parquet_path = path.rstrip("/")[:-len(".arrows")] + ".parquet"
+
+    converted = 0
+    for segment in list_segments(path, include_open=False):
+        batches = read_segment(segment)
+        if batches:
+            table = pa.Table.from_batches(batches).unify_dictionaries()
+            os.makedirs(parquet_path, exist_ok=True)
+            name = os.path.basename(segment)[:-len(".arrows")] + ".parquet"
+            hidden = os.path.join(parquet_path, "." + name)
+            pq.write_table(table, hidden, compression=compression)
+            os.replace(hidden, os.path.join(parquet_path, name))
+            manifest_for(parquet_path).update({os.path.join(parquet_path, name): file_entry(table)})
+        if remove:
+            os.remove(segment)
+        converted += 1
+
+    if converted and os.path.isdir(parquet_path):
+        manifest_for(parquet_path).fold()
+    return converted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the Arrow IPC segments written by kracked to parquet.")
+    parser.add_argument("paths", nargs="+",
+                        help="Arrows directories, or output directories containing *.arrows directories.")
+    parser.add_argument("--compression", default="snappy", help="Parquet compression codec.")
+    parser.add_argument("--keep", action="store_true", help="Keep the segments once converted.")
+    parser.add_argument("--interval", type=float, default=None,
+                        help="Keep running, converting every INTERVAL seconds.")
+    args = parser.parse_args(argv)
+
+    while True:
+        converted = 0
+        for path in args.paths:
+            if path.rstrip("/").endswith(".arrows"):
+                directories = [path]
+            else:
+                directories = find_segment_directories(path)
+            for directory in directories:
+                converted += convert_segments(directory, compression=args.compression, remove=not args.keep)
+        print(f"Converted {converted} segments.")
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,75 @@
 import websocket, json, threading, hashlib, toml
 import urllib.parse, hmac, base64, time, requests
 import queue as _queue
-import datetime
+import functools
+from decimal import Decimal
 
 from kracked.io import KrackedWriter
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def make_decoder(backend=None, parse_float="float"):
+    """
+    Build the function used to decode websocket messages into Python objects.
+
+    Parameters
+    ----------
+    backend: str or None
+        "orjson", "msgspec" or "json". If None, the fastest installed library is
+        used (orjson, then msgspec), falling back to the standard library json.
+    parse_float: str
+        How to parse JSON floats: "float", "decimal" (decimal.Decimal) or "str" (the raw
+        text, exactly as sent). Book checksums are computed the same way in every mode,
+        since Kraken sends numbers without their trailing zeros and L2Book pads them to
+        the pair precision.
+        orjson only supports "float", so another backend is picked for the other modes.
+
+    Returns
+    -------
+    Callable: A function taking a str or bytes message.
+    """
+    float_types = {"float": float, "decimal": Decimal, "str": str}
+    if parse_float not in float_types:
+        raise ValueError(f"Invalid parse_float: {parse_float}, select from {list(float_types)}")
+
+    if backend is None:
+        if orjson is not None and parse_float == "float":
+            backend = "orjson"
+        elif msgspec is not None:
+            backend = "msgspec"
+        else:
+            backend = "json"
+
+    if backend == "orjson":
+        if orjson is None:
+            raise ImportError("orjson is not installed.")
+        if parse_float != "float":
+            raise ValueError("The orjson backend only supports parse_float='float'.")
+        return orjson.loads
+
+    elif backend == "msgspec":
+        if msgspec is None:
+            raise ImportError("msgspec is not installed.")
+        if parse_float == "float":
+            return msgspec.json.Decoder().decode
+        return msgspec.json.Decoder(float_hook=float_types[parse_float]).decode
+
+    elif backend == "json":
+        if parse_float == "float":
+            return json.loads
+        return functools.partial(json.loads, parse_float=float_types[parse_float])
+
+    raise ValueError(f"Invalid backend: {backend}, select from ['orjson', 'msgspec', 'json']")
+
 
 class BaseKrakenWS:
 
@@ -12,6 +77,19 @@ class BaseKrakenWS:
     _standalone_writer = None
     _standalone_writer_thread = None
 
+    # Message decoding, see set_decoder.
+    json_backend = None
+    parse_float = "float"
+    use_schema = False
+    schema_channel = None
+    _decoder = None
+
+    # Timed flushing of buffered data, see _start_flush_timer.
+    flush_interval_ms = None
+    _flush_lock = None
+    _flush_stop = None
+    _flush_thread = None
+
     def __init__(self, auth=True, trace=False, api_key=None, secret_key=None):
         self.auth = auth
         self.trace = trace
@@ -72,6 +150,46 @@ class BaseKrakenWS:
         except KeyboardInterrupt:
             print("Exiting...")
 
+    def set_decoder(self, backend=None, parse_float="float", use_schema=False):
+        """
+        Choose how incoming websocket messages are decoded. By default the fastest
+        installed JSON library (orjson or msgspec) is used, with floats parsed as float.
+
+        Params:
+        =======
+
+        backend (str or None):
+            "orjson", "msgspec", "json", or None for the fastest installed library.
+        parse_float (str):
+            "float", "decimal" or "str". "str" keeps prices and quantities as the exact
+            text sent by Kraken. This does not change the book checksums, which are
+            padded to the pair precision in every mode, nor the outputs: the feeds
+            convert prices and quantities to float for their books and rows.
+        use_schema (bool):
+            Decode directly into the typed msgspec Structs of kracked.schema, for feeds
+            that support it. Numeric fields are always parsed as float in this mode, and
+            backend/parse_float are ignored.
+        """
+        self.json_backend = backend
+        self.parse_float = parse_float
+        self.use_schema = use_schema and self.schema_channel is not None
+        self._decoder = self._make_decoder()
+
+    def _make_decoder(self):
+        if self.use_schema:
+            from kracked.schema import make_struct_decoder
+            return make_struct_decoder(self.schema_channel)
+        return make_decoder(self.json_backend, self.parse_float)
+
+    def _decode(self, message):
+        """
+        Decode a websocket message with the configured decoder. The decoder is built
+        on first use so that feeds can be configured any time before launching.
+        """
+        if self._decoder is None:
+            self._decoder = self._make_decoder()
+        return self._decoder(message)
+
     def get_kraken_signature(self, urlpath, data, secret):
         """
         Base function for getting validation token. Use at your own risk, and
@@ -181,7 +299,7 @@ class BaseKrakenWS:
         row = [
             self.feed_name,
             event,
-            str(datetime.datetime.now()),
+            time.time_ns(),
             close_status_code,
             close_msg,
         ]
@@ -231,6 +349,47 @@ class BaseKrakenWS:
         }
         ws.send(json.dumps(subscription))
 
+    def _flush(self):
+        """
+        Emit any data buffered by the feed to the I/O writer. Feeds that batch their
+        output override this, it is called by the flush timer (see flush_interval_ms)
+        and when the websocket is stopped, always while holding the flush lock.
+        """
+        pass
+
+    def _locked_on_message(self, ws, message):
+        with self._flush_lock:
+            self._on_message(ws, message)
+
+    def _flush_loop(self, stop):
+        interval = self.flush_interval_ms / 1000
+        while not stop.wait(interval):
+            with self._flush_lock:
+                self._flush()
+
+    def _start_flush_timer(self):
+        """
+        Start the thread flushing the feed every flush_interval_ms, so that buffered
+        data never waits on the arrival of the next message to be written. Messages
+        are always handled under the flush lock, which the timer and the final flush
+        in stop_websocket share.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = threading.Lock()
+        if not self.flush_interval_ms or (self._flush_thread is not None and self._flush_thread.is_alive()):
+            return
+        self._flush_stop = threading.Event()
+        self._flush_thread = threading.Thread(target=self._flush_loop, args=(self._flush_stop,))
+        self._flush_thread.daemon = True
+        self._flush_thread.start()
+
+    def _stop_flush_timer(self):
+        if self._flush_stop is not None:
+            self._flush_stop.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join(timeout=5)
+            self._flush_thread = None
+
     def run_websocket(self):
         websocket.enableTrace(self.trace)
 
@@ -239,10 +398,12 @@ class BaseKrakenWS:
         else:
             conn = "wss://ws.kraken.com/v2"
 
+        self._start_flush_timer()
+
         self.ws = websocket.WebSocketApp(
             conn,
             on_open=self._wrapped_on_open,
-            on_message=self._on_message,
+            on_message=self._locked_on_message,
             on_error=self._on_error,
             on_close=self._wrapped_on_close,
         )
@@ -258,6 +419,15 @@ class BaseKrakenWS:
         if self.ws is not None:
             self.ws.close()
 
+        # Write out whatever is still buffered before the writer shuts down.
+        self._stop_flush_timer()
+        if self.output_queue is not None:
+            if self._flush_lock is None:
+                self._flush()
+            else:
+                with self._flush_lock:
+                    self._flush()
+
         if self._standalone_writer is not None:
             self._standalone_writer.stop()
             self._standalone_writer_thread.join(timeout=5)
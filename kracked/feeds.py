@@ -1,20 +1,58 @@
 from kracked.core import BaseKrakenWS
-
-from zlib import crc32 as CRC32
+from kracked.buffers import ColumnarBuffer, L3_COLUMNS, TRADE_COLUMNS
+from kracked.book import L2Book, L3Book, DICT_LEVEL, STRUCT_LEVEL, DICT_ORDER, STRUCT_ORDER
+from kracked.livebook import LiveBook, live_book_path
 
 import numpy as np
-import toml, json, os
+import toml, json, os, websocket
 import datetime
 import ccxt, time
-import copy
+from operator import itemgetter, attrgetter
 from typing import Union, List
 
 
+# Field getters for the decoded dict messages and the typed kracked.schema messages.
+TICKER_FIELDS = ("symbol", "bid", "bid_qty", "ask", "ask_qty", "last", "volume", "vwap",
+                 "low", "high", "change", "change_pct")
+L3_FIELDS = ("timestamp", "limit_price", "order_qty", "event", "order_id")
+OHLC_FIELDS = ("symbol", "open", "high", "low", "close", "trades", "volume", "vwap",
+               "timestamp", "interval_begin")
+TRADE_FIELDS = ("timestamp", "symbol", "price", "qty", "side", "ord_type", "trade_id")
+
+TICKER_DICT, TICKER_STRUCT = itemgetter(*TICKER_FIELDS), attrgetter(*TICKER_FIELDS)
+L3_DICT, L3_STRUCT = itemgetter(*L3_FIELDS), attrgetter(*L3_FIELDS)
+OHLC_DICT, OHLC_STRUCT = itemgetter(*OHLC_FIELDS), attrgetter(*OHLC_FIELDS)
+TRADE_DICT, TRADE_STRUCT = itemgetter(*TRADE_FIELDS), attrgetter(*TRADE_FIELDS)
+
+
+def fetch_pair_precisions(symbols: List[str], url: str = "wss://ws.kraken.com/v2", timeout: float = 10.0) -> dict:
+    """
+    Return the {symbol: (price_precision, qty_precision)} of Kraken pairs, from a
+    snapshot of the v2 instrument channel. Symbols Kraken does not list are left out.
+    """
+    ws = websocket.create_connection(url, timeout=timeout)
+    try:
+        ws.send(json.dumps({"method": "subscribe", "params": {"channel": "instrument", "snapshot": True}}))
+        while True:
+            response = json.loads(ws.recv())
+            if response.get("channel") == "instrument" and response.get("type") == "snapshot":
+                pairs = response["data"]["pairs"]
+                break
+    finally:
+        ws.close()
+    return {
+        pair["symbol"]: (pair["price_precision"], pair["qty_precision"])
+        for pair in pairs if pair["symbol"] in symbols
+    }
+
+
 class KrakenL1(BaseKrakenWS):
     """
     Class extending BaseKrakenWS geared towards L1 feeds from the Kraken v2 API.
     """
 
+    schema_channel = "ticker"
+
     def __init__(
         self,
         symbols: Union[List[str], str],
@@ -52,8 +90,15 @@ class KrakenL1(BaseKrakenWS):
         print(error)
 
     def _on_message(self, ws, message):
-        recv_ts = datetime.datetime.now()
-        response = json.loads(message)
+        recv_ts = time.time_ns()
+        response = self._decode(message)
+
+        # Typed messages from kracked.schema.
+        if self.use_schema:
+            if response.channel == "ticker" and response.type in ["update", "snapshot"]:
+                self._emit_tickers(recv_ts, response.data, TICKER_STRUCT)
+            return
+
         reponse_keys = list(response.keys())
 
         if "channel" in reponse_keys:
@@ -68,49 +113,43 @@ class KrakenL1(BaseKrakenWS):
                 # 'timestamp': '2024-10-11T01:21:00.000000Z'}]}
 
                 if response["type"] in ["update", "snapshot"]:
-                    full_data = response["data"]
-                    # assert len(full_data) > 1, "Data shorter than expected"
-
-                    info_lines = []
-                    for data in full_data:
-                        timestamp = str(recv_ts)
-                        symbol = data["symbol"]
-                        bid = data["bid"]
-                        bid_qty = data["bid_qty"]
-                        ask = data["ask"]
-                        ask_qty = data["ask_qty"]
-                        last = data["last"]
-                        volume = data["volume"]
-                        vwap = data["vwap"]
-                        low = data["low"]
-                        high = data["high"]
-                        change = data["change"]
-                        change_pct = data["change_pct"]
-
-                        info = [
-                            timestamp,
-                            symbol,
-                            str(bid),
-                            str(bid_qty),
-                            str(ask),
-                            str(ask_qty),
-                            str(last),
-                            str(volume),
-                            str(vwap),
-                            str(low),
-                            str(high),
-                            str(change),
-                            str(change_pct),
-                        ]
-
-                        info_lines.append(info)
-
-                    self.output_queue.put({"channel": "L1", "rows": info_lines})
-
+                    self._emit_tickers(recv_ts, response["data"], TICKER_DICT)
 
             elif response["channel"] in ["heartbeat", "status", "subscribe"]:
                 pass
 
+    def _emit_tickers(self, recv_ts, full_data, fields):
+        """
+        Emit the rows of a ticker message to the I/O writer. fields returns the
+        TICKER_FIELDS of a ticker entry, for either dict or typed messages.
+        """
+        # assert len(full_data) > 1, "Data shorter than expected"
+
+        info_lines = []
+        for data in full_data:
+            (symbol, bid, bid_qty, ask, ask_qty, last, volume, vwap,
+             low, high, change, change_pct) = fields(data)
+
+            info = [
+                recv_ts,
+                symbol,
+                float(bid),
+                float(bid_qty),
+                float(ask),
+                float(ask_qty),
+                float(last),
+                float(volume),
+                float(vwap),
+                float(low),
+                float(high),
+                float(change),
+                float(change_pct),
+            ]
+
+            info_lines.append(info)
+
+        self.output_queue.put({"channel": "L1", "rows": info_lines})
+
     def _on_open(self, ws):
         """
         Open message for Kraken L1 connection.
@@ -132,6 +171,8 @@ class KrakenL2(BaseKrakenWS):
         Class for handling L2 data from the Kraken v2 API.
     """
 
+    schema_channel = "book"
+
     def __init__(
         self,
         symbols: Union[List[str], str],
@@ -144,8 +185,18 @@ class KrakenL2(BaseKrakenWS):
         append_book: bool = True,
         convert_to_parquet_every: int = 1000,
         log_for_webapp: bool = False,
+        live_book_directory: Union[str, None] = None,
         output_mode: str = "parquet",
         db_name: str = "kracked_outputs.db",
+        checksum_every: int = 1,
+        price_precision: Union[int, dict, None] = None,
+        qty_precision: Union[int, dict, None] = None,
+        fetch_precision: bool = True,
+        max_resubscribes: int = 5,
+        log_mode: str = "book",
+        keyframe_every: int = 1000,
+        keyframe_interval: Union[float, None] = 60.0,
+        flush_interval_ms: Union[int, None] = None,
     ):
         """
         Constructor for the KrakenL2 class.
@@ -153,12 +204,10 @@ class KrakenL2(BaseKrakenWS):
         The default behavior of this class is to log the book by change, including the FULL depth, 
         so that there is no reconstruction of the book required when loading the data.
 
-        The book is logged in temporary CSV files, one per symbol, as well as a live JSON file for 
-        visualizing the book in real time.
-
-        The CSV files (using the default behavior) are converted to parquet files periodically as specified
-        by convert_to_parquet_every. This saves massively on diskspace, and allows for rapid IO when using
-        the data.
+        In parquet mode (the default), the books of each symbol are streamed straight into parquet
+        files, one row group every convert_to_parquet_every rows. This saves massively on diskspace,
+        and allows for rapid IO when using the data. A live, memory-mapped copy of each book can
+        also be kept for visualizing the book in real time (see log_for_webapp).
 
         Note that the parquet files will exist in a FOLDER, named {output_directory}/L2_{symbol}_orderbook.parquet/
         You can load this data using pandas as follows:
@@ -189,15 +238,71 @@ class KrakenL2(BaseKrakenWS):
             The directory to output the book log files into.
 
         convert_to_parquet_every: int (default=1000)
-            The number of updates to log before converting the book to parquet.
-            *NOTE* This process REMOVES the corresponding CSV file.
+            The number of book rows per symbol written as one parquet row group. Files
+            only appear in the dataset folder once closed, every parquet_rows_per_file
+            rows of the writer (default 100000), every parquet_max_file_seconds (default
+            300) or when the writer stops. A crash loses the rows not yet in a closed file.
             This parameter is forwarded to the I/O writer.
 
+        log_for_webapp: bool (default=False)
+            Whether to keep a live copy of each book in a memory-mapped file,
+            L2_{symbol}_live.book, updated in place on every book emission. Other processes
+            read it with kracked.livebook.LiveBook.open(path).read() or .to_dict().
+
+        live_book_directory: str or None (default=None)
+            The directory of the live book files, e.g. "/dev/shm" to keep them in memory.
+            Defaults to output_directory.
+
         output_mode: str (default="parquet")
-            The mode to output the data in. Acceptable values are "csv", "parquet", and "sql".
+            The mode to output the data in. Acceptable values are "csv", "parquet", "arrow", and "sql".
 
         db_name: str (default="kracked_outputs.db")
             The name of the database to use.
+
+        checksum_every: int (default=1)
+            Verify the book against the Kraken CRC32 checksum every N updates of a symbol.
+            Set to 0 to only verify snapshots. On a mismatch the symbol is unsubscribed and
+            resubscribed to obtain a fresh snapshot, without restarting the connection. The
+            number of mismatches per symbol is kept in self.checksum_mismatches.
+
+        price_precision: int, dict or None (default=None)
+            Price precision of the pairs, either one value or {symbol: precision}. Used to
+            format prices for the checksum. If None, it is taken from the pair metadata
+            (see fetch_precision), or else inferred from each snapshot.
+
+        qty_precision: int, dict or None (default=None)
+            Quantity precision of the pairs, as for price_precision. If None, it is taken
+            from the pair metadata, or else kracked.book.DEFAULT_QTY_PRECISION (8).
+
+        fetch_precision: bool (default=True)
+            Whether to read the precisions not given above from the Kraken instrument
+            channel when the connection opens (see fetch_pair_precisions).
+
+        max_resubscribes: int (default=5)
+            Number of consecutive resubscribes of a symbol after checksum mismatches before
+            giving up: the book of the symbol is then no longer verified, rather than
+            resubscribed forever when its precision is wrong. The symbols given up on are
+            kept in self.unverified.
+
+        log_mode: str (default="book")
+            "book" logs the full depth book on each emission. "delta" only logs the raw
+            price level changes (side, price, qty, ts_event, ts_recv, seq) plus periodic full
+            book keyframes, which is far smaller on disk at the cost of a book reconstruction
+            when loading the data. Levels dropped by truncation to the depth are logged as
+            qty 0, so replaying the deltas on top of a keyframe reproduces the book exactly.
+            In this mode log_book_every is the number of updates between delta batches.
+
+        keyframe_every: int (default=1000)
+            In "delta" mode, the number of updates of a symbol between keyframes.
+
+        keyframe_interval: float or None (default=60.0)
+            In "delta" mode, the maximum number of seconds between keyframes of a symbol.
+            Keyframes are also always written for each snapshot received from Kraken.
+
+        flush_interval_ms: int or None (default=None)
+            If set, books (or deltas) updated since the last emission are also emitted
+            every flush_interval_ms milliseconds by a timer, bounding how stale the
+            written data can be on quiet symbols.
         """
 
         assert depth in [
@@ -207,6 +312,7 @@ class KrakenL2(BaseKrakenWS):
             500,
             1000,
         ], "Depths allowed: 10, 25, 100, 500, 1000"
+        assert log_mode in ["book", "delta"], "log_mode must be 'book' or 'delta'"
 
         if type(symbols) == str:
             symbols = [symbols]
@@ -214,12 +320,29 @@ class KrakenL2(BaseKrakenWS):
         self.depth = depth
         self.symbols = symbols
         self.updated = {s: False for s in symbols}
-        self.books = {s: {} for s in symbols}
+        if not isinstance(price_precision, dict):
+            price_precision = {s: price_precision for s in symbols}
+        if not isinstance(qty_precision, dict):
+            qty_precision = {s: qty_precision for s in symbols}
+        self.books = {
+            s: L2Book(depth, price_precision=price_precision.get(s), qty_precision=qty_precision.get(s))
+            for s in symbols
+        }
+        # (price, qty) flags of the precisions still to be read from the pair metadata.
+        self._missing_precision = {
+            s: (price_precision.get(s) is None, qty_precision.get(s) is None)
+            for s in symbols if fetch_precision and None in (price_precision.get(s), qty_precision.get(s))
+        }
+        self.max_resubscribes = max_resubscribes
+        self._resubscribes = {s: 0 for s in symbols}
+        self.unverified = set()
+        self.checksum_every = checksum_every
+        self.checksum_mismatches = {s: 0 for s in symbols}
+        self._checksum_counts = {s: 0 for s in symbols}
+        self._resyncing = set()
         self.auth = False
         self.trace = trace
         self.log_book_every = log_book_every
-        self.ask_prices = {s: [0.0] * self.depth for s in symbols}
-        self.bid_prices = {s: [0.0] * self.depth for s in symbols}
         self.append_book = append_book
         self.count = 0
         self.output_directory = output_directory
@@ -227,9 +350,32 @@ class KrakenL2(BaseKrakenWS):
         self.output_mode = output_mode
         self.db_name = db_name
         self.log_for_webapp = log_for_webapp
+        self.live_book_directory = live_book_directory or output_directory
+        self.live_books = {}
+        self.log_mode = log_mode
+        self.keyframe_every = keyframe_every
+        self.keyframe_interval = keyframe_interval
+        self._seq = {s: 0 for s in symbols}
+        self._deltas = {s: [] for s in symbols}
+        self._keyframe_seq = {s: 0 for s in symbols}
+        self._keyframe_time = {s: 0.0 for s in symbols}
+        self._last_timestamp = {s: None for s in symbols}
+        self.flush_interval_ms = flush_interval_ms
 
     def _on_message(self, ws, message):
-        response = json.loads(message)
+        response = self._decode(message)
+
+        # Typed messages from kracked.schema.
+        if self.use_schema:
+            if response.channel == "book" and len(response.data) > 0:
+                data = response.data[0]
+                if response.type == "snapshot":
+                    self._on_snapshot(ws, data.symbol, data.bids, data.asks, data.checksum,
+                                      data.timestamp, STRUCT_LEVEL)
+                else:
+                    self._on_update(ws, data.symbol, data.bids, data.asks, data.checksum,
+                                    data.timestamp, STRUCT_LEVEL)
+            return
 
         # Pass all method messages.
         if "method" in response.keys():
@@ -245,236 +391,239 @@ class KrakenL2(BaseKrakenWS):
             elif response["type"] == "snapshot":
                 # Pull data
                 data = response["data"]
-                symbol = data[0]["symbol"]
                 if len(data) != 1:
                     raise ValueError("Data longer than expected")
                 data = data[0]
-                checksum = data["checksum"]
 
-                # Bids -> Asserts snapshot fills the orderbook (w.r.t self.depth)
-                bids = data["bids"]
-                assert len(bids) == self.depth, "Snapshot should be full book refresh."
+                self._on_snapshot(ws, data["symbol"], data["bids"], data["asks"], data["checksum"],
+                                  data["timestamp"], DICT_LEVEL)
+
+            else:
+                data = response["data"][0]
+                self._on_update(ws, data["symbol"], data.get("bids", []), data.get("asks", []),
+                                data["checksum"], data["timestamp"], DICT_LEVEL)
 
-                # Asks -> Asserts snapshot fills the orderbook (w.r.t self.depth)
-                asks = data["asks"]
-                assert len(asks) == self.depth, "Snapshot should be full book refresh."
+    def _on_snapshot(self, ws, symbol, bids, asks, checksum, timestamp, level):
+        """
+        Reset the book of a symbol from a snapshot. Levels are read with the level
+        getter, which returns (price, qty) for either decoded dicts or typed structs.
+        """
 
-                self.books[symbol]["bids"] = {b["price"]: b["qty"] for b in bids}
-                self.books[symbol]["asks"] = {a["price"]: a["qty"] for a in asks}
+        # Asserts snapshot fills the orderbook (w.r.t self.depth)
+        assert len(bids) == self.depth, "Snapshot should be full book refresh."
+        assert len(asks) == self.depth, "Snapshot should be full book refresh."
 
-                self.bid_prices[symbol] = [b["price"] for b in bids]
-                self.ask_prices[symbol] = [a["price"] for a in asks]
+        self.books[symbol].load_snapshot(bids, asks, level)
+        self._resyncing.discard(symbol)
 
-                self._book_checksum(ws, checksum, symbol)
+        if self.log_mode == "delta":
+            self._seq[symbol] += 1
+            self._emit_keyframe(symbol, timestamp)
 
-            else:
-                # Initalize a flag for if a given symbol's book has been updated.
+        # A snapshot mismatch can not be fixed by resubscribing, it means the
+        # checksum formatting (e.g. the price precision) is wrong for this pair.
+        if self._book_checksum(ws, checksum, symbol):
+            self._resubscribes[symbol] = 0
+            self.unverified.discard(symbol)
+        else:
+            print(f"L2 snapshot checksum mismatch for {symbol}, check price_precision and qty_precision.")
 
-                self.count += 1
+    def _on_update(self, ws, symbol, bids, asks, checksum, timestamp, level):
+        """
+        Apply an update to the book of a symbol, verify it and emit book snapshots or
+        deltas to the I/O writer as configured.
+        """
 
-                data = response["data"]
-                symbol = data[0]["symbol"]
-                self.updated[symbol] = True
-
-                if ("bids" in response["data"][0].keys()) & (
-                    "asks" in response["data"][0].keys()
-                ):
-
-                    bids = response["data"][0]["bids"]
-                    asks = response["data"][0]["asks"]
-
-                    bqty = [b["qty"] for b in bids]
-                    aqty = [a["qty"] for a in asks]
-                    new_bids = [
-                        b["price"]
-                        for b in bids
-                        if b["price"] not in self.bid_prices[symbol]
-                    ]
-                    new_asks = [
-                        a["price"]
-                        for a in asks
-                        if a["price"] not in self.ask_prices[symbol]
-                    ]
-
-                    # Check if we remove any price levels from the book
-                    if 0 in bqty:
-                        # Check if we have actual bids to update.
-                        if len(new_bids) == 0:
-                            raise ValueError("REMOVING PRICE LEVEL WITHOUT REPLACEMENT")
-
-                    if 0 in aqty:
-                        # Check if we have actual bids to update.
-                        if len(new_asks) == 0:
-                            raise ValueError("REMOVING PRICE LEVEL WITHOUT REPLACEMENT")
-
-                    if len(bids) > 0:
-                        for bid in bids:
-                            curr_price = bid["price"]
-
-                            # REMOVE BAD PRICE LEVEL
-                            if bid["qty"] == 0:
-                                # Remove the price level from the dictionary
-                                del self.books[symbol]["bids"][curr_price]
-                                # Zero this bad price level in the self.prices array.
-                                self.bid_prices[symbol].remove(curr_price)
-
-                            # ADD GOOD PRICE LEVEL
-                            else:
-                                self.books[symbol]["bids"][curr_price] = bid["qty"]
-                                if curr_price not in self.bid_prices[symbol]:
-                                    self.bid_prices[symbol].append(curr_price)
-
-                        # Fix: Sort the list directly
-                        self.bid_prices[symbol].sort(reverse=True)
-
-                        # HANDLE BOOKKEEPING OF THE DEPTH FOR MBP DATA
-                        num_bid_levels = len(self.bid_prices[symbol])
-                        if num_bid_levels == self.depth:
-                            pass
-                        elif num_bid_levels > self.depth:
-                            # Fix: Get the prices to remove as a list instead of a slice
-                            bad_prices = self.bid_prices[symbol][
-                                self.depth :
-                            ]  # Convert slice to list
-                            for bp in bad_prices:
-                                self.bid_prices[symbol].remove(bp)
-                                del self.books[symbol]["bids"][bp]
-                        else:
-                            # FIXME handle this case more gracefully at some point.
-                            ws.close()
-                            raise ValueError(f"MBP Depth is lower than {self.depth}")
-
-                    if len(asks) > 0:
-                        for ask in asks:
-                            curr_price = ask["price"]
-
-                            # REMOVE BAD PRICE LEVEL
-                            if ask["qty"] == 0:
-                                # Remove the price level from the dictionary
-                                del self.books[symbol]["asks"][curr_price]
-                                # Zero this bad price level in the self.prices array.
-                                self.ask_prices[symbol].remove(curr_price)
-
-                            # ADD GOOD PRICE LEVEL
-                            else:
-                                self.books[symbol]["asks"][curr_price] = ask["qty"]
-                                if curr_price not in self.ask_prices[symbol]:
-                                    self.ask_prices[symbol].append(curr_price)
-
-                        self.ask_prices[symbol].sort(reverse=False)
-
-                        # HANDLE BOOKKEEPING OF THE DEPTH FOR MBP DATA
-                        num_ask_levels = len(self.ask_prices[symbol])
-                        if num_ask_levels == self.depth:
-                            pass
-                        elif num_ask_levels > self.depth:
-                            # Fix: Get the prices to remove as a list instead of a slice
-                            bad_prices = self.ask_prices[symbol][
-                                self.depth :
-                            ]  # Convert slice to list
-                            for bp in bad_prices:
-                                self.ask_prices[symbol].remove(bp)
-                                del self.books[symbol]["asks"][bp]
-                        else:
-                            ws.close()
-                            raise ValueError(f"MBP Depth is lower than {self.depth}")
-
-                # Sort the self.bids and self.asks by their keys (prices)
-                self.books[symbol]["bids"] = dict(
-                    sorted(self.books[symbol]["bids"].items(), reverse=True)
-                )
-                self.books[symbol]["asks"] = dict(
-                    sorted(self.books[symbol]["asks"].items(), reverse=False)
-                )
-
-
-                # We really do not need to be storing the WHOLE book, but it makes it so that
-                # there is no post-processing to do when we load the data.
-                # NOTE I really should add an option to simply write the change to the book so that
-                # LTS is much more efficient, at the cost of a book reconstruction when loading data.
-                if self.count % self.log_book_every == 0:
-                    if self.append_book:
-                        for symbol in self.symbols:
-                            if self.updated[symbol]:
-
-                                full_L2_orderbook = {
-                                    "b": self.books[symbol]["bids"],
-                                    "a": self.books[symbol]["asks"],
-                                }
-
-                                aps = list(full_L2_orderbook["a"].keys())
-                                avs = list(full_L2_orderbook["a"].values())
-                                bps = list(full_L2_orderbook["b"].keys())
-                                bvs = list(full_L2_orderbook["b"].values())
-
-                                aps = [f"{ap:.9f}" for ap in aps]
-                                avs = [f"{av:.9f}" for av in avs]
-                                bps = [f"{bp:.9f}" for bp in bps]
-                                bvs = [f"{bv:.9f}" for bv in bvs]
-
-                                most_recent_timestamp = len(data) - 1
-                                recv_ts = datetime.datetime.now(datetime.timezone.utc).isoformat()
-
-                                line = [
-                                    str(data[most_recent_timestamp]["timestamp"]),
-                                    recv_ts,
-                                ]
-                                for i in range(self.depth):
-                                    line.extend([aps[i], avs[i], bps[i], bvs[i]])
-
-                                self.output_queue.put({
-                                    "channel": "L2",
-                                    "symbol": symbol,
-                                    "depth": self.depth,
-                                    "line": line,
-                                })
-
-                            self.updated[symbol] = False
-
-                    # Used for visualization in the webapp.
-                    if self.log_for_webapp:
-                        self.output_queue.put({
-                            "channel": "webapp_l2",
-                            "books": copy.deepcopy(self.books),
-                        })
+        self.count += 1
+
+        # Updates in flight while a symbol is being resubscribed are stale.
+        if symbol in self._resyncing:
+            return
+
+        # Flag that this symbol's book has been updated.
+        self.updated[symbol] = True
+
+        book = self.books[symbol]
+        dropped_bids, dropped_asks = book.apply(bids, asks, level)
+
+        if self.log_mode == "delta":
+            self._seq[symbol] += 1
+            self._record_deltas(symbol, timestamp, bids, asks, dropped_bids, dropped_asks, level)
+
+        # HANDLE BOOKKEEPING OF THE DEPTH FOR MBP DATA
+        if not book.is_full():
+            print(f"MBP Depth for {symbol} is lower than {self.depth}.")
+            self._resubscribe(ws, symbol)
+
+        elif self.checksum_every and symbol not in self.unverified:
+            self._checksum_counts[symbol] += 1
+            if self._checksum_counts[symbol] % self.checksum_every == 0:
+                if self._book_checksum(ws, checksum, symbol):
+                    self._resubscribes[symbol] = 0
+                elif self._resubscribes[symbol] >= self.max_resubscribes:
+                    print(f"L2 checksum mismatch for {symbol} after {self.max_resubscribes} resubscribes, "
+                          f"no longer verifying it. Check price_precision and qty_precision.")
+                    self.unverified.add(symbol)
+                else:
+                    print(f"L2 checksum mismatch for {symbol}.")
+                    self._resubscribes[symbol] += 1
+                    self._resubscribe(ws, symbol)
+
+        if self.log_mode == "delta" and symbol not in self._resyncing:
+            since_keyframe = self._seq[symbol] - self._keyframe_seq[symbol]
+            if since_keyframe >= self.keyframe_every or (
+                self.keyframe_interval is not None
+                and time.time() - self._keyframe_time[symbol] >= self.keyframe_interval
+            ):
+                self._emit_keyframe(symbol, timestamp)
 
-    def _book_checksum(self, ws, checksum, symbol):
-        # FIXME Check this after writing each parquet.
+        # We really do not need to be storing the WHOLE book, but it makes it so that
+        # there is no post-processing to do when we load the data. Use log_mode="delta"
+        # to only write the changes to the book.
+        self._last_timestamp[symbol] = timestamp
+        if self.count % self.log_book_every == 0:
+            self._flush()
 
-        bid_keys = list(self.books[symbol]["bids"].keys())
-        ask_keys = list(self.books[symbol]["asks"].keys())
-        bid_vals = list(self.books[symbol]["bids"].values())
-        ask_vals = list(self.books[symbol]["asks"].values())
+    def _flush(self):
+        """
+        Emit the books (or the buffered deltas) of the symbols updated since the last
+        emission. Called every log_book_every updates and by the flush timer.
+        """
+        if not any(self.updated.values()):
+            return
 
-        asksum = ""
-        bidsum = ""
-        for i in range(10):
+        if self.log_mode == "delta":
+            for symbol in self.symbols:
+                self._emit_deltas(symbol)
 
-            # String bid price, String bid ask
-            sbp = str(bid_keys[i]).replace(".", "").lstrip("0")
-            sap = str(ask_keys[i]).replace(".", "").lstrip("0")
+        elif self.append_book:
+            for symbol in self.symbols:
+                if self.updated[symbol]:
 
-            # String bid qty, String bid ask
-            sbq = f"{self.books[symbol]['bids'][bid_keys[i]]:.8f}".replace(
-                ".", ""
-            ).lstrip("0")
-            saq = f"{self.books[symbol]['asks'][ask_keys[i]]:.8f}".replace(
-                ".", ""
-            ).lstrip("0")
+                    self.output_queue.put({
+                        "channel": "L2",
+                        "symbol": symbol,
+                        "depth": self.depth,
+                        "timestamp": str(self._last_timestamp[symbol]),
+                        "ts_recv": time.time_ns(),
+                        "book": self.books[symbol].snapshot(),
+                    })
 
-            sb = sbp + sbq
-            sa = sap + saq
+        # Used for visualization in the webapp.
+        if self.log_for_webapp:
+            for symbol in self.symbols:
+                if self.updated[symbol]:
+                    self._write_live_book(symbol)
+
+        for symbol in self.symbols:
+            self.updated[symbol] = False
+
+    def _write_live_book(self, symbol):
+        """Update the memory-mapped live book of a symbol, creating it on first use."""
+        live_book = self.live_books.get(symbol)
+        if live_book is None:
+            os.makedirs(self.live_book_directory, exist_ok=True)
+            live_book = self.live_books[symbol] = LiveBook.create(
+                live_book_path(self.live_book_directory, symbol), symbol, self.depth,
+            )
+        live_book.write(self.books[symbol].refresh_levels(), self._last_timestamp[symbol])
+
+    def _record_deltas(self, symbol, ts_event, bids, asks, dropped_bids, dropped_asks, level):
+        """
+        Buffer the level changes of one update message for delta logging. Each row is
+        [side, price, qty, ts_event, ts_recv, seq], with truncated levels given qty 0.
+        """
+        recv_ts = time.time_ns()
+        seq = self._seq[symbol]
+        rows = self._deltas[symbol]
+
+        # Prices decoded as str or Decimal (see set_decoder) are logged as the book's floats.
+        for price, qty in map(level, bids):
+            rows.append(["b", float(price), float(qty), ts_event, recv_ts, seq])
+        for price in dropped_bids:
+            rows.append(["b", price, 0.0, ts_event, recv_ts, seq])
+        for price, qty in map(level, asks):
+            rows.append(["a", float(price), float(qty), ts_event, recv_ts, seq])
+        for price in dropped_asks:
+            rows.append(["a", price, 0.0, ts_event, recv_ts, seq])
+
+    def _emit_deltas(self, symbol):
+        """Emit the buffered level changes of a symbol to the I/O writer."""
+        if len(self._deltas[symbol]) == 0:
+            return
+
+        self.output_queue.put({
+            "channel": "L2_delta",
+            "symbol": symbol,
+            "rows": self._deltas[symbol],
+        })
+        self._deltas[symbol] = []
+
+    def _emit_keyframe(self, symbol, ts_event):
+        """
+        Emit a full depth book of a symbol, tagged with the sequence number of the last
+        update applied to it. Pending deltas are flushed first.
+        """
+        self._emit_deltas(symbol)
+
+        self.output_queue.put({
+            "channel": "L2_keyframe",
+            "symbol": symbol,
+            "depth": self.depth,
+            "timestamp": str(ts_event),
+            "ts_recv": time.time_ns(),
+            "seq": self._seq[symbol],
+            "book": self.books[symbol].snapshot(),
+        })
+        self._keyframe_seq[symbol] = self._seq[symbol]
+        self._keyframe_time[symbol] = time.time()
 
-            asksum += sa
-            bidsum += sb
+    def _book_checksum(self, ws, checksum, symbol):
+        """
+        Compare the Kraken checksum against the local book of a symbol, counting
+        mismatches in self.checksum_mismatches.
 
-        csum_string = asksum + bidsum
-        kracked_checksum = CRC32(csum_string.encode("utf-8"))
+        Returns
+        -------
+        bool: True if the checksums match.
+        """
+        if self.books[symbol].checksum() == checksum:
+            return True
 
-        if checksum != kracked_checksum:
-            ...
-            # # FIXME ADD ERROR HANDLING HERE.
-            # raise ValueError("CHECKSUM MISMATCH! BOOK IS INCONSISTENT!")
+        self.checksum_mismatches[symbol] += 1
+        return False
+
+    def _load_pair_precisions(self):
+        """
+        Set the precisions of the books not given to the constructor from the pair
+        metadata. On failure the books keep their fallbacks, and the next connection
+        tries again.
+        """
+        if not self._missing_precision:
+            return
+        try:
+            precisions = fetch_pair_precisions(list(self._missing_precision))
+        except Exception as e:
+            print(f"Could not read the pair precisions from the instrument channel: {e}")
+            return
+        for symbol, (price_precision, qty_precision) in precisions.items():
+            missing_price, missing_qty = self._missing_precision.pop(symbol)
+            self.books[symbol].set_precision(
+                price_precision if missing_price else None, qty_precision if missing_qty else None,
+            )
+
+    def _resubscribe(self, ws, symbol):
+        """
+        Unsubscribe and resubscribe a single symbol so that Kraken sends a fresh
+        snapshot for it, leaving the other symbols on the connection untouched.
+        Updates for the symbol are ignored until the snapshot arrives.
+        """
+        self._resyncing.add(symbol)
+        self.updated[symbol] = False
+
+        params = {"channel": "book", "symbol": [symbol], "depth": self.depth}
+        ws.send(json.dumps({"method": "unsubscribe", "params": params}))
+        ws.send(json.dumps({"method": "subscribe", "params": params}))
 
     def _on_open(self, ws):
         """
@@ -484,6 +633,9 @@ class KrakenL2(BaseKrakenWS):
         print("Kraken v2 Connection Opened.")
         # ws_token = self.get_ws_token(self.api_key, self.api_secret)
 
+        # The checksums need the precisions before the first snapshot arrives.
+        self._load_pair_precisions()
+
         subscription = {
             "method": "subscribe",
             "params": {
@@ -505,6 +657,10 @@ class KrakenL3(BaseKrakenWS):
     periodically convert the L3 data into aggregates, or migrate to a more suitable
     file format (e.g. parquet, HDf5, etc.)
 
+    The feed also maintains a live L3Book per symbol in self.books, seeded from the
+    level3 snapshot and updated by every event, which exposes the best bid/ask, level
+    aggregates and the queue position of any order id.
+
     IMPORTANT NOTE: This is the only Kraken feed that requires authentication. You MUST provide
     an api_key and secret_key.
 
@@ -514,6 +670,8 @@ class KrakenL3(BaseKrakenWS):
     _on_message
     """
 
+    schema_channel = "level3"
+
     def __init__(
         self,
         symbols: Union[List[str], str],
@@ -526,6 +684,7 @@ class KrakenL3(BaseKrakenWS):
         output_directory: str = ".",
         output_mode: str = "parquet",
         db_name: str = "kracked_outputs.db",
+        flush_interval_ms: Union[int, None] = None,
     ):
         """
         Constructor for the KrakenL3 class.
@@ -558,7 +717,11 @@ class KrakenL3(BaseKrakenWS):
                 The directory to log the L3 data to.
 
             output_mode: str
-                The mode to output the data in. Acceptable values are "csv", "parquet", and "sql".
+                The mode to output the data in. Acceptable values are "csv", "parquet", "arrow", and "sql".
+
+            flush_interval_ms: int or None
+                If set, buffered ticks are also emitted every flush_interval_ms milliseconds
+                by a timer, so quiet symbols are written without waiting for log_ticks_every.
         """
 
         self.tick_count = 0
@@ -573,32 +736,31 @@ class KrakenL3(BaseKrakenWS):
         self.depth = depth
         self.log_ticks_every = log_ticks_every
 
-        self.ticks = []
+        self.ticks = ColumnarBuffer(L3_COLUMNS, capacity=log_ticks_every + 1)
         self.output_directory = output_directory
         self.output_mode = output_mode
         self.db_name = db_name
         self.out_file_name = out_file_name
+        self.flush_interval_ms = flush_interval_ms
 
-    def _on_message(self, ws, message):
-        response = json.loads(message)
-
-        my_time = datetime.datetime.now()
-
-        if len(self.ticks) > self.log_ticks_every:
+        # Live order-by-order books, seeded from the snapshot and kept up to date by
+        # every event. These can be queried while the feed is running.
+        self.books = {s: L3Book() for s in self.symbols}
 
-            remap = {"add":"A", "delete":"C", "modify":"M"}
-
-            for i in range(len(self.ticks)):
-                self.ticks[i][5] = remap[self.ticks[i][5]]
+    def _on_message(self, ws, message):
+        response = self._decode(message)
 
-            self.output_queue.put({
-                "channel": "L3",
-                "ticks": self.ticks,
-                "out_file_name": self.out_file_name,
-            })
+        my_time = time.time_ns()
 
-            self.ticks = []
-            self.tick_count = 0
+        # Typed messages from kracked.schema.
+        if self.use_schema:
+            if response.channel == "level3" and response.type == "snapshot":
+                for data in response.data:
+                    self.books[data.symbol].load_snapshot(data.bids, data.asks, STRUCT_ORDER)
+            elif response.channel == "level3" and len(response.data) > 0:
+                data = response.data[0]
+                self._record_ticks(my_time, data.symbol, data.bids, data.asks, L3_STRUCT)
+            return
 
         # print(response)
         if "data" in response.keys() and response["type"] != "snapshot":
@@ -607,43 +769,56 @@ class KrakenL3(BaseKrakenWS):
                 "bids" in response["data"][0].keys()
                 and "asks" in response["data"][0].keys()
             ):
-                bids = response["data"][0]["bids"]
-                asks = response["data"][0]["asks"]
-                symbol = response["data"][0]["symbol"]
-                if len(bids) > 0:
-                    for bid in bids:
-                        info = [
-                            "b",  # Side
-                            bid["timestamp"],  # Exchange Time
-                            my_time,  # My Time
-                            bid["limit_price"],  # Price
-                            bid["order_qty"],  # Size
-                            bid["event"],  # Action
-                            bid["order_id"],  # OID
-                            symbol,
-                        ]
-                        self.ticks.append(info)
-                        self.tick_count += 1
-                if len(asks) > 0:
-                    for ask in asks:
-                        info = [
-                            "a",  # Side
-                            ask["timestamp"],  # Exchange Time
-                            my_time,  # My Time
-                            ask["limit_price"],  # Price
-                            ask["order_qty"],  # Size
-                            ask["event"],  # Action
-                            ask["order_id"],  # OID
-                            symbol,
-                        ]
-                        self.ticks.append(info)
-                        self.tick_count += 1
-                if len(asks) == 0 and len(bids) == 0:
-                    pass
+                data = response["data"][0]
+                self._record_ticks(my_time, data["symbol"], data["bids"], data["asks"], L3_DICT)
 
         elif "data" in response.keys() and response["type"] == "snapshot":
-            # Decide what to do with initial snapshot later
-            pass
+            # Seed the L3 books, the snapshot itself is not logged.
+            for data in response["data"]:
+                self.books[data["symbol"]].load_snapshot(data["bids"], data["asks"], DICT_ORDER)
+
+    def _record_ticks(self, my_time, symbol, bids, asks, fields):
+        """
+        Apply the order events of an L3 update to the book of the symbol and buffer
+        them for logging. fields returns the L3_FIELDS of an order event, for either
+        dict or typed messages.
+        """
+        book = self.books[symbol]
+        remap = {"add": "A", "delete": "C", "modify": "M"}
+        for side, orders in (("b", bids), ("a", asks)):
+            for order in orders:
+                timestamp, limit_price, order_qty, event, order_id = fields(order)
+                # Prices decoded as str or Decimal (see set_decoder) are stored as floats.
+                limit_price, order_qty = float(limit_price), float(order_qty)
+                book.apply_event(side, event, order_id, limit_price, order_qty)
+                self.ticks.append((
+                    side,  # Side
+                    timestamp,  # Exchange Time
+                    my_time,  # My Time (epoch ns)
+                    limit_price,  # Price
+                    order_qty,  # Size
+                    remap[event],  # Action
+                    order_id,  # OID
+                    symbol,
+                ))
+                self.tick_count += 1
+
+        if len(self.ticks) > self.log_ticks_every:
+            self._flush()
+
+    def _flush(self):
+        """Emit the buffered ticks to the I/O writer."""
+        if len(self.ticks) == 0:
+            return
+
+        self.output_queue.put({
+            "channel": "L3",
+            "batch": self.ticks.to_record_batch(),
+            "out_file_name": self.out_file_name,
+        })
+
+        self.ticks.clear()
+        self.tick_count = 0
 
     def _on_open(self, ws):
         """
@@ -690,12 +865,19 @@ class KrakenOHLC(BaseKrakenWS):
     are that live plotting methods can allow for real-time (insofar as the API allows) candlestick updates
     for the current bar.
 
+    Alternatively, set ohlc_storage="final" on the KrackedWriter (ohlc_params={"storage": "final"} in
+    KrakenFeedManager) to store a single row per bar in OHLC_bars, keyed on (symbol, interval,
+    interval_begin), optionally with the in-progress bars in OHLC_live (ohlc_live=True, or
+    ohlc_params={"live": True}).
+
     Implements:
     -----------
     _on_message
     _on_open
     """
 
+    schema_channel = "ohlc"
+
     def __init__(
         self,
         symbols: Union[List[str], str],
@@ -757,7 +939,16 @@ class KrakenOHLC(BaseKrakenWS):
         """
         Message handler for the OHLC feed.
         """
-        response = json.loads(message)
+        response = self._decode(message)
+
+        # Typed messages from kracked.schema.
+        if self.use_schema:
+            if response.channel == "ohlc":
+                if response.type == "update":
+                    self._emit_candles(response.data, response.timestamp, "update", OHLC_STRUCT)
+                elif response.type == "snapshot" and not self.ccxt_snapshot:
+                    self._emit_candles(response.data, response.timestamp, "snapshot", OHLC_STRUCT)
+            return
 
         reponse_keys = list(response.keys())
 
@@ -767,89 +958,53 @@ class KrakenOHLC(BaseKrakenWS):
             if response["channel"] == "ohlc":
 
                 if response["type"] == "update":
-                    data = response["data"]
-                    assert len(data) == 1, "Data longer than expected"
-                    data = data[0]
-
-                    symbol = data["symbol"]
-                    open_p = data["open"]
-                    high = data["high"]
-                    low = data["low"]
-                    close = data["close"]
-                    trades = data["trades"]
-                    volume = data["volume"]
-                    vwap = data["vwap"]
-                    tend = data["timestamp"]
-                    tstart = data["interval_begin"]
-                    ttrue = response["timestamp"]
-
-                    info = [
-                        tend,
-                        symbol,
-                        str(open_p),
-                        str(high),
-                        str(low),
-                        str(close),
-                        str(volume),
-                        str(vwap),
-                        str(trades),
-                        tstart,
-                        ttrue,
-                    ]
-
-                    self.output_queue.put({
-                        "channel": "OHLC",
-                        "mode": "update",
-                        "rows": [info],
-                    })
+                    self._emit_candles(response["data"], response["timestamp"], "update", OHLC_DICT)
 
                 elif response["type"] == "snapshot":
 
                     if not self.ccxt_snapshot:
-
-                        full_data = response["data"]
-                        assert len(full_data) > 1, "Data shorter than expected"
-
-                        info_lines = []
-                        for data in full_data:
-                            symbol = data["symbol"]
-                            open_p = data["open"]
-                            high = data["high"]
-                            low = data["low"]
-                            close = data["close"]
-                            trades = data["trades"]
-                            volume = data["volume"]
-                            vwap = data["vwap"]
-                            tend = data["timestamp"]
-                            tstart = data["interval_begin"]
-                            ttrue = response["timestamp"]
-
-                            info = [
-                                tend,
-                                symbol,
-                                str(open_p),
-                                str(high),
-                                str(low),
-                                str(close),
-                                str(volume),
-                                str(vwap),
-                                str(trades),
-                                tstart,
-                                ttrue,
-                            ]
-
-                            info_lines.append(info)
-
-                        self.output_queue.put({
-                            "channel": "OHLC",
-                            "mode": "snapshot",
-                            "rows": info_lines,
-                        })
-
+                        self._emit_candles(response["data"], response["timestamp"], "snapshot", OHLC_DICT)
 
             elif response["channel"] in ["heartbeat", "status", "subscribe"]:
                 pass
 
+    def _emit_candles(self, full_data, ttrue, mode, fields):
+        """
+        Emit the candles of an update or snapshot message to the I/O writer. fields
+        returns the OHLC_FIELDS of a candle, for either dict or typed messages.
+        """
+        if mode == "update":
+            assert len(full_data) == 1, "Data longer than expected"
+        else:
+            assert len(full_data) > 1, "Data shorter than expected"
+
+        info_lines = []
+        for data in full_data:
+            symbol, open_p, high, low, close, trades, volume, vwap, tend, tstart = fields(data)
+
+            info = [
+                tend,
+                symbol,
+                float(open_p),
+                float(high),
+                float(low),
+                float(close),
+                float(volume),
+                float(vwap),
+                int(trades),
+                tstart,
+                ttrue,
+            ]
+
+            info_lines.append(info)
+
+        self.output_queue.put({
+            "channel": "OHLC",
+            "mode": mode,
+            "interval": self.interval,
+            "rows": info_lines,
+        })
+
     def _on_open(self, ws):
         """
         Open message for Kraken L3 connection.
@@ -884,20 +1039,21 @@ class KrakenOHLC(BaseKrakenWS):
 
                     curr_data = [formatted_timestamp,
                                     symbol,
-                                    str(c[1]),                  # open
-                                    str(c[2]),                  # high
-                                    str(c[3]),                  # low
-                                    str(c[4]),                  # close
-                                    str(c[5]),                  # volume
-                                    "NaN",                 # vwap placeholder
-                                    "NaN",                 # trades placeholder
-                                    "NaN",                 # tstart placeholder
-                                    "NaN"]                 # ttrue placeholder
+                                    float(c[1]),                # open
+                                    float(c[2]),                # high
+                                    float(c[3]),                # low
+                                    float(c[4]),                # close
+                                    float(c[5]),                # volume
+                                    None,                  # vwap placeholder
+                                    None,                  # trades placeholder
+                                    None,                  # tstart placeholder
+                                    None]                  # ttrue placeholder
                     info_lines.append(curr_data)
 
             self.output_queue.put({
                 "channel": "OHLC",
                 "mode": "snapshot",
+                "interval": self.interval,
                 "rows": info_lines,
             })
 
@@ -908,6 +1064,8 @@ class KrakenTrades(BaseKrakenWS):
     This channel generates a trade event whenever there is an order matched in the book.
     """
 
+    schema_channel = "trade"
+
     def __init__(
         self,
         symbols,
@@ -916,6 +1074,7 @@ class KrakenTrades(BaseKrakenWS):
         output_directory=".",
         output_mode="parquet",
         db_name="kracked_outputs.db",
+        flush_interval_ms=None,
     ):
         """
 
@@ -932,8 +1091,11 @@ class KrakenTrades(BaseKrakenWS):
             output_directory: str
                 The directory to log the trades to.
             output_mode: str
-                The mode to log the trades to. Can be "parquet" or "csv", "sql". Default is parquet, however
+                The mode to log the trades to. Can be "parquet", "arrow", "csv" or "sql". Default is parquet, however
                 this is soon to be changed (and potentially deprecated).
+            flush_interval_ms: int or None
+                If set, buffered trades are also emitted every flush_interval_ms milliseconds
+                by a timer, so quiet symbols are written without waiting for log_trades_every.
         """
 
         if type(symbols) == str:
@@ -944,46 +1106,64 @@ class KrakenTrades(BaseKrakenWS):
         self.trace = trace
         self.log_trades_every = log_trades_every
         self.output_directory = output_directory
-        self.all_trades = []
+        self.all_trades = ColumnarBuffer(TRADE_COLUMNS, capacity=log_trades_every)
         self.output_mode = output_mode
         self.db_name = db_name
+        self.flush_interval_ms = flush_interval_ms
 
     def _on_message(self, ws, message):
 
-        response = json.loads(message)
+        response = self._decode(message)
+
+        # Typed messages from kracked.schema.
+        if self.use_schema:
+            if response.channel == "trade" and response.type in ["update", "snapshot"]:
+                self._record_trades(response.data, TRADE_STRUCT)
+            self._emit_trades()
+            return
 
         reponse_keys = list(response.keys())
 
         if "channel" in reponse_keys:
             if response["channel"] == "trade":
                 if response["type"] in ["update", "snapshot"]:
-                    filled_trades = response["data"]
-                    for trade in filled_trades:
-                        recv_ts = datetime.datetime.now(datetime.timezone.utc).isoformat()
-                        ts_event = trade["timestamp"]
-                        symbol = trade["symbol"]
-                        price = trade["price"]
-                        qty = trade["qty"]
-                        side = trade["side"]
-                        ord_type = trade["ord_type"]
-                        trade_id = trade["trade_id"]
-                        self.all_trades.append(
-                            [ts_event, recv_ts, symbol, price, qty, side, ord_type, trade_id]
-                        )
+                    self._record_trades(response["data"], TRADE_DICT)
 
                 elif response["type"] == "snapshot":
                     pass
             elif response["channel"] in ["heartbeat", "status", "subscribe"]:
                 pass
 
+        self._emit_trades()
+
+    def _record_trades(self, filled_trades, fields):
+        """
+        Buffer the trades of a message. fields returns the TRADE_FIELDS of a trade,
+        for either dict or typed messages.
+        """
+        for trade in filled_trades:
+            recv_ts = time.time_ns()
+            ts_event, symbol, price, qty, side, ord_type, trade_id = fields(trade)
+            self.all_trades.append(
+                (ts_event, recv_ts, symbol, price, qty, side, ord_type, trade_id)
+            )
+
+    def _emit_trades(self):
+        """Emit the buffered trades to the I/O writer once log_trades_every is reached."""
         if len(self.all_trades) >= self.log_trades_every:
+            self._flush()
 
-            self.output_queue.put({
-                "channel": "trades",
-                "rows": self.all_trades,
-            })
+    def _flush(self):
+        """Emit the buffered trades to the I/O writer."""
+        if len(self.all_trades) == 0:
+            return
+
+        self.output_queue.put({
+            "channel": "trades",
+            "batch": self.all_trades.to_record_batch(),
+        })
 
-            self.all_trades = []
+        self.all_trades.clear()
 
     def _on_open(self, ws):
 
@@ -1004,7 +1184,7 @@ class KrakenInstruments(BaseKrakenWS):
         self.output_directory = output_directory
 
     def _on_message(self, ws, message):
-        response = json.loads(message)
+        response = self._decode(message)
         if response["channel"] == "status":
             pass
         else:
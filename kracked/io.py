@@ -1,22 +1,523 @@
 import warnings
 import sqlite3
+import glob
 import os
-import json
 import queue
 import copy
+import time
+import urllib.parse
+import uuid
 
+import numpy as np
 import pandas as pd
 import pyarrow.parquet as pq
+import pyarrow.csv as pa_csv
+import pyarrow.compute as pc
 import pyarrow as pa
 
 from typing import List, Any, Union
 
+from kracked.buffers import record_batch_rows, concat_batches, as_table, format_timestamps
+from kracked.manifest import file_entry, merge_entries, manifest_for
+
+
+def L2_level_columns(depth: int) -> List[str]:
+    """
+    Return the per-level column names of the wide L2 layout,
+    i.e. [ask_px_0, ask_sz_0, bid_px_0, bid_sz_0, ask_px_1, ...].
+    """
+    columns = []
+    for i in range(depth):
+        columns.extend([
+            "ask_px_" + str(i),
+            "ask_sz_" + str(i),
+            "bid_px_" + str(i),
+            "bid_sz_" + str(i),
+        ])
+    return columns
+
+
+def stack_L2_payloads(payloads: List[dict]):
+    """
+    Stack the book arrays of several L2 payloads (all for the same symbol and depth)
+    into a single 2-D block in one call.
+
+    Parameters
+    ----------
+    payloads (List[dict]): L2 payloads as emitted by KrakenL2.
+
+    Returns
+    -------
+    (List[str], List[str], np.ndarray): Exchange timestamps, receive timestamps and
+    the (n_rows, 4*depth) block of levels.
+    """
+    timestamps = [p["timestamp"] for p in payloads]
+    recv_timestamps = [p["ts_recv"] for p in payloads]
+    block = np.vstack([p["book"] for p in payloads])
+    return timestamps, recv_timestamps, block
+
+
+# Layouts of the L2 books in SQL, see KrackedWriter's L2_sql_layout.
+L2_SQL_LAYOUTS = ["wide", "long", "blob"]
+
+
+def L2_long_rows(symbol: str, timestamps: List[str], recv_timestamps: List[str], block: np.ndarray) -> List[tuple]:
+    """
+    Convert a block of L2 snapshots to rows of the long SQL layout, i.e.
+    (symbol, timestamp, ts_recv, side, level, px, sz) for every non-empty level.
+
+    Parameters
+    ----------
+    symbol (str): The symbol of the snapshots.
+    timestamps (List[str]): Exchange timestamp of each snapshot.
+    recv_timestamps (List[str]): Receive timestamp of each snapshot.
+    block (np.ndarray): Snapshots in the wide column order, shape (n_rows, 4*depth).
+
+    Returns
+    -------
+    List[tuple]: The rows, asks then bids of each snapshot, best level first.
+    """
+    levels = block.reshape(len(block), -1, 4)
+    rows = []
+    for i, (ts, ts_recv) in enumerate(zip(timestamps, recv_timestamps)):
+        for side, px_col in [("a", 0), ("b", 2)]:
+            # Levels missing from a shallow side are trailing zero sizes.
+            sz = levels[i, :, px_col + 1]
+            n = int(np.count_nonzero(sz))
+            rows.extend(zip(
+                [symbol] * n, [ts] * n, [ts_recv] * n, [side] * n, range(n),
+                levels[i, :n, px_col].tolist(), sz[:n].tolist(),
+            ))
+    return rows
+
+
+def L2_blobs(block: np.ndarray) -> List[bytes]:
+    """Pack each snapshot of a block into a little endian float64 blob, for the blob SQL layout."""
+    block = np.ascontiguousarray(block, dtype="<f8")
+    return [row.tobytes() for row in block]
+
+
+def L2_unpack_blobs(blobs: List[bytes], depth: int) -> np.ndarray:
+    """Unpack blobs written by L2_blobs into a (n_rows, 4*depth) block."""
+    if len(blobs) == 0:
+        return np.zeros((0, 4 * depth))
+    return np.frombuffer(b"".join(blobs), dtype="<f8").reshape(len(blobs), 4 * depth)
+
+
+# Formats of the timestamps in the outputs, see KrackedWriter's timestamp_format.
+TIMESTAMP_FORMATS = ["iso", "ns"]
+
+
+def timestamps_to_ns(values) -> pa.Array:
+    """
+    Convert timestamps given either as epoch nanoseconds or as ISO-8601 text with a
+    zone (e.g. Kraken's "2026-10-17T00:00:00.123456Z") to an int64 array of epoch
+    nanoseconds. None stays null.
+    """
+    first = next((v for v in values if v is not None), None)
+    if first is None or isinstance(first, (int, np.integer)):
+        return pa.array(values, pa.int64())
+    return pc.cast(pa.array(values, pa.string()), pa.timestamp("ns", tz="UTC")).cast(pa.int64())
+
+
+def timestamps_to_iso(values) -> pa.Array:
+    """
+    Convert timestamps given either as epoch nanoseconds or as ISO-8601 text to an
+    array of ISO-8601 text. Epoch nanoseconds are formatted as UTC, e.g.
+    "2026-10-17T00:00:00.123456789Z", text is kept as is.
+    """
+    first = next((v for v in values if v is not None), None)
+    if first is None or isinstance(first, str):
+        return pa.array(values, pa.string())
+    return pc.strftime(pa.array(values, pa.int64()).cast(pa.timestamp("ns", tz="UTC")), format="%Y-%m-%dT%H:%M:%SZ")
+
+
+# Time column of each table KrackedDB indexes on (symbol, time) and reads by time range.
+SQL_TIME_COLUMNS = {
+    "L1": "timestamp",
+    "L2": "ts_recv",
+    "L2_deltas": "ts_recv",
+    "L2_keyframes": "ts_recv",
+    "L2_keyframes_blob": "ts_recv",
+    "L3": "ts_event",
+    "OHLC": "timestamp",
+    "OHLC_bars": "interval_begin",
+    "OHLC_live": "interval_begin",
+    "trades": "ts_event",
+}
+
+# Book indexes of the L2 layouts holding several rows per book, which also serve
+# (symbol, time) reads: table -> (index name, columns).
+SQL_BOOK_INDEXES = {
+    "L2_long": ("L2_long_book", "symbol, ts_recv, side, level"),
+    "L2_blob": ("L2_blob_book", "symbol, ts_recv"),
+}
+
+# How KrackedWriter stores OHLC updates, see its ohlc_storage.
+OHLC_STORAGES = ["log", "final"]
+
+# Columns of the OHLC_bars and OHLC_live outputs of ohlc_storage="final".
+OHLC_BAR_COLUMNS = ["symbol", "interval", "interval_begin", "timestamp", "open", "high", "low", "close",
+                    "volume", "vwap", "trades", "ttrue"]
+
+# When KrackedDB creates the (symbol, time) and book indexes, see its index_mode.
+SQL_INDEX_MODES = ["eager", "on_close", "manual"]
+
+
+def csv_line(row) -> str:
+    """Format a row of native values as a CSV line, with None as an empty field."""
+    return ",".join(["" if x is None else str(x) for x in row])
+
+
+def partition_dates(column) -> pa.Array:
+    """
+    Return the YYYY-MM-DD date of each value of a timestamp column, given either as
+    an Arrow timestamp column or as ISO-8601 text.
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    elif not isinstance(column, pa.Array):
+        column = pa.array(column, pa.string())
+    if pa.types.is_timestamp(column.type):
+        return pc.strftime(column, format="%Y-%m-%d")
+    return pc.utf8_slice_codeunits(column, 0, 10)
+
+
+def check_parquet_schema(root_path: str, schema: pa.Schema) -> None:
+    """
+    Raise a ValueError if the parquet dataset at root_path already holds files storing a
+    column of schema with another type, which pyarrow cannot append to or read back
+    as one dataset. This happens to datasets written by versions before
+    timestamp_format existed, whose timestamps were ISO-8601 text. Such datasets have to be migrated (rewritten with the new column types) or
+    the output written to another directory.
+    """
+    def _value_type(type_):
+        return type_.value_type if pa.types.is_dictionary(type_) else type_
+
+    def _visible(path):
+        parts = os.path.relpath(path, root_path).split(os.sep)
+        return not any(part.startswith((".", "_")) for part in parts)
+
+    files = glob.iglob(os.path.join(glob.escape(root_path), "**", "*.parquet"), recursive=True)
+    existing = next((f for f in files if _visible(f)), None)
+    if existing is None:
+        return
+    old = pq.read_schema(existing)
+    for field in schema:
+        index = old.get_field_index(field.name)
+        if index < 0:
+            continue
+        old_type, new_type = _value_type(old.field(index).type), _value_type(field.type)
+        if old_type != new_type and not (pa.types.is_timestamp(old_type) and pa.types.is_timestamp(new_type)):
+            raise ValueError(
+                f"Parquet dataset {root_path} stores column {field.name} as {old_type}, not {new_type}. "
+                f"It was written by an older version of kracked: "
+                f"migrate it to the new column types or write to another output_directory."
+            )
+
+
+class ParquetStreamWriter:
+    """
+    Streams tables into a parquet dataset directory through a long-lived
+    pyarrow.parquet.ParquetWriter, without any intermediate files.
+
+    Tables are buffered in memory and written as one row group every row_group_size
+    rows. A file is closed and a new one started every rows_per_file rows, or once its
+    first row is max_file_seconds old. Files are written under a hidden name (leading
+    ".") and renamed into place once closed, so readers of the dataset only ever see
+    complete files. Hidden files left behind by a crash are ignored by pyarrow and
+    pandas, and cannot be read back without their footer: a crash loses the buffered
+    rows and the open file, i.e. at most max_file_seconds (or rows_per_file rows) of
+    data per stream.
+
+    Parameters
+    ----------
+    root_path : str
+        The dataset directory, created if needed.
+    row_group_size : int
+        Number of buffered rows written as one row group.
+    rows_per_file : int
+        Number of rows after which the current file is closed.
+    max_file_seconds : float or None
+        Age in seconds after which the current file is closed, buffered rows included.
+        Checked on write and by check_age. None only closes files by row count.
+    compression : str
+        Parquet compression codec, e.g. "snappy", "zstd", "lz4", "gzip" or "none".
+    manifest : DatasetManifest or None
+        If given, each closed file is added to this manifest (see kracked.manifest)...
+    symbols : List[str] or None
+        ...with these symbols, for tables without a symbol column.
+    """
+
+    def __init__(self, root_path, row_group_size=1000, rows_per_file=100_000, compression="snappy",
+                 manifest=None, symbols=None, max_file_seconds=300.0):
+        self.root_path = root_path
+        self.row_group_size = row_group_size
+        self.rows_per_file = rows_per_file
+        self.max_file_seconds = max_file_seconds
+        self.compression = compression
+        self.manifest = manifest
+        self.symbols = symbols
+        self._entry = None
+
+        self._tables = []
+        self._buffered_rows = 0
+        self._writer = None
+        self._path = None
+        self._rows_in_file = 0
+        # time.monotonic() of the first row since the last file was closed.
+        self._started_at = None
+
+    def write(self, table):
+        """Buffer a table, writing a row group once row_group_size rows are buffered."""
+        if self._started_at is None:
+            self._started_at = time.monotonic()
+        self._tables.append(table)
+        self._buffered_rows += len(table)
+        if self._buffered_rows >= self.row_group_size:
+            self.flush()
+        self.check_age()
+
+    def check_age(self):
+        """Write the buffered rows and close the current file if it is max_file_seconds old."""
+        if (
+            self.max_file_seconds is not None
+            and self._started_at is not None
+            and time.monotonic() - self._started_at >= self.max_file_seconds
+        ):
+            self.close()
+
+    def flush(self):
+        """Write the buffered rows as a row group of the current file."""
+        if self._buffered_rows == 0:
+            return
+
+        table = pa.concat_tables(self._tables)
+        self._tables = []
+        self._buffered_rows = 0
+
+        if self._writer is None:
+            os.makedirs(self.root_path, exist_ok=True)
+            name = f"{uuid.uuid4().hex}.parquet"
+            self._path = f"{self.root_path}/{name}"
+            self._writer = pq.ParquetWriter(
+                f"{self.root_path}/.{name}", table.schema, compression=self.compression,
+            )
+
+        self._writer.write_table(table, row_group_size=len(table))
+        self._rows_in_file += len(table)
+        if self.manifest is not None:
+            entry = file_entry(table, self.symbols)
+            self._entry = entry if self._entry is None else merge_entries(self._entry, entry)
+        if self._rows_in_file >= self.rows_per_file:
+            self.close_file()
+
+    def close_file(self):
+        """Close the current file and rename it into the dataset."""
+        if self._writer is None:
+            return
+        self._writer.close()
+        hidden = f"{self.root_path}/.{os.path.basename(self._path)}"
+        os.replace(hidden, self._path)
+        if self.manifest is not None:
+            self.manifest.update({self._path: self._entry})
+        self._entry = None
+        self._writer = None
+        self._path = None
+        self._rows_in_file = 0
+        self._started_at = None
+
+    def close(self):
+        """Write any buffered rows and close the current file."""
+        self.flush()
+        self.close_file()
+        self._started_at = None
+
+
+class ArrowStreamWriter:
+    """
+    Appends tables to rotating Arrow IPC stream segments in a directory.
+
+    Every table is written to the operating system as soon as it arrives, so other
+    processes can memory-map the current segment and read the batches written so far
+    without any decoding (see kracked.reader.read_arrow). The current segment is named
+    <start_ns>.arrows.open. It is closed and renamed to <start_ns>.arrows once it holds
+    rows_per_segment rows or is segment_seconds old, or when the schema changes. Closed
+    segments are never written to again and can be converted to parquet by a separate
+    job (see kracked.convert).
+
+    Parameters
+    ----------
+    root_path : str
+        The segment directory, created if needed.
+    rows_per_segment : int
+        Number of rows after which the current segment is closed.
+    segment_seconds : float or None
+        Age in seconds after which the current segment is closed, checked on write.
+    """
+
+    def __init__(self, root_path, rows_per_segment=1_000_000, segment_seconds=3600.0):
+        self.root_path = root_path
+        self.rows_per_segment = rows_per_segment
+        self.segment_seconds = segment_seconds
+
+        self._sink = None
+        self._writer = None
+        self._schema = None
+        self._path = None
+        self._opened_at = None
+        self._rows_in_segment = 0
+
+    def write(self, table):
+        """Append a table to the current segment, rotating it if due."""
+        if self._writer is not None and not table.schema.equals(self._schema):
+            self.close_segment()
+
+        if self._writer is None:
+            os.makedirs(self.root_path, exist_ok=True)
+            self._path = f"{self.root_path}/{time.time_ns():020d}.arrows"
+            self._sink = pa.OSFile(self._path + ".open", "wb")
+            self._writer = pa.ipc.new_stream(self._sink, table.schema)
+            self._schema = table.schema
+            self._opened_at = time.monotonic()
+
+        self._writer.write_table(table)
+        self._rows_in_segment += len(table)
+
+        if self._rows_in_segment >= self.rows_per_segment or (
+            self.segment_seconds is not None and time.monotonic() - self._opened_at >= self.segment_seconds
+        ):
+            self.close_segment()
+
+    def close_segment(self):
+        """Close the current segment and give it its final name."""
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._sink.close()
+        os.replace(self._path + ".open", self._path)
+        self._sink = None
+        self._writer = None
+        self._schema = None
+        self._path = None
+        self._rows_in_segment = 0
+
+    def close(self):
+        """Close the current segment."""
+        self.close_segment()
+
+
+class CSVSink:
+    """
+    Append-only CSV file kept open for the lifetime of the writer.
+
+    Rows go into a large userspace buffer instead of reopening the file for every
+    payload, and reach the operating system when the buffer fills up, when flush() is
+    called (see KrackedWriter's csv_flush_interval) or on close(). The header is
+    written once, when the file is created.
+
+    If rotate_bytes is set, the file is closed and renamed to <name>-<YYYYmmddTHHMMSS>.csv
+    once it exceeds that size (with the nanoseconds of the rotation appended to keep
+    names unique), and a new file with a header is started under the original name. csv_parts lists the rotated files and the current one in order.
+
+    Parameters
+    ----------
+    path : str
+        The CSV file.
+    header : List[str] or None
+        The column names. None for batches written with write_batch, whose header is
+        taken from the batch.
+    buffer_bytes : int
+        Size of the userspace write buffer.
+    rotate_bytes : int or None
+        Size after which the file is rotated.
+    """
+
+    def __init__(self, path, header=None, buffer_bytes=1 << 20, rotate_bytes=None):
+        self.path = path
+        self.header = header
+        self.buffer_bytes = buffer_bytes
+        self.rotate_bytes = rotate_bytes
+        self.unflushed_since = None
+
+        self._fil = None
+        self._size = 0
+
+    def _open(self, columns):
+        self._fil = open(self.path, "ab", buffering=self.buffer_bytes)
+        self._size = self._fil.tell()
+        if self._size == 0 and columns is not None:
+            self._write((",".join(columns) + "\n").encode())
+
+    def _write(self, data):
+        self._fil.write(data)
+        self._size += len(data)
+        if self.unflushed_since is None:
+            self.unflushed_since = time.monotonic()
+
+    def _maybe_rotate(self):
+        if self.rotate_bytes is not None and self._size >= self.rotate_bytes:
+            self._fil.close()
+            self._fil = None
+            stem = self.path[:-len(".csv")] if self.path.endswith(".csv") else self.path
+            os.replace(self.path, f"{stem}-{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{time.time_ns() % 10**9:09d}.csv")
+            self.unflushed_since = None
+
+    def write_lines(self, lines):
+        """Append rows, given as already formatted lines without the newline."""
+        if self._fil is None:
+            self._open(self.header)
+        self._write(("\n".join(lines) + "\n").encode())
+        self._maybe_rotate()
+
+    def write_batch(self, batch):
+        """Append a pyarrow RecordBatch or Table."""
+        if self._fil is None:
+            self._open(batch.schema.names)
+        start = self._fil.tell()
+        # Unquoted, like the rows written by write_lines.
+        pa_csv.write_csv(batch, self._fil, pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+        self._size += self._fil.tell() - start
+        if self.unflushed_since is None:
+            self.unflushed_since = time.monotonic()
+        self._maybe_rotate()
+
+    def flush(self):
+        """Hand the buffered rows to the operating system."""
+        if self._fil is not None:
+            self._fil.flush()
+        self.unflushed_since = None
+
+    def close(self):
+        """Flush and close the file."""
+        if self._fil is not None:
+            self._fil.close()
+            self._fil = None
+        self.unflushed_since = None
+
+
+def csv_parts(path: str) -> List[str]:
+    """
+    Return the files of a CSV output in the order they were written: the parts rotated
+    by CSVSink, then the current file.
+    """
+    stem = path[:-len(".csv")]
+    parts = sorted(glob.glob(f"{glob.escape(stem)}-*.csv"))
+    if os.path.exists(path):
+        parts.append(path)
+    return parts
+
 
 class KrackedDB:
 
     def __init__(self,
                  db_name: str = "kracked_outputs.db",
                  overwrite: bool = False,
+                 journal_mode: str = "WAL",
+                 synchronous: str = "NORMAL",
+                 timestamp_format: str = "iso",
+                 index_mode: str = "on_close",
+                 read_only: bool = False,
                  ):
         """
             This class handles I/O with the SQLite database.
@@ -27,11 +528,63 @@ class KrackedDB:
                 The name of the database to create.
             overwrite: bool
                 Whether to overwrite the database if it already exists. Default is False.
+            journal_mode: str
+                The SQLite journal mode set on connect. Default is "WAL", which lets readers
+                query the database while the writer holds its connection open.
+            synchronous: str
+                The SQLite synchronous setting, "OFF", "NORMAL", "FULL" or "EXTRA". With WAL,
+                "NORMAL" only syncs at checkpoints and cannot corrupt the database, but the
+                last commits may be lost on a power failure. Default is "NORMAL".
+            timestamp_format: str
+                "iso" declares the timestamp columns of new tables as text, for ISO-8601
+                timestamps. "ns" declares them as integer, for epoch nanoseconds.
+                Default is "iso".
+            index_mode: str
+                When the (symbol, time) indexes of the tables in SQL_TIME_COLUMNS, and
+                the book indexes of SQL_BOOK_INDEXES, are created. "eager" creates them with the tables, so every insert also
+                updates them. "on_close" creates them when the KrackedWriter closes,
+                i.e. after the bulk load, so they do not slow down ingestion. "manual"
+                only creates them on create_index() or create_indexes(). Building an
+                index holds the write lock of the database for as long as it takes,
+                so reads never build them. Default is "on_close".
+            read_only: bool
+                Whether to open an existing database read-only (a file: URI with
+                mode=ro), e.g. next to a live writer. The journal mode is then left as
+                the writer set it, and nothing is created. Default is False.
 
         """
+        journal_modes = ["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"]
+        if journal_mode.upper() not in journal_modes:
+            raise ValueError(f"Invalid journal_mode: {journal_mode}, select from {journal_modes}")
+        synchronous_modes = ["OFF", "NORMAL", "FULL", "EXTRA"]
+        if synchronous.upper() not in synchronous_modes:
+            raise ValueError(f"Invalid synchronous: {synchronous}, select from {synchronous_modes}")
+        if timestamp_format not in TIMESTAMP_FORMATS:
+            raise ValueError(f"Invalid timestamp_format: {timestamp_format}, select from {TIMESTAMP_FORMATS}")
+
+        if index_mode not in SQL_INDEX_MODES:
+            raise ValueError(f"Invalid index_mode: {index_mode}, select from {SQL_INDEX_MODES}")
+
         self.db_name = db_name
+        self.timestamp_format = timestamp_format
+        self.index_mode = index_mode
+        self.journal_mode = journal_mode.upper()
+        self.synchronous = synchronous.upper()
+        self.con = None
+        self.cur = None
+
+        # Commit latency statistics, see commit_stats.
+        self.n_commits = 0
+        self.commit_time_total = 0.0
+        self.commit_time_max = 0.0
+        self.commit_time_last = 0.0
+
+        self.read_only = read_only
 
-        if os.path.exists(db_name):
+        if read_only:
+            if overwrite:
+                raise ValueError("Cannot overwrite a database opened with read_only=True")
+        elif os.path.exists(db_name):
             if overwrite:
                 os.remove(db_name)
             else:
@@ -42,14 +595,46 @@ class KrackedDB:
         """
         Connect to the database. Set the cur and con attributes of the class instance.
         """
+        if self.read_only:
+            uri = f"file:{urllib.parse.quote(os.path.abspath(self.db_name))}?mode=ro"
+            self.con = sqlite3.connect(uri, uri=True)
+            self.cur = self.con.cursor()
+            return
         self.con = sqlite3.connect(self.db_name)
         self.cur = self.con.cursor()
+        self.cur.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        self.cur.execute(f"PRAGMA synchronous={self.synchronous}")
+
+    def commit(self):
+        """
+        Commit the open transaction, recording its latency.
+        """
+        start = time.perf_counter()
+        self.con.commit()
+        elapsed = time.perf_counter() - start
+
+        self.n_commits += 1
+        self.commit_time_total += elapsed
+        self.commit_time_last = elapsed
+        self.commit_time_max = max(self.commit_time_max, elapsed)
+
+    def commit_stats(self) -> dict:
+        """
+        Return the number of commits and their mean, max and last latency in milliseconds.
+        """
+        mean = self.commit_time_total / self.n_commits if self.n_commits else 0.0
+        return {
+            "n_commits": self.n_commits,
+            "mean_ms": 1000 * mean,
+            "max_ms": 1000 * self.commit_time_max,
+            "last_ms": 1000 * self.commit_time_last,
+        }
 
     def safe_disconnect(self):
         """
         Safely disconnect from the database, after committing changes.
         """
-        self.con.commit()
+        self.commit()
         self.con.close()
         self.cur = None
         self.con = None
@@ -72,25 +657,29 @@ class KrackedDB:
 
     def create_table(self, table_name: str, depth: Union[None, int] = None) -> None:
 
-        valids = ["L1", "L2", "L3", "OHLC", "trades", "connections"]
+        valids = ["L1", "L2", "L2_long", "L2_blob", "L2_deltas", "L2_keyframes", "L2_keyframes_blob",
+                  "L3", "OHLC", "OHLC_bars", "OHLC_live", "trades", "connections"]
         if table_name not in valids:
             raise ValueError(f"Invalid table name: {table_name}, select from {valids}")
 
+        # Type affinity of the timestamp columns.
+        ts = "integer" if self.timestamp_format == "ns" else "text"
+
         if table_name == "L1":
-            self.cur.execute("""CREATE TABLE IF NOT EXISTS L1 (
-                                timestamp text,
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS L1 (
+                                timestamp {ts},
                                 symbol text,
-                                bid numeric,
-                                bid_qty numeric,
-                                ask numeric,
-                                ask_qty numeric,
-                                last numeric,
-                                volume numeric,
-                                vwap numeric,
-                                low numeric,
-                                high numeric,
-                                change numeric,
-                                change_pct numeric
+                                bid real,
+                                bid_qty real,
+                                ask real,
+                                ask_qty real,
+                                last real,
+                                volume real,
+                                vwap real,
+                                low real,
+                                high real,
+                                change real,
+                                change_pct real
                             )""")
 
         elif table_name == "L2":
@@ -102,71 +691,260 @@ class KrackedDB:
                 # of the SQL table's columns.
                 raise ValueError("Depth must be an integer.")
 
-            columns = ["symbol", "timestamp", "ts_recv"]
-            for i in range(depth):
-                columns.extend( [
-                    "ask_px_" + str(i),
-                    "ask_sz_" + str(i),
-                    "bid_px_" + str(i),
-                    "bid_sz_" + str(i),
-                ])
-
-            self.cur.execute(f"CREATE TABLE IF NOT EXISTS L2 ({', '.join(columns)})")    
-        
+            columns = ["symbol text", f"timestamp {ts}", f"ts_recv {ts}"] + [f"{c} real" for c in L2_level_columns(depth)]
+
+            self.cur.execute(f"CREATE TABLE IF NOT EXISTS L2 ({', '.join(columns)})")
+
+        elif table_name == "L2_long":
+
+            # One row per level. A book is the rows sharing a symbol and ts_recv.
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS L2_long (
+                                symbol text,
+                                timestamp {ts},
+                                ts_recv {ts},
+                                side text,
+                                level integer,
+                                px real,
+                                sz real
+                            )""")
+
+        elif table_name == "L2_blob":
+
+            # One row per book, the levels packed by L2_blobs.
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS L2_blob (
+                                symbol text,
+                                timestamp {ts},
+                                ts_recv {ts},
+                                depth integer,
+                                book blob
+                            )""")
+
+        elif table_name == "L2_deltas":
+
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS L2_deltas (
+                                symbol text,
+                                side text,
+                                price real,
+                                qty real,
+                                ts_event {ts},
+                                ts_recv {ts},
+                                seq integer
+                            )""")
+
+        elif table_name == "L2_keyframes":
+            if depth is None:
+                raise NameError("Must provide depth for L2 keyframes in table creation.")
+            elif not isinstance(depth, int):
+                raise ValueError("Depth must be an integer.")
+
+            columns = ["symbol text", f"timestamp {ts}", f"ts_recv {ts}", "seq integer"] + [f"{c} real" for c in L2_level_columns(depth)]
+
+            self.cur.execute(f"CREATE TABLE IF NOT EXISTS L2_keyframes ({', '.join(columns)})")
+
+        elif table_name == "L2_keyframes_blob":
+
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS L2_keyframes_blob (
+                                symbol text,
+                                timestamp {ts},
+                                ts_recv {ts},
+                                seq integer,
+                                depth integer,
+                                book blob
+                            )""")
+
         elif table_name == "L3":
 
-            self.cur.execute("""CREATE TABLE IF NOT EXISTS L3 (
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS L3 (
                                 side text,
-                                ts_event text,
-                                ts_recv text,
-                                price numeric,
-                                size numeric,
+                                ts_event {ts},
+                                ts_recv {ts},
+                                price real,
+                                size real,
                                 action text,
-                                order_id numeric, 
-                                symbol text 
+                                order_id text,
+                                symbol text
                             )
                             """)
 
         elif table_name == "OHLC":
 
-            self.cur.execute("""CREATE TABLE IF NOT EXISTS OHLC (
-                                timestamp text,
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS OHLC (
+                                timestamp {ts},
                                 symbol text,
-                                open numeric,
-                                high numeric,
-                                low numeric,
-                                close numeric,
-                                volume numeric,
-                                vwap numeric,
-                                trades numeric,
-                                tstart text,
-                                ttrue text
+                                open real,
+                                high real,
+                                low real,
+                                close real,
+                                volume real,
+                                vwap real,
+                                trades integer,
+                                tstart {ts},
+                                ttrue {ts}
                             )
                             """)
 
+        elif table_name in ["OHLC_bars", "OHLC_live"]:
+
+            # One row per bar, or per symbol and interval for the in-progress bars.
+            key = "symbol, interval, interval_begin" if table_name == "OHLC_bars" else "symbol, interval"
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS {table_name} (
+                                symbol text,
+                                interval integer,
+                                interval_begin {ts},
+                                timestamp {ts},
+                                open real,
+                                high real,
+                                low real,
+                                close real,
+                                volume real,
+                                vwap real,
+                                trades integer,
+                                ttrue {ts},
+                                PRIMARY KEY ({key})
+                            )""")
+
         elif table_name == "trades":
 
-            self.cur.execute("""CREATE TABLE IF NOT EXISTS trades (
-                                ts_event text,
-                                ts_recv text,
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS trades (
+                                ts_event {ts},
+                                ts_recv {ts},
                                 symbol text,
-                                price numeric,
-                                qty numeric,
+                                price real,
+                                qty real,
                                 side text,
                                 ord_type text,
-                                trade_id numeric
+                                trade_id integer
             )""")
 
         elif table_name == "connections":
 
-            self.cur.execute("""CREATE TABLE IF NOT EXISTS connections (
+            self.cur.execute(f"""CREATE TABLE IF NOT EXISTS connections (
                                 feed text,
                                 event text,
-                                timestamp text,
+                                timestamp {ts},
                                 close_status_code integer,
                                 close_msg text
                             )""")
 
+        if self.index_mode == "eager":
+            self.create_index(table_name)
+
+    def create_index(self, table_name: str) -> bool:
+        """
+        Create the (symbol, time) index of a table in SQL_TIME_COLUMNS, or the book
+        index of a table in SQL_BOOK_INDEXES, if the table exists and the index does
+        not yet.
+
+        Parameters
+        ----------
+        table_name (str): The table to index.
+
+        Returns
+        -------
+        bool: True if the table has the index.
+        """
+        if table_name in SQL_BOOK_INDEXES:
+            index_name, columns = SQL_BOOK_INDEXES[table_name]
+        elif table_name in SQL_TIME_COLUMNS:
+            index_name, columns = f"{table_name}_symbol_time", f"symbol, {SQL_TIME_COLUMNS[table_name]}"
+        else:
+            return False
+        if not self._check_table_exists(table_name):
+            return False
+        self.cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})")
+        return True
+
+    def create_indexes(self) -> List[str]:
+        """
+        Create the (symbol, time) indexes of every existing table in SQL_TIME_COLUMNS
+        and the book indexes of SQL_BOOK_INDEXES, e.g. after a bulk load. Building an index over existing rows is much cheaper
+        than maintaining it across millions of inserts.
+
+        Returns
+        -------
+        List[str]: The indexed tables.
+        """
+        indexed = [table_name for table_name in [*SQL_TIME_COLUMNS, *SQL_BOOK_INDEXES] if self.create_index(table_name)]
+        self.commit()
+        return indexed
+
+    def _time_bound(self, value):
+        """Convert a datetime-like bound into the stored timestamp_format."""
+        if isinstance(value, (int, np.integer)):
+            ts = pd.Timestamp(int(value), tz="UTC")
+        else:
+            ts = pd.Timestamp(value)
+            ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+        if self.timestamp_format == "ns":
+            return ts.value
+        return f"{ts.strftime('%Y-%m-%dT%H:%M:%S')}.{ts.value % 10**9:09d}Z"
+
+    def _where(self, table_name: str, symbols, start, end):
+        """Return the WHERE clause and parameters selecting symbols and a time range."""
+        time_column = SQL_TIME_COLUMNS.get(table_name, "ts_recv")
+        clauses, params = [], []
+        if symbols is not None:
+            symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+            clauses.append(f"symbol IN ({','.join(['?'] * len(symbols))})")
+            params += symbols
+        if start is not None:
+            clauses.append(f"{time_column} >= ?")
+            params.append(self._time_bound(start))
+        if end is not None:
+            clauses.append(f"{time_column} <= ?")
+            params.append(self._time_bound(end))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where + f" ORDER BY {time_column}", params
+
+    def read(
+        self,
+        table_name: str,
+        symbols: Union[List[str], str, None] = None,
+        start=None,
+        end=None,
+        columns: Union[List[str], None] = None,
+        chunksize: Union[int, None] = None,
+    ):
+        """
+        Read the rows of some symbols in a time range from a table in SQL_TIME_COLUMNS,
+        in time order. The query uses the (symbol, time) index if it exists, see
+        index_mode. Reads never build indexes, which would lock out a live writer.
+
+        Bounds are compared with the stored timestamps, as integers with
+        timestamp_format="ns" and as ISO-8601 text otherwise. Text comparisons are
+        exact between timestamps of the same precision, e.g. the receive timestamps
+        written by KrackedWriter, and may be off by a fraction of a second against
+        exchange timestamps of another precision.
+
+        Parameters
+        ----------
+        table_name (str): The table to read, e.g. "trades".
+        symbols (List[str], str or None): The symbols to read, or None for all.
+        start, end (datetime-like, epoch ns or None): Inclusive bounds on the time column
+            of the table. Naive times are taken as UTC.
+        columns (List[str] or None): Columns to read, or None for all.
+        chunksize (int or None): If given, the rows are fetched lazily in DataFrames of
+            at most this many rows.
+
+        Returns
+        -------
+        pd.DataFrame: The matching rows, or an iterator of DataFrames if chunksize is given.
+        """
+        if table_name not in SQL_TIME_COLUMNS:
+            raise ValueError(f"Invalid table name: {table_name}, select from {list(SQL_TIME_COLUMNS)}")
+
+        select = "*"
+        if columns is not None:
+            # Validated, since the names are formatted into the query.
+            existing = [row[1] for row in self.cur.execute(f"PRAGMA table_info({table_name})").fetchall()]
+            invalid = [c for c in columns if c not in existing]
+            if invalid:
+                raise ValueError(f"Invalid columns for {table_name}: {invalid}")
+            select = ", ".join(columns)
+
+        where, params = self._where(table_name, symbols, start, end)
+        return pd.read_sql_query(f"SELECT {select} FROM {table_name}{where}", self.con, params=params, chunksize=chunksize)
+
     def write_L1(self, l1_data: List[Any]) -> None:
         """
         Write L1 data to the database.
@@ -185,7 +963,7 @@ class KrackedDB:
 
         Parameters
         ----------
-        l2_data (List[Any]): The L2 data to write.
+        l2_data (List[Any]): The L2 rows to write, each [symbol, timestamp, ts_recv, ask_px_0, ...].
         depth (int): The depth of the L2 data.
         """
 
@@ -197,9 +975,117 @@ class KrackedDB:
         # We need 4 SQL place holders for each depth level, plus symbol, timestamp, and ts_recv.
         placeholder = ["?"]*(depth*4+3)
 
-        self.cur.execute(f"INSERT INTO L2 VALUES ({','.join(placeholder)})", l2_data)
+        self.cur.executemany(f"INSERT INTO L2 VALUES ({','.join(placeholder)})", l2_data)
 
 
+    def write_L2_long(self, long_data: List[Any]) -> None:
+        """
+        Write L2 books in the long layout to the database.
+
+        Parameters
+        ----------
+        long_data (List[Any]): Rows of [symbol, timestamp, ts_recv, side, level, px, sz], see L2_long_rows.
+        """
+        self.cur.executemany("INSERT INTO L2_long VALUES (?, ?, ?, ?, ?, ?, ?)", long_data)
+
+    def write_L2_blob(self, blob_data: List[Any]) -> None:
+        """
+        Write L2 books in the blob layout to the database.
+
+        Parameters
+        ----------
+        blob_data (List[Any]): Rows of [symbol, timestamp, ts_recv, depth, book], see L2_blobs.
+        """
+        self.cur.executemany("INSERT INTO L2_blob VALUES (?, ?, ?, ?, ?)", blob_data)
+
+    def write_L2_keyframes_blob(self, keyframe_data: List[Any]) -> None:
+        """
+        Write L2 keyframes with packed levels to the database.
+
+        Parameters
+        ----------
+        keyframe_data (List[Any]): Rows of [symbol, timestamp, ts_recv, seq, depth, book].
+        """
+        self.cur.executemany("INSERT INTO L2_keyframes_blob VALUES (?, ?, ?, ?, ?, ?)", keyframe_data)
+
+    def read_L2(self, symbol: str, layout: str = "wide", depth: Union[int, None] = None,
+                start=None, end=None) -> pd.DataFrame:
+        """
+        Read the L2 books of a symbol in any SQL layout, as a wide DataFrame.
+
+        Parameters
+        ----------
+        symbol (str): The symbol to read, e.g. "BTC/USD".
+        layout (str): The layout the books were written in, "wide", "long" or "blob".
+        depth (int or None): For the long layout, the depth of the books. Inferred from
+            the deepest level if None.
+        start, end (datetime-like, epoch ns or None): Inclusive bounds on ts_recv, see read.
+
+        Returns
+        -------
+        pd.DataFrame: Columns symbol, timestamp, ts_recv, ask_px_0, ask_sz_0, bid_px_0, ...
+        in receive order. Levels missing from a book are 0.
+        """
+        if layout == "wide":
+            return self.read("L2", symbol, start, end)
+
+        where, params = self._where(f"L2_{layout}", symbol, start, end)
+
+        if layout == "blob":
+            rows = self.cur.execute(f"SELECT timestamp, ts_recv, depth, book FROM L2_blob{where}", params).fetchall()
+            depth = rows[0][2] if rows else (depth or 0)
+            block = L2_unpack_blobs([row[3] for row in rows], depth)
+            timestamps = [row[0] for row in rows]
+            recv_timestamps = [row[1] for row in rows]
+
+        elif layout == "long":
+            df = pd.read_sql_query(f"SELECT timestamp, ts_recv, side, level, px, sz FROM L2_long{where}", self.con, params=params)
+            if depth is None:
+                depth = int(df["level"].max()) + 1 if len(df) else 0
+            books, recv_timestamps = pd.factorize(df["ts_recv"])
+            first = np.unique(books, return_index=True)[1]
+            timestamps = df["timestamp"].to_numpy()[first].tolist()
+            recv_timestamps = list(recv_timestamps)
+
+            block = np.zeros((len(recv_timestamps), 4 * depth))
+            column = df["level"].to_numpy() * 4 + np.where(df["side"].to_numpy() == "b", 2, 0)
+            block[books, column] = df["px"].to_numpy()
+            block[books, column + 1] = df["sz"].to_numpy()
+
+        else:
+            raise ValueError(f"unknown L2 layout {layout!r}")
+
+        df = pd.DataFrame(block, columns=L2_level_columns(depth))
+        df.insert(0, "ts_recv", recv_timestamps)
+        df.insert(0, "timestamp", timestamps)
+        df.insert(0, "symbol", symbol)
+        return df
+
+    def write_L2_deltas(self, delta_data: List[Any]) -> None:
+        """
+        Write L2 level changes to the database.
+
+        Parameters
+        ----------
+        delta_data (List[Any]): Rows of [symbol, side, price, qty, ts_event, ts_recv, seq].
+        """
+        self.cur.executemany("INSERT INTO L2_deltas VALUES (?, ?, ?, ?, ?, ?, ?)", delta_data)
+
+    def write_L2_keyframes(self, keyframe_data: List[Any], depth: int) -> None:
+        """
+        Write full depth L2 keyframes to the database.
+
+        Parameters
+        ----------
+        keyframe_data (List[Any]): Rows of [symbol, timestamp, ts_recv, seq, ask_px_0, ...].
+        depth (int): The depth of the L2 data.
+        """
+        if not isinstance(depth, int):
+            raise ValueError("Depth must be an integer.")
+
+        placeholder = ["?"]*(depth*4+4)
+        self.cur.executemany(f"INSERT INTO L2_keyframes VALUES ({','.join(placeholder)})", keyframe_data)
+
     def write_L3(self, l3_data: List[Any]) -> None:
 
         """
@@ -240,6 +1126,24 @@ class KrackedDB:
         elif mode == "update":
             self.cur.execute("INSERT INTO OHLC VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", ohlc_data)
 
+    def upsert_ohlc(self, bar_data: List[Any], table_name: str = "OHLC_bars") -> None:
+        """
+        Insert OHLC bars, replacing the stored state of bars already present.
+
+        Parameters
+        ----------
+        bar_data (List[Any]): Rows in the OHLC_BAR_COLUMNS order.
+        table_name (str): "OHLC_bars", keyed on (symbol, interval, interval_begin), or
+            "OHLC_live", keyed on (symbol, interval).
+        """
+        key = ["symbol", "interval", "interval_begin"] if table_name == "OHLC_bars" else ["symbol", "interval"]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in OHLC_BAR_COLUMNS if c not in key)
+        self.cur.executemany(
+            f"INSERT INTO {table_name} VALUES ({', '.join(['?'] * len(OHLC_BAR_COLUMNS))}) "
+            f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {updates}",
+            bar_data,
+        )
+
     def write_connections(self, connection_data: List[Any]) -> None:
         """
         Write connection lifecycle events to the database.
@@ -263,16 +1167,28 @@ class KrackedWriter:
     protocol handling.
 
     Payload format (dict placed on the queue by feeds):
-        {"channel": "L1",    "rows": [[ts, sym, bid, ...], ...]}
-        {"channel": "L2",    "symbol": str, "depth": int, "line": [sym, ts, ...]}
-        {"channel": "L3",    "ticks": [[side, ts_event, ...], ...]}
-        {"channel": "OHLC",  "mode": "update"|"snapshot", "rows": [[...], ...]}
-        {"channel": "trades","rows": [[ts, sym, price, ...], ...]}
+        {"channel": "L1",    "rows": [[ts_recv, sym, bid, ...], ...]}
+        {"channel": "L2",    "symbol": str, "depth": int, "timestamp": str, "ts_recv": int,
+                             "book": np.ndarray of shape (4*depth,) in wide column order}
+        {"channel": "L2_delta", "symbol": str, "rows": [[side, price, qty, ts_event, ts_recv, seq], ...]}
+        {"channel": "L2_keyframe", "symbol": str, "depth": int, "timestamp": str, "ts_recv": int,
+                                   "seq": int, "book": np.ndarray of shape (4*depth,)}
+        {"channel": "L3",    "batch": pa.RecordBatch (or Table) with kracked.buffers.L3_COLUMNS}
+        {"channel": "OHLC",  "mode": "update"|"snapshot", "interval": int, "rows": [[...], ...]}
+        {"channel": "trades","batch": pa.RecordBatch (or Table) with kracked.buffers.TRADE_COLUMNS}
         {"channel": "instruments", "pairs": [...], "assets": [...], "keys": [...], "header_assets": [...]}
-        {"channel": "webapp_l2", "books": {symbol: {"bids": ..., "asks": ...}}}
         {"channel": "connections", "rows": [[feed, event, ts, close_code, close_msg], ...]}
         None  -- sentinel that causes the writer to flush and exit.
 
+    Prices, quantities and counts are native floats and ints. Receive timestamps
+    (ts_recv, the L1 timestamp, the connections timestamp) are int64 epoch nanoseconds
+    in UTC, exchange timestamps are Kraken's ISO-8601 text. Either kind is written in
+    the format selected by timestamp_format.
+
+    The "arrow" output mode appends the L2, L3 and trades outputs to rotating Arrow IPC
+    stream segments (see ArrowStreamWriter), in directories named like the parquet
+    datasets but ending in .arrows, e.g. trades.arrows/ or L2_BTC_USD_orderbook.arrows/.
+
     Parameters
     ----------
     output_queue : queue.Queue
@@ -280,14 +1196,99 @@ class KrackedWriter:
     output_directory : str
         Base directory for all file outputs.
     output_mode : str
-        Default output mode for all channels. Can be "sql", "csv", or "parquet".
+        Default output mode for all channels. Can be "sql", "csv", "parquet" or "arrow".
     db_name : str
         SQLite database file name (within output_directory).
     channel_modes : dict or None
         Optional per-channel output mode overrides, e.g. {"L2": "parquet", "trades": "sql"}.
     convert_to_parquet_every : int
-        For L2 parquet mode: number of updates per symbol before converting
-        the temporary CSV to a parquet partition.
+        For L2 parquet mode: number of book rows per symbol buffered in memory and
+        written as one parquet row group.
+    parquet_compression : str
+        Compression codec of the L2 parquet files.
+    parquet_rows_per_file : int
+        For L2 parquet mode: number of rows per symbol after which the current parquet
+        file is closed and made visible in the dataset (see ParquetStreamWriter).
+    parquet_max_file_seconds : float or None
+        For L2 parquet mode: age in seconds after which the current file of a symbol is
+        closed, whatever its row count, checked on write and while the queue is idle.
+        Rows not yet in a closed file are lost on a crash, so this bounds the loss for
+        slow symbols that take long to reach parquet_rows_per_file. Default is 300.
+    parquet_partitioning : bool
+        If True, parquet outputs are hive partitioned by symbol and event date, e.g.
+        trades.parquet/symbol=BTC_USD/date=2026-10-17/. The L2 books, deltas and
+        keyframes of all symbols then share the L2_orderbook.parquet, L2_deltas.parquet
+        and L2_keyframes.parquet datasets. Partition symbols have "/" replaced by "_",
+        and the symbol is not stored inside the files. See kracked.reader for a reader
+        that only opens the partitions a query needs.
+    parquet_manifest : bool
+        If True, each parquet dataset gets a _manifest.json listing its files with
+        their row counts, symbols and min/max event and receive timestamps (see
+        kracked.manifest). Files added are appended to its journal, folded into the
+        manifest on close(). Readers use it to skip the files outside a query without
+        opening them. Default is False.
+    csv_buffer_bytes : int
+        CSV files are kept open with a userspace buffer of this size (see CSVSink)...
+    csv_flush_interval : float
+        ...which is flushed to the operating system once its oldest row is this many
+        seconds old, when full, and when the writer stops.
+    csv_rotate_bytes : int or None
+        If set, CSV files are rotated once they exceed this size.
+    arrow_rows_per_segment : int
+        For arrow mode: number of rows after which an Arrow IPC segment is closed...
+    arrow_segment_seconds : float or None
+        ...or the age in seconds after which it is closed.
+    ohlc_storage : str
+        "log" appends every OHLC update to OHLC, so each bar appears many times.
+        "final" keeps one row per (symbol, interval, interval_begin) in OHLC_bars
+        (see OHLC_BAR_COLUMNS): upserted on every update in sql mode, and appended
+        to OHLC_bars.csv once a newer bar starts (and when the writer closes) in csv
+        mode. A restart may append a bar again, read OHLC_bars with KrackedReader to
+        keep only its last row.
+    ohlc_live : bool
+        With ohlc_storage="final", the in-progress bar of each symbol goes to a
+        separate OHLC_live table (or an OHLC_live.csv rewritten on each update), and
+        OHLC_bars only receives bars once they are complete.
+    timestamp_format : str
+        How the CSV and SQL outputs store timestamps: "iso" as ISO-8601 text in UTC,
+        e.g. "2026-10-17T00:00:00.123456789Z", "ns" as int64 epoch nanoseconds
+        (integer SQL columns, CSV fields). Parquet and arrow outputs always store UTC
+        nanosecond timestamp columns, which sort and compare without parsing. Parquet
+        datasets whose timestamps an older version wrote as text cannot take appends:
+        the first write to such a dataset raises a ValueError (see
+        check_parquet_schema) until it is migrated or another output_directory is used.
+    L2_sql_layout : str
+        For L2 sql mode: "wide" writes one row of 3 + 4*depth columns per book to the
+        L2 table, which exceeds SQLite's default limit of 2000 columns at depth 1000.
+        "long" writes one (symbol, timestamp, ts_recv, side, level, px, sz) row per
+        level to L2_long, indexed on (symbol, ts_recv, side, level) as set by
+        sql_index_mode. "blob" writes one
+        (symbol, timestamp, ts_recv, depth, book) row per book to L2_blob, with the
+        levels packed as float64 (see L2_blobs). With "long" or "blob", keyframes are
+        written to L2_keyframes_blob. Read any layout with KrackedDB.read_L2.
+    sql_synchronous : str
+        SQLite synchronous setting of the writer connection, see KrackedDB.
+    sql_index_mode : str
+        When the (symbol, time) indexes of the SQL tables are created, "eager",
+        "on_close" or "manual", see KrackedDB.
+    sql_lock_retries : int
+        Number of times a SQL write or commit failing with sqlite3.OperationalError
+        (e.g. "database is locked" while another connection writes) is retried...
+    sql_retry_wait : float
+        ...waiting this many seconds in between. Writes still failing after that are
+        reported and skipped, see failed_writes, so the writer thread keeps running.
+    commit_every_rows : int
+        The writer keeps a single SQLite connection open and groups writes into
+        transactions, committing once this many rows are pending...
+    commit_interval : float
+        ...or once the oldest pending row is this many seconds old. The commit latency
+        is available from commit_stats().
+    max_batch_payloads : int
+        The writer drains up to this many queued payloads at a time, groups them by
+        channel and symbol, and issues one bulk write per group...
+    max_batch_wait : float
+        ...waiting at most this many seconds for further payloads after the first one
+        of a batch. 0 only drains what is already queued.
     """
 
     def __init__(
@@ -298,6 +1299,28 @@ class KrackedWriter:
         db_name="kracked_outputs.db",
         channel_modes=None,
         convert_to_parquet_every=1000,
+        parquet_compression="snappy",
+        parquet_rows_per_file=100_000,
+        parquet_max_file_seconds=300.0,
+        parquet_partitioning=False,
+        parquet_manifest=False,
+        csv_buffer_bytes=1 << 20,
+        csv_flush_interval=1.0,
+        csv_rotate_bytes=None,
+        arrow_rows_per_segment=1_000_000,
+        arrow_segment_seconds=3600.0,
+        ohlc_storage="log",
+        ohlc_live=False,
+        timestamp_format="iso",
+        L2_sql_layout="wide",
+        sql_synchronous="NORMAL",
+        sql_index_mode="on_close",
+        sql_lock_retries=10,
+        sql_retry_wait=1.0,
+        commit_every_rows=5000,
+        commit_interval=1.0,
+        max_batch_payloads=1000,
+        max_batch_wait=0.0,
     ):
         self.output_queue = output_queue
         self.output_directory = output_directory
@@ -305,50 +1328,346 @@ class KrackedWriter:
         self.db_name = db_name
         self.channel_modes = channel_modes or {}
         self.convert_to_parquet_every = convert_to_parquet_every
+        self.parquet_compression = parquet_compression
+        self.parquet_rows_per_file = parquet_rows_per_file
+        self.parquet_max_file_seconds = parquet_max_file_seconds
+        self.parquet_partitioning = parquet_partitioning
+        self.parquet_manifest = parquet_manifest
+        # Dataset roots whose manifest journal is folded on close.
+        self._manifest_roots = set()
+        # Dataset roots whose existing files were checked by check_parquet_schema.
+        self._checked_datasets = set()
+        self.csv_buffer_bytes = csv_buffer_bytes
+        self.csv_flush_interval = csv_flush_interval
+        self.csv_rotate_bytes = csv_rotate_bytes
+        self.arrow_rows_per_segment = arrow_rows_per_segment
+        self.arrow_segment_seconds = arrow_segment_seconds
 
         if not os.path.exists(self.output_directory):
             os.makedirs(self.output_directory)
 
+        if timestamp_format not in TIMESTAMP_FORMATS:
+            raise ValueError(f"Invalid timestamp_format: {timestamp_format}, select from {TIMESTAMP_FORMATS}")
+        self.timestamp_format = timestamp_format
+        if ohlc_storage not in OHLC_STORAGES:
+            raise ValueError(f"Invalid ohlc_storage: {ohlc_storage}, select from {OHLC_STORAGES}")
+        self.ohlc_storage = ohlc_storage
+        self.ohlc_live = ohlc_live
+        if L2_sql_layout not in L2_SQL_LAYOUTS:
+            raise ValueError(f"Invalid L2_sql_layout: {L2_sql_layout}, select from {L2_SQL_LAYOUTS}")
+        self.L2_sql_layout = L2_sql_layout
+        self.sql_synchronous = sql_synchronous
+        if sql_index_mode not in SQL_INDEX_MODES:
+            raise ValueError(f"Invalid sql_index_mode: {sql_index_mode}, select from {SQL_INDEX_MODES}")
+        self.sql_index_mode = sql_index_mode
+        self.sql_lock_retries = sql_lock_retries
+        self.sql_retry_wait = sql_retry_wait
+        # Number of payload groups dropped after exhausting sql_lock_retries.
+        self.failed_writes = 0
+        self.commit_every_rows = commit_every_rows
+        self.commit_interval = commit_interval
+        self.max_batch_payloads = max_batch_payloads
+        self.max_batch_wait = max_batch_wait
+
         self.db = None
         self._initialized_tables = set()
-        self._l2_symbol_counts = {}
+        self._l2_streams = {}
+        self._arrow_streams = {}
+        self._csv_sinks = {}
+        # The in-progress OHLC bar of each (symbol, interval), for ohlc_storage="final".
+        self._ohlc_current = {}
+        self._pending_rows = 0
+        self._pending_since = None
+
+    def _L2_parquet_root(self, kind, symbol):
+        """Dataset root of the L2 "orderbook", "deltas" or "keyframes" parquet output."""
+        if self.parquet_partitioning:
+            return f"{self.output_directory}/L2_{kind}.parquet"
+        return f"{self.output_directory}/L2_{symbol.replace('/', '_')}_{kind}.parquet"
+
+    def _write_parquet(self, root_path, table, date_column, symbol=None):
+        """
+        Append a table to a parquet dataset, hive partitioned by symbol and the date of
+        date_column if parquet_partitioning is set. The symbol is taken from the table's
+        symbol column unless given.
+        """
+        self._check_parquet_schema(root_path, table.schema)
+        written = []
+        if not self.parquet_partitioning:
+            pq.write_to_dataset(table, root_path=root_path, file_visitor=written.append)
+            if self.parquet_manifest:
+                entry = file_entry(table, None if symbol is None else [symbol])
+                manifest_for(root_path).update({f.path: dict(entry, rows=f.metadata.num_rows) for f in written})
+                self._manifest_roots.add(root_path)
+            return
+
+        if symbol is None:
+            symbols = table.column("symbol").combine_chunks()
+            if pa.types.is_dictionary(symbols.type):
+                symbols = symbols.dictionary_decode()
+            symbols = pc.replace_substring(symbols, "/", "_")
+            table = table.drop_columns(["symbol"])
+        else:
+            symbols = pa.array([symbol.replace("/", "_")] * len(table), pa.string())
+
+        dates = partition_dates(table.column(date_column))
+        table = table.append_column("symbol", symbols).append_column("date", dates)
+        pq.write_to_dataset(table, root_path=root_path, partition_cols=["symbol", "date"], file_visitor=written.append)
+
+        if self.parquet_manifest:
+            added = {}
+            for f in written:
+                parts = dict(p.split("=", 1) for p in f.path.replace(os.sep, "/").split("/") if "=" in p)
+                rows = table.filter(pc.and_(
+                    pc.equal(table.column("symbol"), parts["symbol"]), pc.equal(table.column("date"), parts["date"]),
+                ))
+                added[f.path] = file_entry(rows.drop_columns(["symbol", "date"]), [parts["symbol"].replace("_", "/")])
+            manifest_for(root_path).update(added)
+            self._manifest_roots.add(root_path)
+
+    def _check_parquet_schema(self, root_path, schema):
+        """Run check_parquet_schema on the first write to each dataset."""
+        if root_path not in self._checked_datasets:
+            check_parquet_schema(root_path, schema)
+            self._checked_datasets.add(root_path)
+
+    def _write_arrow(self, root_path, table):
+        """Append a table to the Arrow IPC segments of root_path."""
+        stream = self._arrow_streams.get(root_path)
+        if stream is None:
+            stream = self._arrow_streams[root_path] = ArrowStreamWriter(
+                root_path,
+                rows_per_segment=self.arrow_rows_per_segment,
+                segment_seconds=self.arrow_segment_seconds,
+            )
+        stream.write(table)
+
+    def _timestamps(self, values):
+        """Return timestamps in the timestamp_format, as a list for SQL and CSV rows."""
+        if self.timestamp_format == "ns":
+            return timestamps_to_ns(values).to_pylist()
+        return timestamps_to_iso(values).to_pylist()
+
+    def _timestamp_array(self, values):
+        """
+        Return timestamps as a UTC nanosecond timestamp Arrow array for parquet and
+        arrow, whatever the timestamp_format.
+        """
+        return timestamps_to_ns(values).cast(pa.timestamp("ns", tz="UTC"))
+
+    def _csv_sink(self, path, header=None):
+        """Return the open CSVSink of a path, opening it on first use."""
+        sink = self._csv_sinks.get(path)
+        if sink is None:
+            sink = self._csv_sinks[path] = CSVSink(
+                path, header, buffer_bytes=self.csv_buffer_bytes, rotate_bytes=self.csv_rotate_bytes,
+            )
+        return sink
+
+    def _maybe_flush_csv(self):
+        """Flush the CSV sinks holding rows older than csv_flush_interval."""
+        now = time.monotonic()
+        for sink in self._csv_sinks.values():
+            if sink.unflushed_since is not None and now - sink.unflushed_since >= self.csv_flush_interval:
+                sink.flush()
+
+    def _maybe_close_parquet(self):
+        """Close the L2 parquet files older than parquet_max_file_seconds."""
+        for stream in self._l2_streams.values():
+            stream.check_age()
+
+    def flush_csv(self):
+        """Flush every CSV sink to the operating system."""
+        for sink in self._csv_sinks.values():
+            sink.flush()
 
     def _get_mode(self, channel):
         """Return the output mode for a given channel, falling back to the global default."""
         return self.channel_modes.get(channel, self.output_mode)
 
     def _ensure_db(self):
-        """Lazily create the KrackedDB instance on first SQL usage."""
+        """Lazily create and connect the KrackedDB instance on first SQL usage."""
         if self.db is None:
-            self.db = KrackedDB(db_name=f"{self.output_directory}/{self.db_name}")
+            self.db = KrackedDB(
+                db_name=f"{self.output_directory}/{self.db_name}",
+                synchronous=self.sql_synchronous,
+                timestamp_format=self.timestamp_format,
+                index_mode=self.sql_index_mode,
+            )
+        if self.db.con is None:
+            self.db.connect()
 
     def _ensure_table(self, table_name, depth=None):
         """Lazily create a SQL table on first write for that channel."""
+        self._ensure_db()
         if table_name not in self._initialized_tables:
-            self._ensure_db()
-            self.db.connect()
             if depth is not None:
                 self.db.create_table(table_name, depth)
             else:
                 self.db.create_table(table_name)
-            self.db.safe_disconnect()
             self._initialized_tables.add(table_name)
 
+    def _sql_written(self, n_rows):
+        """
+        Account for rows written in the open transaction, and commit once the row or
+        time budget is exhausted.
+        """
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        self._pending_rows += n_rows
+        if self._pending_rows >= self.commit_every_rows:
+            self.commit()
+        else:
+            self._maybe_commit()
+
+    def _maybe_commit(self):
+        """Commit pending rows that are older than commit_interval."""
+        if self._pending_since is not None and time.monotonic() - self._pending_since >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        """Commit any pending SQL rows."""
+        if self.db is not None and self.db.con is not None and self._pending_since is not None:
+            self._retry_sql("commit", self.db.commit)
+        self._pending_rows = 0
+        self._pending_since = None
+
+    def commit_stats(self):
+        """Return the commit latency statistics of the SQLite connection, see KrackedDB.commit_stats."""
+        if self.db is None:
+            return {"n_commits": 0, "mean_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0}
+        return self.db.commit_stats()
+
+    def close(self):
+        """Commit pending rows, close the SQLite connection and the open csv, parquet and arrow files."""
+        self._close_OHLC_bars()
+        self.commit()
+        for sink in self._csv_sinks.values():
+            sink.close()
+        if self.db is not None and self.db.con is not None:
+            if self.db.index_mode == "on_close":
+                self.db.create_indexes()
+            self.db.safe_disconnect()
+        for stream in self._l2_streams.values():
+            stream.close()
+        for stream in self._arrow_streams.values():
+            stream.close()
+        for root_path in self._manifest_roots:
+            manifest_for(root_path).fold()
+
     def run(self):
         """
         Main consumer loop. Call this from a dedicated thread.
-        Blocks on queue.get() until a None sentinel is received.
+        Blocks on queue.get() until a None sentinel is received, committing pending
+        SQL rows whenever the queue is idle past the commit interval. Payloads are
+        drained from the queue in batches, see _drain and _dispatch_many.
         """
         while True:
             try:
-                payload = self.output_queue.get(timeout=1.0)
+                payload = self.output_queue.get(timeout=min(self.commit_interval, 1.0))
             except queue.Empty:
+                self._maybe_commit()
+                self._maybe_flush_csv()
+                self._maybe_close_parquet()
                 continue
 
+            payloads = self._drain(payload)
+            stopping = payloads and payloads[-1] is None
+            if stopping:
+                payloads.pop()
+
+            self._dispatch_many(payloads)
+            self._maybe_flush_csv()
+
+            if stopping:
+                break
+
+        self.close()
+
+    def _drain(self, first):
+        """
+        Collect up to max_batch_payloads payloads starting with first, waiting up to
+        max_batch_wait seconds for more to arrive. Stops at the None sentinel, which is
+        kept as the last element.
+        """
+        payloads = [first]
+        if first is None:
+            return payloads
+
+        deadline = time.monotonic() + self.max_batch_wait
+        while len(payloads) < self.max_batch_payloads:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    payload = self.output_queue.get(timeout=remaining)
+                else:
+                    payload = self.output_queue.get_nowait()
+            except queue.Empty:
+                break
+            payloads.append(payload)
             if payload is None:
                 break
+        return payloads
+
+    def _dispatch_many(self, payloads):
+        """
+        Group payloads by channel and symbol (keeping their order within each group)
+        and write each group in bulk: one stacked block for L2 books, one row list for
+        row payloads, one Arrow table for batch payloads. Other channels are dispatched
+        one by one.
+        """
+        groups = {}
+        for payload in payloads:
+            key = (
+                payload["channel"],
+                payload.get("symbol"),
+                payload.get("depth"),
+                payload.get("out_file_name"),
+            )
+            groups.setdefault(key, []).append(payload)
+
+        for (channel, symbol, depth, _), group in groups.items():
+            self._retry_sql(f"{channel} write", self._write_group, channel, symbol, depth, group)
+
+    def _retry_sql(self, what, fn, *args):
+        """
+        Call fn(*args), retrying on sqlite3.OperationalError up to sql_lock_retries
+        times. Returns False if it still failed, after reporting it.
+        """
+        for attempt in range(self.sql_lock_retries + 1):
+            try:
+                fn(*args)
+                return True
+            except sqlite3.OperationalError as e:
+                if attempt == self.sql_lock_retries:
+                    print(f"KrackedWriter: {what} failed after {attempt + 1} attempts, skipping it: {e}")
+                    self.failed_writes += 1
+                    return False
+                print(f"KrackedWriter: {what} failed ({e}), retrying in {self.sql_retry_wait}s.")
+                time.sleep(self.sql_retry_wait)
+
+    def _write_group(self, channel, symbol, depth, group):
+        """Write one group of payloads of _dispatch_many."""
+        if len(group) == 1:
+            self._dispatch(group[0])
+
+        elif channel == "L2":
+            timestamps, recv_timestamps, block = stack_L2_payloads(group)
+            self._write_L2_rows(symbol, depth, timestamps, recv_timestamps, block)
+
+        elif channel in ["L1", "L2_delta", "connections"]:
+            merged = dict(group[0])
+            merged["rows"] = [row for payload in group for row in payload["rows"]]
+            self._dispatch(merged)
 
-            self._dispatch(payload)
+        elif channel in ["L3", "trades"]:
+            merged = dict(group[0])
+            merged["batch"] = concat_batches([payload["batch"] for payload in group])
+            self._dispatch(merged)
+
+        else:
+            for payload in group:
+                self._dispatch(payload)
 
     def stop(self):
         """Send the sentinel to shut down the writer loop."""
@@ -362,6 +1681,10 @@ class KrackedWriter:
             self._write_L1(payload)
         elif channel == "L2":
             self._write_L2(payload)
+        elif channel == "L2_delta":
+            self._write_L2_delta(payload)
+        elif channel == "L2_keyframe":
+            self._write_L2_keyframe(payload)
         elif channel == "L3":
             self._write_L3(payload)
         elif channel == "OHLC":
@@ -370,8 +1693,6 @@ class KrackedWriter:
             self._write_trades(payload)
         elif channel == "instruments":
             self._write_instruments(payload)
-        elif channel == "webapp_l2":
-            self._write_webapp_l2(payload)
         elif channel == "connections":
             self._write_connections(payload)
 
@@ -381,25 +1702,18 @@ class KrackedWriter:
 
     def _write_L1(self, payload):
         mode = self._get_mode("L1")
-        rows = payload["rows"]
+        timestamps = self._timestamps([row[0] for row in payload["rows"]])
+        rows = [[ts] + row[1:] for ts, row in zip(timestamps, payload["rows"])]
 
         if mode == "csv":
-            path = f"{self.output_directory}/L1.csv"
-            if not os.path.exists(path):
-                with open(path, "w") as fil:
-                    fil.write(
-                        "timestamp,symbol,bid,bid_qty,ask,ask_qty,last,volume,vwap,low,high,change,change_pct\n"
-                    )
-            with open(path, "a") as fil:
-                for row in rows:
-                    fil.write(",".join(row) + "\n")
+            header = ["timestamp", "symbol", "bid", "bid_qty", "ask", "ask_qty", "last", "volume", "vwap",
+                      "low", "high", "change", "change_pct"]
+            self._csv_sink(f"{self.output_directory}/L1.csv", header).write_lines([csv_line(row) for row in rows])
 
         elif mode == "sql":
             self._ensure_table("L1")
-            self._ensure_db()
-            self.db.connect()
             self.db.write_L1(rows)
-            self.db.safe_disconnect()
+            self._sql_written(len(rows))
 
         else:
             raise NotImplementedError(f"L1 output mode '{mode}' not implemented, select csv or sql.")
@@ -409,93 +1723,228 @@ class KrackedWriter:
     # ------------------------------------------------------------------
 
     def _write_L2(self, payload):
+        self._write_L2_rows(
+            payload["symbol"],
+            payload["depth"],
+            [payload["timestamp"]],
+            [payload["ts_recv"]],
+            payload["book"].reshape(1, -1),
+        )
+
+    def _write_L2_rows(self, symbol, depth, timestamps, recv_timestamps, block):
+        """
+        Write a block of L2 book snapshots for a single symbol.
+
+        Parameters
+        ----------
+        symbol (str): The symbol the snapshots belong to.
+        depth (int): The depth of the book.
+        timestamps (List[str]): Exchange timestamp of each snapshot.
+        recv_timestamps (List[int]): Receive timestamp of each snapshot.
+        block (np.ndarray): Snapshots stacked into shape (n_rows, 4*depth).
+        """
+        mode = self._get_mode("L2")
+        ssymbol = symbol.replace("/", "_")
+        if mode in ["sql", "csv"]:
+            timestamps = self._timestamps(timestamps)
+            recv_timestamps = self._timestamps(recv_timestamps)
+
+        if mode == "sql" and self.L2_sql_layout == "long":
+            long_rows = L2_long_rows(symbol, timestamps, recv_timestamps, block)
+            self._ensure_table("L2_long")
+            self.db.write_L2_long(long_rows)
+            self._sql_written(len(long_rows))
+
+        elif mode == "sql" and self.L2_sql_layout == "blob":
+            blob_rows = [
+                [symbol, ts, ts_recv, depth, blob]
+                for ts, ts_recv, blob in zip(timestamps, recv_timestamps, L2_blobs(block))
+            ]
+            self._ensure_table("L2_blob")
+            self.db.write_L2_blob(blob_rows)
+            self._sql_written(len(blob_rows))
+
+        elif mode == "sql":
+            sql_rows = [
+                [symbol, ts, ts_recv] + levels
+                for ts, ts_recv, levels in zip(timestamps, recv_timestamps, block.tolist())
+            ]
+            self._ensure_table("L2", depth=depth)
+            self.db.write_L2(sql_rows, depth)
+            self._sql_written(len(sql_rows))
+
+        elif mode == "csv":
+            sink = self._csv_sink(
+                f"{self.output_directory}/L2_{ssymbol}_orderbook.csv", ["timestamp", "ts_recv"] + L2_level_columns(depth),
+            )
+            sink.write_lines([
+                f"{ts},{ts_recv}," + ",".join([f"{x:.9f}" for x in levels])
+                for ts, ts_recv, levels in zip(timestamps, recv_timestamps, block)
+            ])
+
+        elif mode in ["parquet", "arrow"]:
+            columns = {"timestamp": self._timestamp_array(timestamps), "ts_recv": self._timestamp_array(recv_timestamps)}
+            for i, name in enumerate(L2_level_columns(depth)):
+                columns[name] = pa.array(block[:, i], pa.float64())
+            table = pa.table(columns)
+
+            if mode == "arrow":
+                self._write_arrow(f"{self.output_directory}/L2_{ssymbol}_orderbook.arrows", table)
+                return
+
+            self._check_parquet_schema(self._L2_parquet_root("orderbook", symbol), table.schema)
+            if not self.parquet_partitioning:
+                self._L2_stream(symbol, self._L2_parquet_root("orderbook", symbol)).write(table)
+                return
+
+            # One stream per symbol, moved on to the next date partition as days roll over.
+            dates = partition_dates(table.column("timestamp")).to_pylist()
+            start = 0
+            for end in range(1, len(dates) + 1):
+                if end == len(dates) or dates[end] != dates[start]:
+                    root = f"{self._L2_parquet_root('orderbook', symbol)}/symbol={ssymbol}/date={dates[start]}"
+                    self._L2_stream(symbol, root).write(table.slice(start, end - start))
+                    start = end
+
+        else:
+            raise NotImplementedError(f"L2 output mode '{mode}' not implemented, select csv, parquet, arrow, or sql.")
+
+    def _L2_stream(self, symbol, root_path):
+        """Return the ParquetStreamWriter of a symbol, closing it first if its root changed."""
+        stream = self._l2_streams.get(symbol)
+        if stream is not None and stream.root_path != root_path:
+            stream.close()
+            stream = None
+        if stream is None:
+            dataset_root = self._L2_parquet_root("orderbook", symbol)
+            stream = self._l2_streams[symbol] = ParquetStreamWriter(
+                root_path,
+                row_group_size=self.convert_to_parquet_every,
+                rows_per_file=self.parquet_rows_per_file,
+                max_file_seconds=self.parquet_max_file_seconds,
+                compression=self.parquet_compression,
+                manifest=manifest_for(dataset_root) if self.parquet_manifest else None,
+                symbols=[symbol],
+            )
+            if self.parquet_manifest:
+                self._manifest_roots.add(dataset_root)
+        return stream
+
+    def _write_L2_delta(self, payload):
         mode = self._get_mode("L2")
         symbol = payload["symbol"]
-        depth = payload["depth"]
-        line = payload["line"]
+        rows = payload["rows"]
         ssymbol = symbol.replace("/", "_")
+        ts_event = [row[3] for row in rows]
+        ts_recv = [row[4] for row in rows]
+        if mode in ["sql", "csv"]:
+            rows = [
+                row[:3] + [event, recv, row[5]]
+                for row, event, recv in zip(rows, self._timestamps(ts_event), self._timestamps(ts_recv))
+            ]
 
         if mode == "sql":
-            sql_line = [symbol] + line
-            self._ensure_table("L2", depth=depth)
-            self._ensure_db()
-            self.db.connect()
-            self.db.write_L2(sql_line, depth)
-            self.db.safe_disconnect()
+            self._ensure_table("L2_deltas")
+            self.db.write_L2_deltas([[symbol] + row for row in rows])
+            self._sql_written(len(rows))
+
+        elif mode == "csv":
+            sink = self._csv_sink(
+                f"{self.output_directory}/L2_{ssymbol}_deltas.csv", ["side", "price", "qty", "ts_event", "ts_recv", "seq"],
+            )
+            sink.write_lines([csv_line(row) for row in rows])
+
+        elif mode in ["parquet", "arrow"]:
+            table = pa.table({
+                "side": pa.array([row[0] for row in rows], pa.string()),
+                "price": pa.array([row[1] for row in rows], pa.float64()),
+                "qty": pa.array([row[2] for row in rows], pa.float64()),
+                "ts_event": self._timestamp_array(ts_event),
+                "ts_recv": self._timestamp_array(ts_recv),
+                "seq": pa.array([row[5] for row in rows], pa.int64()),
+            })
+            if mode == "arrow":
+                self._write_arrow(f"{self.output_directory}/L2_{ssymbol}_deltas.arrows", table)
+            else:
+                self._write_parquet(self._L2_parquet_root("deltas", symbol), table, "ts_event", symbol)
+
+        else:
+            raise NotImplementedError(f"L2 output mode '{mode}' not implemented, select csv, parquet, arrow, or sql.")
 
-        elif mode in ("csv", "parquet"):
-            csv_path = f"{self.output_directory}/L2_{ssymbol}_orderbook.csv"
-            if not os.path.exists(csv_path):
-                labels = ["timestamp", "ts_recv"]
-                for i in range(depth):
-                    labels.extend([
-                        "ask_px_" + str(i),
-                        "ask_sz_" + str(i),
-                        "bid_px_" + str(i),
-                        "bid_sz_" + str(i),
-                    ])
-                with open(csv_path, "w") as fil:
-                    fil.write(",".join(labels) + "\n")
-                    fil.write(",".join(line) + "\n")
+    def _write_L2_keyframe(self, payload):
+        mode = self._get_mode("L2")
+        symbol = payload["symbol"]
+        depth = payload["depth"]
+        ssymbol = symbol.replace("/", "_")
+        ts = self._timestamps([payload["timestamp"]])[0]
+        ts_recv = self._timestamps([payload["ts_recv"]])[0]
+        row = [ts, ts_recv, payload["seq"]] + payload["book"].tolist()
+
+        if mode == "sql" and self.L2_sql_layout != "wide":
+            self._ensure_table("L2_keyframes_blob")
+            self.db.write_L2_keyframes_blob([[symbol] + row[:3] + [depth, L2_blobs(payload["book"].reshape(1, -1))[0]]])
+            self._sql_written(1)
+
+        elif mode == "sql":
+            self._ensure_table("L2_keyframes", depth=depth)
+            self.db.write_L2_keyframes([[symbol] + row], depth)
+            self._sql_written(1)
+
+        elif mode == "csv":
+            sink = self._csv_sink(
+                f"{self.output_directory}/L2_{ssymbol}_keyframes.csv", ["timestamp", "ts_recv", "seq"] + L2_level_columns(depth),
+            )
+            sink.write_lines([csv_line(row)])
+
+        elif mode in ["parquet", "arrow"]:
+            columns = {
+                "timestamp": self._timestamp_array([payload["timestamp"]]),
+                "ts_recv": self._timestamp_array([payload["ts_recv"]]),
+                "seq": pa.array([payload["seq"]], pa.int64()),
+            }
+            for name, value in zip(L2_level_columns(depth), payload["book"].tolist()):
+                columns[name] = pa.array([value], pa.float64())
+            table = pa.table(columns)
+            if mode == "arrow":
+                self._write_arrow(f"{self.output_directory}/L2_{ssymbol}_keyframes.arrows", table)
             else:
-                with open(csv_path, "a") as fil:
-                    fil.write(",".join(line) + "\n")
-
-            if mode == "parquet":
-                if symbol not in self._l2_symbol_counts:
-                    self._l2_symbol_counts[symbol] = 0
-                self._l2_symbol_counts[symbol] += 1
-
-                if self._l2_symbol_counts[symbol] >= self.convert_to_parquet_every:
-                    self._l2_symbol_counts[symbol] = 0
-                    df = pd.read_csv(csv_path)
-                    table = pa.Table.from_pandas(df)
-                    pq.write_to_dataset(
-                        table,
-                        root_path=f"{self.output_directory}/L2_{ssymbol}_orderbook.parquet",
-                    )
-                    os.remove(csv_path)
+                self._write_parquet(self._L2_parquet_root("keyframes", symbol), table, "timestamp", symbol)
 
         else:
-            raise NotImplementedError(f"L2 output mode '{mode}' not implemented, select csv, parquet, or sql.")
+            raise NotImplementedError(f"L2 output mode '{mode}' not implemented, select csv, parquet, arrow, or sql.")
 
     # ------------------------------------------------------------------
     # L3
     # ------------------------------------------------------------------
 
+    def _write_batch_csv(self, csv_path, batch):
+        """
+        Append a RecordBatch to a CSV file, writing the header if the file is new. Its
+        timestamps are formatted like those of the row outputs, see csv_line.
+        """
+        self._csv_sink(csv_path).write_batch(format_timestamps(batch, self.timestamp_format))
+
     def _write_L3(self, payload):
         mode = self._get_mode("L3")
-        ticks = payload["ticks"]
+        batch = payload["batch"]
         out_file_name = payload.get("out_file_name", "L3_ticks")
 
         if mode == "parquet":
-            columns = ["side", "ts_event", "ts_recv", "price", "size", "action", "order_id", "symbol"]
-            df = pd.DataFrame(ticks, columns=columns)
-            table = pa.Table.from_pandas(df)
-            pq.write_to_dataset(
-                table,
-                root_path=f"{self.output_directory}/{out_file_name}.parquet",
-            )
+            self._write_parquet(f"{self.output_directory}/{out_file_name}.parquet", as_table(batch), "ts_event")
+
+        elif mode == "arrow":
+            self._write_arrow(f"{self.output_directory}/{out_file_name}.arrows", as_table(batch))
 
         elif mode == "csv":
-            csv_path = f"{self.output_directory}/{out_file_name}.csv"
-            if not os.path.exists(csv_path):
-                with open(csv_path, "w") as fil:
-                    fil.write("side,ts_event,ts_recv,price,size,action,order_id,symbol\n")
-            with open(csv_path, "a") as fil:
-                for tick in ticks:
-                    tick = [str(t) for t in tick]
-                    fil.write(",".join(tick) + "\n")
+            self._write_batch_csv(f"{self.output_directory}/{out_file_name}.csv", batch)
 
         elif mode == "sql":
             self._ensure_table("L3")
-            self._ensure_db()
-            self.db.connect()
-            self.db.write_L3(ticks)
-            self.db.safe_disconnect()
+            self.db.write_L3(record_batch_rows(batch, self.timestamp_format))
+            self._sql_written(len(batch))
 
         else:
-            raise NotImplementedError(f"L3 output mode '{mode}' not implemented, select csv, parquet, or sql.")
+            raise NotImplementedError(f"L3 output mode '{mode}' not implemented, select csv, parquet, arrow, or sql.")
 
     # ------------------------------------------------------------------
     # OHLC
@@ -505,66 +1954,117 @@ class KrackedWriter:
         mode = self._get_mode("OHLC")
         ohlc_mode = payload["mode"]
         rows = payload["rows"]
+        tend, tstart, ttrue = [self._timestamps([row[i] for row in rows]) for i in [0, 9, 10]]
+        rows = [[t0] + row[1:9] + [t9, t10] for row, t0, t9, t10 in zip(rows, tend, tstart, ttrue)]
 
-        if mode == "csv":
-            csv_path = f"{self.output_directory}/OHLC.csv"
-            if not os.path.exists(csv_path):
-                with open(csv_path, "w") as fil:
-                    fil.write(
-                        "timestamp,symbol,open,high,low,close,volume,vwap,trades,tstart,ttrue\n"
-                    )
-            with open(csv_path, "a") as fil:
-                for row in rows:
-                    fil.write(",".join(row) + "\n")
+        if self.ohlc_storage == "final" and mode in ["csv", "sql"]:
+            self._write_OHLC_bars(mode, payload.get("interval", 0), rows)
+
+        elif mode == "csv":
+            header = ["timestamp", "symbol", "open", "high", "low", "close", "volume", "vwap", "trades",
+                      "tstart", "ttrue"]
+            self._csv_sink(f"{self.output_directory}/OHLC.csv", header).write_lines([csv_line(row) for row in rows])
 
         elif mode == "sql":
             self._ensure_table("OHLC")
-            self._ensure_db()
-            self.db.connect()
             if ohlc_mode == "update":
                 self.db.write_ohlc(rows[0], mode=ohlc_mode)
             else:
                 self.db.write_ohlc(rows, mode=ohlc_mode)
-            self.db.safe_disconnect()
+            self._sql_written(len(rows))
 
         else:
             raise NotImplementedError(f"OHLC output mode '{mode}' not implemented, select csv or sql.")
 
+    def _write_OHLC_bars(self, mode, interval, rows):
+        """
+        Store OHLC rows with ohlc_storage="final", keeping only the last state of each bar.
+        """
+        # Candles from the ccxt snapshot carry their interval_begin as the timestamp.
+        # ccxt formats it with 6 fractional digits and the websocket with 9, so it is
+        # reformatted from epoch nanoseconds: each bar then has a single key, and keys
+        # of the same format order correctly.
+        begins = self._timestamps(timestamps_to_ns([row[0] if row[9] is None else row[9] for row in rows]).to_pylist())
+        bars = [[row[1], interval, begin, row[0]] + row[2:9] + [row[10]] for row, begin in zip(rows, begins)]
+
+        if mode == "sql" and not self.ohlc_live:
+            self._ensure_table("OHLC_bars")
+            self.db.upsert_ohlc(bars)
+            self._sql_written(len(bars))
+            return
+
+        # A bar is complete once a newer bar of its symbol and interval starts.
+        final = []
+        for bar in bars:
+            key = (bar[0], bar[1])
+            current = self._ohlc_current.get(key)
+            if current is not None and current[2] != bar[2]:
+                if bar[2] < current[2]:
+                    # An older bar, e.g. from a snapshot sent after a reconnect.
+                    final.append(bar)
+                    continue
+                final.append(current)
+            self._ohlc_current[key] = bar
+
+        if mode == "sql":
+            if final:
+                self._ensure_table("OHLC_bars")
+                self.db.upsert_ohlc(final)
+            self._ensure_table("OHLC_live")
+            self.db.upsert_ohlc(list(self._ohlc_current.values()), "OHLC_live")
+            self._sql_written(len(final) + len(self._ohlc_current))
+            return
+
+        if final:
+            self._csv_sink(f"{self.output_directory}/OHLC_bars.csv", OHLC_BAR_COLUMNS).write_lines(
+                [csv_line(bar) for bar in final]
+            )
+        if self.ohlc_live:
+            path = f"{self.output_directory}/OHLC_live.csv"
+            with open(f"{path}.tmp", "w") as fil:
+                fil.write(",".join(OHLC_BAR_COLUMNS) + "\n")
+                fil.writelines(csv_line(bar) + "\n" for bar in self._ohlc_current.values())
+            os.replace(f"{path}.tmp", path)
+
+    def _close_OHLC_bars(self):
+        """Store the in-progress OHLC bars as their last known state, when the writer closes."""
+        bars = list(self._ohlc_current.values())
+        self._ohlc_current = {}
+        if not bars:
+            return
+        if self._get_mode("OHLC") == "sql":
+            self._ensure_table("OHLC_bars")
+            self.db.upsert_ohlc(bars)
+            self._sql_written(len(bars))
+        else:
+            self._csv_sink(f"{self.output_directory}/OHLC_bars.csv", OHLC_BAR_COLUMNS).write_lines(
+                [csv_line(bar) for bar in bars]
+            )
+
     # ------------------------------------------------------------------
     # Trades
     # ------------------------------------------------------------------
 
     def _write_trades(self, payload):
         mode = self._get_mode("trades")
-        rows = payload["rows"]
+        batch = payload["batch"]
 
         if mode == "parquet":
-            columns = ["ts_event", "ts_recv", "symbol", "price", "qty", "side", "ord_type", "trade_id"]
-            df = pd.DataFrame(rows, columns=columns)
-            table = pa.Table.from_pandas(df)
-            pq.write_to_dataset(
-                table,
-                root_path=f"{self.output_directory}/trades.parquet",
-            )
+            self._write_parquet(f"{self.output_directory}/trades.parquet", as_table(batch), "ts_event")
+
+        elif mode == "arrow":
+            self._write_arrow(f"{self.output_directory}/trades.arrows", as_table(batch))
 
         elif mode == "csv":
-            csv_path = f"{self.output_directory}/trades.csv"
-            if not os.path.exists(csv_path):
-                with open(csv_path, "w") as fil:
-                    fil.write("ts_event,ts_recv,symbol,price,qty,side,ord_type,trade_id\n")
-            with open(csv_path, "a") as fil:
-                for trade in rows:
-                    fil.write(",".join([str(x) for x in trade]) + "\n")
+            self._write_batch_csv(f"{self.output_directory}/trades.csv", batch)
 
         elif mode == "sql":
             self._ensure_table("trades")
-            self._ensure_db()
-            self.db.connect()
-            self.db.write_trades(rows)
-            self.db.safe_disconnect()
+            self.db.write_trades(record_batch_rows(batch, self.timestamp_format))
+            self._sql_written(len(batch))
 
         else:
-            raise NotImplementedError(f"Trades output mode '{mode}' not implemented, select csv, parquet, or sql.")
+            raise NotImplementedError(f"Trades output mode '{mode}' not implemented, select csv, parquet, arrow, or sql.")
 
     # ------------------------------------------------------------------
     # Instruments (one-shot CSV dump)
@@ -586,23 +2086,13 @@ class KrackedWriter:
             for line in assets:
                 fil.write(",".join(line) + "\n")
 
-    # ------------------------------------------------------------------
-    # Webapp L2 live orderbook JSON
-    # ------------------------------------------------------------------
-
-    def _write_webapp_l2(self, payload):
-        books = payload["books"]
-        with open(f"{self.output_directory}/L2_live_orderbooks.json", "w") as fil:
-            json.dump(books, fil)
-
     # ------------------------------------------------------------------
     # Connections (always SQL; managed by KrakenFeedManager)
     # ------------------------------------------------------------------
 
     def _write_connections(self, payload):
-        rows = payload["rows"]
+        timestamps = self._timestamps([row[2] for row in payload["rows"]])
+        rows = [row[:2] + [ts] + row[3:] for row, ts in zip(payload["rows"], timestamps)]
         self._ensure_table("connections")
-        self._ensure_db()
-        self.db.connect()
         self.db.write_connections(rows)
-        self.db.safe_disconnect()
+        self._sql_written(len(rows))
@@ -0,0 +1,186 @@
+"""
+Memory-mapped live L2 books, shared between the feed and local readers.
+
+Each symbol's book lives in a fixed layout file that KrakenL2(log_for_webapp=True)
+updates in place at every book emission. Dashboards and strategies map the same file
+and read the latest book straight from memory, with no serialization and no queue.
+Put the files on a tmpfs such as /dev/shm (see the live_book_directory parameter of
+KrakenL2) to keep them off the disk entirely.
+
+File layout (little endian)
+---------------------------
+offset 0    8s          magic, b"KRKBOOK1"
+offset 8    uint64      sequence number (seqlock, odd while the writer is updating)
+offset 16   uint32      depth
+offset 20   uint32      reserved
+offset 24   int64       receive time of the book, epoch nanoseconds
+offset 32   int64       number of books written
+offset 40   32s         exchange timestamp of the book, ISO-8601 text
+offset 72   32s         symbol
+offset 128  float64[4*depth]    the book in the wide L2 column order
+                                (ask_px_0, ask_sz_0, bid_px_0, bid_sz_0, ask_px_1, ...)
+
+The writer makes the sequence number odd, updates the book, then makes it even again.
+A reader copies the book between two reads of the sequence number and retries if the
+number was odd or changed, so it never returns a half-updated book.
+"""
+import mmap
+import os
+import time
+
+import numpy as np
+
+from typing import Tuple, Union
+
+
+MAGIC = b"KRKBOOK1"
+HEADER_SIZE = 128
+
+
+def live_book_path(directory: str, symbol: str) -> str:
+    """Return the path of the live book file of a symbol."""
+    return f"{directory}/L2_{symbol.replace('/', '_')}_live.book"
+
+
+class LiveBook:
+    """
+    A live L2 book in a memory-mapped file with a sequence-lock header. Use
+    LiveBook.create in the process updating the book and LiveBook.open to read it.
+
+    Parameters
+    ----------
+    path: str
+        The file backing the book.
+    mm: mmap.mmap
+        The memory map of the file.
+    """
+
+    def __init__(self, path: str, mm: mmap.mmap):
+        self.path = path
+        self._mm = mm
+        if mm[:8] != MAGIC:
+            raise ValueError(f"{path} is not a kracked live book.")
+
+        self._seq = np.frombuffer(mm, dtype=np.uint64, count=1, offset=8)
+        self.depth = int(np.frombuffer(mm, dtype=np.uint32, count=1, offset=16)[0])
+        self._ts_recv = np.frombuffer(mm, dtype=np.int64, count=1, offset=24)
+        self._n_writes = np.frombuffer(mm, dtype=np.int64, count=1, offset=32)
+        self._ts_event = np.frombuffer(mm, dtype=np.uint8, count=32, offset=40)
+        self.symbol = bytes(mm[72:104]).rstrip(b"\0").decode()
+        self.levels = np.frombuffer(mm, dtype=np.float64, count=4 * self.depth, offset=HEADER_SIZE)
+
+    @classmethod
+    def create(cls, path: str, symbol: str, depth: int) -> "LiveBook":
+        """
+        Create (or reset) the live book file of a symbol and map it for writing.
+
+        An existing file is reset in place rather than truncated, so readers that
+        still map it keep valid memory: it is only grown when too small, and the reset
+        goes through the sequence lock like any other update.
+        """
+        size = HEADER_SIZE + 4 * depth * 8
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+b") as fil:
+            if os.fstat(fd).st_size < size:
+                fil.truncate(size)
+            mm = mmap.mmap(fil.fileno(), 0)
+
+        seq = np.frombuffer(mm, dtype=np.uint64, count=1, offset=8)
+        if mm[:8] != MAGIC:
+            seq[0] = 0
+        # Make the sequence number odd while the header and the book are reset.
+        seq[0] += 1 if seq[0] % 2 == 0 else 2
+        mm[:8] = MAGIC
+        np.frombuffer(mm, dtype=np.uint32, count=1, offset=16)[0] = depth
+        mm[24:72] = bytes(48)
+        mm[72:104] = symbol.encode()[:32].ljust(32, b"\0")
+        mm[HEADER_SIZE:] = bytes(len(mm) - HEADER_SIZE)
+        seq[0] += 1
+        del seq
+        return cls(path, mm)
+
+    @classmethod
+    def open(cls, path: str) -> "LiveBook":
+        """
+        Map an existing live book file for reading.
+        """
+        with open(path, "rb") as fil:
+            mm = mmap.mmap(fil.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(path, mm)
+
+    def write(self, levels: np.ndarray, ts_event: str = "", ts_recv: Union[int, None] = None) -> None:
+        """
+        Update the book in place.
+
+        Parameters
+        ----------
+        levels: np.ndarray
+            The book in the wide L2 column order, e.g. L2Book.refresh_levels(), of
+            4*depth values in any shape.
+        ts_event: str
+            The exchange timestamp of the book.
+        ts_recv: int or None
+            The receive time in epoch nanoseconds. Defaults to now.
+        """
+        seq = self._seq
+        seq[0] += 1
+        self.levels[:] = levels.reshape(-1)
+        self._ts_recv[0] = time.time_ns() if ts_recv is None else ts_recv
+        self._ts_event[:] = np.frombuffer(str(ts_event).encode()[:32].ljust(32, b"\0"), dtype=np.uint8)
+        self._n_writes[0] += 1
+        seq[0] += 1
+
+    def read(self, timeout: float = 1.0) -> Tuple[np.ndarray, str, int, int]:
+        """
+        Return a consistent copy of the book.
+
+        Parameters
+        ----------
+        timeout: float
+            Seconds to keep retrying while the writer is updating the book.
+
+        Returns
+        -------
+        (np.ndarray, str, int, int): The (depth, 4) levels (ask px, ask sz, bid px,
+        bid sz per level), the exchange timestamp, the receive time in epoch
+        nanoseconds, and the sequence number of the read.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            before = int(self._seq[0])
+            if before % 2 == 0:
+                levels = self.levels.copy()
+                ts_event = self._ts_event.tobytes()
+                ts_recv = int(self._ts_recv[0])
+                if int(self._seq[0]) == before:
+                    ts_event = ts_event.rstrip(b"\0").decode()
+                    return levels.reshape(self.depth, 4), ts_event, ts_recv, before
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Could not read a consistent book from {self.path}.")
+
+    @property
+    def n_writes(self) -> int:
+        """The number of books written since the file was created."""
+        return int(self._n_writes[0])
+
+    def to_dict(self) -> dict:
+        """
+        Return a consistent {"bids": {price: qty}, "asks": {price: qty}} copy of the
+        book, ordered best-first, in the format of L2Book.to_dict.
+        """
+        levels = self.read()[0]
+        asks = levels[levels[:, 1] > 0]
+        bids = levels[levels[:, 3] > 0]
+        return {
+            "bids": dict(zip(bids[:, 2].tolist(), bids[:, 3].tolist())),
+            "asks": dict(zip(asks[:, 0].tolist(), asks[:, 1].tolist())),
+        }
+
+    def close(self) -> None:
+        """Unmap the file. The file itself is left in place for readers."""
+        self.levels = self._seq = self._ts_recv = self._n_writes = self._ts_event = None
+        try:
+            self._mm.close()
+        except BufferError:
+            # A caller still holds a view of the levels; the map is released with it.
+            pass
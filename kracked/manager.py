@@ -7,7 +7,9 @@ from kracked.feeds import (
     KrakenInstruments,
 )
 from kracked.io import KrackedWriter
-import threading, queue, toml, time
+from kracked.compact import Compactor
+from kracked.queues import OutputQueue
+import threading, toml, time
 
 
 class KrakenFeedManager:
@@ -32,6 +34,12 @@ class KrakenFeedManager:
         instruments_params={},
         db_name="kracked_outputs.db",
         monitor_reconnects=True,
+        decoder_params={},
+        writer_params={},
+        compact_interval=None,
+        compact_params={},
+        queue_maxsize=100_000,
+        queue_policies={},
     ):
         self.api_key = api_key
         self.api_secret = api_secret
@@ -39,6 +47,7 @@ class KrakenFeedManager:
         self.output_directory = output_directory
         self.db_name = db_name
         self.monitor_reconnects = monitor_reconnects
+        self.decoder_params = decoder_params
 
         self.L1 = None
         self.L2 = None
@@ -50,8 +59,10 @@ class KrakenFeedManager:
         if type(symbols) == str:
             symbols = [symbols]
 
-        # Shared queue: all feeds push payloads here, one writer consumes.
-        self.output_queue = queue.Queue()
+        # Shared queue: all feeds push payloads here, one writer consumes. It is bounded
+        # so that a writer falling behind cannot grow memory without limit; what happens
+        # to payloads once it is full is set per channel, see kracked.queues.OutputQueue.
+        self.output_queue = OutputQueue(maxsize=queue_maxsize, policies=queue_policies)
 
         # Collect per-channel output mode overrides for the writer.
         channel_modes = {}
@@ -78,6 +89,21 @@ class KrakenFeedManager:
             depth = L2_params.get("depth", 10)
             output_mode = L2_params.get("output_mode", "sql")
             convert_to_parquet_every = L2_params.get("convert_to_parquet_every", 1000)
+            writer_params = dict(writer_params)
+            for key in ["parquet_compression", "parquet_rows_per_file", "parquet_max_file_seconds"]:
+                if key in L2_params:
+                    writer_params.setdefault(key, L2_params[key])
+            if "sql_layout" in L2_params:
+                writer_params.setdefault("L2_sql_layout", L2_params["sql_layout"])
+            checksum_every = L2_params.get("checksum_every", 1)
+            price_precision = L2_params.get("price_precision", None)
+            qty_precision = L2_params.get("qty_precision", None)
+            fetch_precision = L2_params.get("fetch_precision", True)
+            max_resubscribes = L2_params.get("max_resubscribes", 5)
+            log_mode = L2_params.get("log_mode", "book")
+            keyframe_every = L2_params.get("keyframe_every", 1000)
+            keyframe_interval = L2_params.get("keyframe_interval", 60.0)
+            flush_interval_ms = L2_params.get("flush_interval_ms", None)
             channel_modes["L2"] = output_mode
 
             self.L2 = KrakenL2(
@@ -88,12 +114,22 @@ class KrakenFeedManager:
                 log_book_every=log_book_every,
                 append_book=append_book,
                 output_mode=output_mode,
+                checksum_every=checksum_every,
+                price_precision=price_precision,
+                qty_precision=qty_precision,
+                fetch_precision=fetch_precision,
+                max_resubscribes=max_resubscribes,
+                log_mode=log_mode,
+                keyframe_every=keyframe_every,
+                keyframe_interval=keyframe_interval,
+                flush_interval_ms=flush_interval_ms,
             )
             self._configure_feed(self.L2, "L2")
             self.feeds["L2"] = self.L2
         if L3:
             print("KrakenFeedManager: Initializing L3 feed")
             log_ticks_every = L3_params.get("log_ticks_every", 100)
+            flush_interval_ms = L3_params.get("flush_interval_ms", None)
             output_mode = L3_params.get("output_mode", "sql")
             channel_modes["L3"] = output_mode
             self.L3 = KrakenL3(
@@ -103,7 +139,8 @@ class KrakenFeedManager:
                 trace=False,
                 log_ticks_every=log_ticks_every,
                 output_directory=output_directory,
-                output_mode=output_mode
+                output_mode=output_mode,
+                flush_interval_ms=flush_interval_ms,
             )
             self._configure_feed(self.L3, "L3")
             self.feeds["L3"] = self.L3
@@ -113,6 +150,11 @@ class KrakenFeedManager:
             ccxt_snapshot = ohlc_params.get("ccxt_snapshot", False)
             output_mode = ohlc_params.get("output_mode", "sql")
             channel_modes["OHLC"] = output_mode
+            writer_params = dict(writer_params)
+            if "storage" in ohlc_params:
+                writer_params.setdefault("ohlc_storage", ohlc_params["storage"])
+            if "live" in ohlc_params:
+                writer_params.setdefault("ohlc_live", ohlc_params["live"])
             self.ohlc = KrakenOHLC(
                 symbols,
                 trace=False,
@@ -126,6 +168,7 @@ class KrakenFeedManager:
         if trades:
             print("KrakenFeedManager: Initializing Trades feed")
             log_trades_every = trades_params.get("log_trades_every", 100)
+            flush_interval_ms = trades_params.get("flush_interval_ms", None)
             output_mode = trades_params.get("output_mode", "sql")
             channel_modes["trades"] = output_mode
             self.trades = KrakenTrades(
@@ -133,7 +176,8 @@ class KrakenFeedManager:
                 trace=False,
                 log_trades_every=log_trades_every,
                 output_directory=output_directory,
-                output_mode=output_mode
+                output_mode=output_mode,
+                flush_interval_ms=flush_interval_ms,
             )
             self._configure_feed(self.trades, "trades")
             self.feeds["trades"] = self.trades
@@ -152,19 +196,31 @@ class KrakenFeedManager:
             db_name=db_name,
             channel_modes=channel_modes,
             convert_to_parquet_every=convert_to_parquet_every,
+            **writer_params,
         )
 
+        # Optional background compaction of the parquet datasets, see kracked.compact.
+        self.compactor = None
+        if compact_interval is not None:
+            self.compactor = Compactor(output_directory, interval=compact_interval, **compact_params)
+
         # Threads list
         self.threads = {}
         self._writer_thread = None
         self._monitor_thread = None
         self._stop_monitor = False
 
+    def queue_stats(self):
+        """Return the size, high water mark and drop/coalesce/block counters of the output queue."""
+        return self.output_queue.stats()
+
     def _configure_feed(self, feed, feed_name):
         """Wire a feed into the shared writer and enable connection logging."""
         feed.output_queue = self.output_queue
         feed.feed_name = feed_name
         feed.log_connections = True
+        if self.decoder_params:
+            feed.set_decoder(**self.decoder_params)
 
     def _monitor_feed_threads(self):
         """Restart feed threads that died from an unexpected disconnect."""
@@ -204,7 +260,14 @@ class KrakenFeedManager:
             self._monitor_thread.start()
             print("Started connection monitor thread.")
 
+        if self.compactor is not None:
+            self.compactor.start()
+            print("Started parquet compaction thread.")
+
     def stop_all(self):
+        if self.compactor is not None:
+            self.compactor.stop()
+
         self._stop_monitor = True
         if self._monitor_thread is not None:
             self._monitor_thread.join(timeout=2)
@@ -0,0 +1,252 @@
+"""
+Manifests of the parquet datasets written by KrackedWriter.
+
+Each dataset directory (e.g. trades.parquet/) holds a _manifest.json listing its files,
+relative to the dataset root, with their row count, symbols and the min/max of their
+event and receive timestamps:
+
+    {"version": 1, "files": {
+        "symbol=BTC_USD/date=2026-10-17/0a1b....parquet": {
+            "rows": 1000, "symbols": ["BTC/USD"],
+            "ts_event": [min_ns, max_ns], "ts_recv": [min_ns, max_ns]},
+        ...}}
+
+Timestamps are epoch nanoseconds. The event timestamp is the ts_event or timestamp
+column, whichever the dataset has. Unknown values are null, and an empty symbol list
+means the symbols are unknown.
+
+Files added or removed are appended as one JSON line each update to _manifest.journal,
+so an update costs the same however many files the dataset holds:
+
+    {"added": {"symbol=BTC_USD/date=2026-10-17/2c3d....parquet": {...}}, "removed": [...]}
+
+The journal is folded into _manifest.json (rewritten atomically: write to a temporary
+file, then rename) when the writer closes and after compaction, see
+DatasetManifest.fold. Readers apply the journal on top of the manifest, ignoring a
+last line truncated by a crash. The leading "_" keeps both files out of pyarrow and
+pandas dataset scans.
+
+Readers use the manifest to skip the files outside a time window or symbol set
+without opening their footers, see kracked.reader.read_parquet. Files missing from the
+manifest are always read, so a dataset written without one, or modified by another
+tool, still reads correctly.
+"""
+import json
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from typing import List, Union
+
+
+MANIFEST_NAME = "_manifest.json"
+JOURNAL_NAME = "_manifest.journal"
+MANIFEST_VERSION = 1
+
+# Columns of the event timestamp, in order of preference.
+EVENT_COLUMNS = ["ts_event", "timestamp"]
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def manifest_path(root_path: str) -> str:
+    """Return the path of the manifest of a dataset directory."""
+    return os.path.join(root_path, MANIFEST_NAME)
+
+
+def journal_path(root_path: str) -> str:
+    """Return the path of the update journal of a dataset directory."""
+    return os.path.join(root_path, JOURNAL_NAME)
+
+
+def _time_range(column) -> Union[List[int], None]:
+    """Return the [min, max] epoch nanoseconds of a timestamp column, or None if unknown."""
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    try:
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            column = pc.cast(column, pa.timestamp("ns", tz="UTC"))
+        if pa.types.is_timestamp(column.type):
+            column = column.cast(pa.timestamp("ns", tz=column.type.tz)).cast(pa.int64())
+        if not pa.types.is_integer(column.type):
+            return None
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return None
+    bounds = pc.min_max(column)
+    if not bounds["min"].is_valid:
+        return None
+    return [bounds["min"].as_py(), bounds["max"].as_py()]
+
+
+def file_entry(table: pa.Table, symbols: Union[List[str], None] = None) -> dict:
+    """
+    Return the manifest entry of a parquet file holding table.
+
+    Parameters
+    ----------
+    table: pa.Table
+        The rows of the file.
+    symbols: List[str] or None
+        The symbols of the rows, for files without a symbol column. Taken from the
+        symbol column if None.
+    """
+    if symbols is None:
+        symbols = []
+        if "symbol" in table.column_names:
+            column = table.column("symbol").combine_chunks()
+            if pa.types.is_dictionary(column.type):
+                column = column.dictionary_decode()
+            symbols = sorted(s for s in pc.unique(column).to_pylist() if s is not None)
+
+    event = next((c for c in EVENT_COLUMNS if c in table.column_names), None)
+    return {
+        "rows": len(table),
+        "symbols": list(symbols),
+        "ts_event": None if event is None else _time_range(table.column(event)),
+        "ts_recv": _time_range(table.column("ts_recv")) if "ts_recv" in table.column_names else None,
+    }
+
+
+def merge_entries(a: dict, b: dict) -> dict:
+    """Return the entry of a file holding the rows of two entries."""
+    def _merge(x, y):
+        if x is None or y is None:
+            return None
+        return [min(x[0], y[0]), max(x[1], y[1])]
+
+    return {
+        "rows": a["rows"] + b["rows"],
+        # Unknown (empty) symbols stay unknown.
+        "symbols": sorted(set(a["symbols"]) | set(b["symbols"])) if a["symbols"] and b["symbols"] else [],
+        "ts_event": _merge(a["ts_event"], b["ts_event"]),
+        "ts_recv": _merge(a["ts_recv"], b["ts_recv"]),
+    }
+
+
+def partition_symbol(relative_path: str) -> Union[str, None]:
+    """Return the symbol of a file in a symbol= partition, e.g. "BTC/USD", or None."""
+    for part in relative_path.replace(os.sep, "/").split("/"):
+        if part.startswith("symbol="):
+            return part[len("symbol="):].replace("_", "/")
+    return None
+
+
+def load_manifest(root_path: str) -> dict:
+    """
+    Return the {relative path: entry} files of a dataset's manifest with its journal
+    applied, or an empty dict if it has neither.
+    """
+    try:
+        with open(manifest_path(root_path)) as fil:
+            files = json.load(fil)["files"]
+    except (OSError, ValueError, KeyError):
+        # OSError covers missing manifests and paths of single files.
+        files = {}
+
+    try:
+        with open(journal_path(root_path)) as fil:
+            lines = fil.readlines()
+    except OSError:
+        return files
+    for line in lines:
+        try:
+            update = json.loads(line)
+        except ValueError:
+            # Truncated by a crash while appending.
+            continue
+        for path in update.get("removed", []):
+            files.pop(path, None)
+        files.update(update.get("added", {}))
+    return files
+
+
+class DatasetManifest:
+    """
+    The manifest of one dataset directory. Updates are appended to its journal and
+    folded into the manifest by fold(). Use manifest_for to share one instance between
+    the writer and the compactor of a process.
+
+    Parameters
+    ----------
+    root_path: str
+        The dataset directory.
+    """
+
+    def __init__(self, root_path: str):
+        self.root_path = root_path
+        self._lock = threading.Lock()
+
+    @property
+    def files(self) -> dict:
+        """The {relative path: entry} files of the manifest and its journal."""
+        return load_manifest(self.root_path)
+
+    def relative(self, path: str) -> str:
+        """Return the path of a file relative to the dataset root, with "/" separators."""
+        return os.path.relpath(path, self.root_path).replace(os.sep, "/")
+
+    def update(self, added: Union[dict, None] = None, removed: Union[List[str], None] = None) -> None:
+        """
+        Add {path: entry} files and remove files (paths absolute or relative to the
+        dataset root) by appending one line to the journal.
+        """
+        update = {
+            "added": {self.relative(path): entry for path, entry in (added or {}).items()},
+            "removed": [self.relative(path) for path in removed or []],
+        }
+        line = json.dumps(update, separators=(",", ":")) + "\n"
+        with self._lock:
+            os.makedirs(self.root_path, exist_ok=True)
+            with open(journal_path(self.root_path), "a") as fil:
+                fil.write(line)
+
+    def fold(self) -> None:
+        """
+        Rewrite the manifest with the journal applied and remove the journal. Updates
+        appended by another process while folding are lost, which only means readers
+        open those files instead of skipping them.
+        """
+        with self._lock:
+            journal = journal_path(self.root_path)
+            if not os.path.exists(journal):
+                return
+            files = load_manifest(self.root_path)
+            path = manifest_path(self.root_path)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as fil:
+                json.dump({"version": MANIFEST_VERSION, "files": files}, fil, separators=(",", ":"))
+            os.replace(tmp, path)
+            os.remove(journal)
+
+
+def manifest_for(root_path: str) -> DatasetManifest:
+    """Return the shared DatasetManifest of a dataset directory."""
+    key = os.path.abspath(root_path)
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = _manifests[key] = DatasetManifest(root_path)
+        return manifest
+
+
+def file_may_match(entry: Union[dict, None], symbols=None, start_ns=None, end_ns=None, time_key="ts_event") -> bool:
+    """
+    Whether a file with the given manifest entry may hold rows of the symbols within
+    [start_ns, end_ns] of its time_key ("ts_event" or "ts_recv") range. Files without
+    an entry, and unknown symbols or ranges, may always match.
+    """
+    if entry is None:
+        return True
+    if symbols is not None and entry.get("symbols") and not set(symbols) & set(entry["symbols"]):
+        return False
+    bounds = entry.get(time_key)
+    if bounds is None:
+        return True
+    if start_ns is not None and bounds[1] < start_ns:
+        return False
+    if end_ns is not None and bounds[0] > end_ns:
+        return False
+    return True
@@ -0,0 +1,133 @@
+import queue
+
+from typing import Union
+
+
+POLICIES = ["block", "drop_oldest", "coalesce"]
+
+# Policies of the channels that are not blocking by default. Successive L2 books of
+# a symbol supersede each other, so a backlog of them can be coalesced into the latest.
+DEFAULT_POLICIES = {"L2": "coalesce"}
+
+
+class OutputQueue(queue.Queue):
+    """
+    Bounded queue between the feeds and the KrackedWriter, with a policy per channel
+    deciding what happens to a payload put while the queue is full.
+
+    "block": The feed waits until the writer has made room, i.e. backpressure on the
+        websocket. Nothing is lost, but the feed falls behind the exchange.
+    "drop_oldest": The oldest queued payload of the same channel is dropped to make
+        room. If none is queued, the new payload is dropped instead.
+    "coalesce": The new payload replaces the queued payload of the same channel and
+        symbol, so only the latest book of each symbol is kept while backlogged. If
+        none is queued, falls back to drop_oldest. Only meant for channels whose
+        payloads supersede each other, such as L2 books (not L2 deltas).
+
+    While the queue is not full, every policy simply enqueues. The None sentinel that
+    stops the writer is always enqueued. Drops, coalesces and blocking puts are counted
+    per channel, see stats().
+
+    Parameters
+    ----------
+    maxsize: int
+        The maximum number of queued payloads. 0 makes the queue unbounded.
+    policies: dict or None
+        {channel: policy} overrides of DEFAULT_POLICIES.
+    default_policy: str
+        The policy of the channels not in policies.
+    """
+
+    def __init__(self, maxsize: int = 100_000, policies: Union[dict, None] = None, default_policy: str = "block"):
+        super().__init__(maxsize)
+        self.policies = dict(DEFAULT_POLICIES)
+        self.policies.update(policies or {})
+        self.default_policy = default_policy
+        for policy in list(self.policies.values()) + [default_policy]:
+            if policy not in POLICIES:
+                raise ValueError(f"Invalid queue policy '{policy}', select one of {POLICIES}.")
+
+        self.dropped = {}
+        self.coalesced = {}
+        self.blocked = {}
+        self.high_water = 0
+        # The queued payload of each (channel, symbol) of the coalescing channels.
+        self._latest = {}
+
+    def _count(self, counter, channel):
+        counter[channel] = counter.get(channel, 0) + 1
+
+    def _key(self, item):
+        return item["channel"], item.get("symbol")
+
+    def _put(self, item):
+        self.queue.append(item)
+        if item is not None and self.policies.get(item["channel"], self.default_policy) == "coalesce":
+            self._latest[self._key(item)] = item
+        if len(self.queue) > self.high_water:
+            self.high_water = len(self.queue)
+
+    def _get(self):
+        item = self.queue.popleft()
+        if item is not None and self._latest.get(self._key(item)) is item:
+            del self._latest[self._key(item)]
+        return item
+
+    def _drop_oldest(self, channel):
+        """Remove the oldest queued payload of a channel. Called with the mutex held."""
+        for i, queued in enumerate(self.queue):
+            if queued is not None and queued["channel"] == channel:
+                del self.queue[i]
+                if self._latest.get(self._key(queued)) is queued:
+                    del self._latest[self._key(queued)]
+                self.unfinished_tasks -= 1
+                return True
+        return False
+
+    def put(self, item, block=True, timeout=None):
+        """Put a payload on the queue, applying its channel's policy if the queue is full."""
+        if item is None:
+            with self.mutex:
+                self._put(item)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+            return
+
+        channel = item["channel"]
+        policy = self.policies.get(channel, self.default_policy)
+
+        if policy == "block":
+            if self.maxsize > 0 and self.full():
+                self._count(self.blocked, channel)
+            return super().put(item, block, timeout)
+
+        with self.mutex:
+            if 0 < self.maxsize <= self._qsize():
+                if policy == "coalesce":
+                    queued = self._latest.get(self._key(item))
+                    if queued is not None:
+                        # Swap the contents in place, keeping the payload's position.
+                        queued.clear()
+                        queued.update(item)
+                        self._count(self.coalesced, channel)
+                        return
+                self._count(self.dropped, channel)
+                if not self._drop_oldest(channel):
+                    return
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def stats(self) -> dict:
+        """
+        Return the queue size, its high water mark, and the number of dropped and
+        coalesced payloads and of puts that had to block, per channel.
+        """
+        with self.mutex:
+            return {
+                "size": self._qsize(),
+                "high_water": self.high_water,
+                "dropped": dict(self.dropped),
+                "coalesced": dict(self.coalesced),
+                "blocked": dict(self.blocked),
+            }
@@ -0,0 +1,515 @@
+import os
+import re
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from typing import Iterator, List, Tuple, Union
+
+from kracked.io import KrackedDB, SQL_TIME_COLUMNS, L2_level_columns, L2_unpack_blobs, csv_parts
+from kracked.manifest import file_may_match, load_manifest
+
+
+# Layout of the datasets written by KrackedWriter(parquet_partitioning=True).
+PARTITIONING = ds.partitioning(
+    pa.schema([("symbol", pa.string()), ("date", pa.string())]),
+    flavor="hive",
+)
+
+
+def is_partitioned(path: str) -> bool:
+    """Whether a parquet dataset directory uses the symbol=/date= partition layout."""
+    return os.path.isdir(path) and any(name.startswith("symbol=") for name in os.listdir(path))
+
+
+def open_dataset(path: str) -> ds.Dataset:
+    """
+    Open a parquet dataset written by KrackedWriter, partitioned or not. Hidden files
+    (in progress or being compacted) are ignored.
+    """
+    if is_partitioned(path):
+        return ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+    return ds.dataset(path, format="parquet")
+
+
+def to_ns(values) -> np.ndarray:
+    """
+    Convert a column of timestamps (ISO strings, datetimes or integer epoch
+    nanoseconds) to an int64 array of epoch nanoseconds.
+    """
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.integer):
+        return values.astype(np.int64)
+    index = pd.DatetimeIndex(pd.to_datetime(values, utc=True, format="ISO8601"))
+    return index.as_unit("ns").asi8
+
+
+def _utc(value) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        return ts.tz_localize("UTC")
+    return ts.tz_convert("UTC")
+
+
+def _time_scalar(value, type_):
+    """Convert a datetime-like bound into a scalar comparable with a column of type_."""
+    ts = _utc(value)
+    if pa.types.is_timestamp(type_):
+        return pa.scalar(ts.value, type=pa.timestamp("ns", tz="UTC")).cast(type_)
+    # ISO-8601 text compares correctly as long as both sides share the format, so use
+    # the writer's: nanosecond fraction and a trailing "Z", see timestamps_to_iso.
+    return pa.scalar(f"{ts.strftime('%Y-%m-%dT%H:%M:%S')}.{ts.value % 10**9:09d}Z", type=pa.string())
+
+
+def read_parquet(
+    path: str,
+    symbols: Union[List[str], str, None] = None,
+    start=None,
+    end=None,
+    columns: Union[List[str], None] = None,
+    time_column: Union[str, None] = None,
+) -> pd.DataFrame:
+    """
+    Read the rows of a parquet dataset for some symbols and a time range.
+
+    For datasets partitioned by symbol and date, only the partition directories
+    matching the symbols and the dates of [start, end] are opened, so a per-symbol,
+    per-day query reads only its own files. Files whose manifest entry (see
+    kracked.manifest) rules out the symbols or time range are skipped without being
+    opened. Within the remaining files, row groups are further pruned using the
+    parquet statistics of the time column.
+
+    Parameters
+    ----------
+    path: str
+        The dataset directory, e.g. "data/trades.parquet".
+    symbols: List[str], str or None
+        The symbols to read (e.g. "BTC/USD"), or None for all.
+    start, end: datetime-like or None
+        Inclusive bounds on the time column. Naive times are taken as UTC.
+    columns: List[str] or None
+        Columns to read, or None for all.
+    time_column: str or None
+        The column the time bounds apply to. Defaults to ts_event if the dataset has
+        one, else timestamp.
+
+    Returns
+    -------
+    pd.DataFrame: The matching rows, with a symbol column in the "BTC/USD" form.
+    """
+    dataset, expr, read_columns = _parquet_scan(path, symbols, start, end, columns, time_column)
+    table = dataset.to_table(columns=read_columns, filter=expr)
+    return _parquet_frame(table, is_partitioned(path), columns)
+
+
+def _parquet_scan(path, symbols, start, end, columns, time_column):
+    """
+    Return the dataset of read_parquet, its filter expression and the columns to read.
+    """
+    dataset = open_dataset(path)
+    partitioned = is_partitioned(path)
+    names = dataset.schema.names
+
+    if time_column is None:
+        time_column = "ts_event" if "ts_event" in names else "timestamp"
+
+    if type(symbols) == str:
+        symbols = [symbols]
+
+    files = load_manifest(path) if symbols is not None or start is not None or end is not None else {}
+    if files:
+        # Skip the files the manifest rules out, without opening them.
+        start_ns = None if start is None else _utc(start).value
+        end_ns = None if end is None else _utc(end).value
+        time_key = "ts_recv" if time_column == "ts_recv" else "ts_event"
+        fragments = [
+            fragment for fragment in dataset.get_fragments()
+            if file_may_match(
+                files.get(os.path.relpath(fragment.path, path).replace(os.sep, "/")),
+                symbols, start_ns, end_ns, time_key,
+            )
+        ]
+        dataset = ds.FileSystemDataset(fragments, dataset.schema, dataset.format, dataset.filesystem)
+
+    expr = None
+
+    def _and(e):
+        return e if expr is None else expr & e
+
+    if symbols is not None and "symbol" in names:
+        values = [s.replace("/", "_") for s in symbols] if partitioned else symbols
+        expr = _and(ds.field("symbol").isin(values))
+
+    if partitioned:
+        # Partitions are dated by the event time, which a receive time can be up to a
+        # day ahead of around midnight.
+        start_date = None if start is None else _utc(start)
+        if start_date is not None and time_column not in ["ts_event", "timestamp"]:
+            start_date -= pd.Timedelta(days=1)
+        if start is not None:
+            expr = _and(ds.field("date") >= start_date.strftime("%Y-%m-%d"))
+        if end is not None:
+            expr = _and(ds.field("date") <= _utc(end).strftime("%Y-%m-%d"))
+
+    if time_column in names:
+        type_ = dataset.schema.field(time_column).type
+        if start is not None:
+            expr = _and(ds.field(time_column) >= _time_scalar(start, type_))
+        if end is not None:
+            expr = _and(ds.field(time_column) <= _time_scalar(end, type_))
+
+    read_columns = columns
+    if columns is not None and partitioned and "symbol" not in columns:
+        read_columns = list(columns) + ["symbol"]
+
+    return dataset, expr, read_columns
+
+
+def _parquet_frame(table, partitioned, columns) -> pd.DataFrame:
+    """Convert a table scanned by _parquet_scan to pandas, restoring the symbol column."""
+    if partitioned:
+        symbol = pc.replace_substring(table.column("symbol"), "_", "/")
+        table = table.set_column(table.schema.get_field_index("symbol"), "symbol", symbol)
+        if columns is None or "date" not in columns:
+            table = table.drop_columns(["date"]) if "date" in table.column_names else table
+        if columns is not None and "symbol" not in columns:
+            table = table.drop_columns(["symbol"])
+
+    return table.to_pandas()
+
+
+def list_segments(path: str, include_open: bool = True) -> List[str]:
+    """
+    Return the Arrow IPC segments of an arrows directory written by KrackedWriter, in
+    the order they were written. The segment still being written (.arrows.open) is
+    last, if include_open.
+    """
+    suffixes = (".arrows", ".arrows.open") if include_open else (".arrows",)
+    return sorted(
+        (os.path.join(path, name) for name in os.listdir(path) if name.endswith(suffixes)),
+        key=lambda p: os.path.basename(p).split(".")[0],
+    )
+
+
+def read_segment(path: str) -> List[pa.RecordBatch]:
+    """
+    Memory-map an Arrow IPC segment and return its record batches without copying. For
+    a segment still being written, the batches completely written so far are returned.
+    """
+    batches = []
+    try:
+        reader = pa.ipc.open_stream(pa.memory_map(path))
+        for batch in reader:
+            batches.append(batch)
+    except (pa.ArrowInvalid, FileNotFoundError):
+        # A batch still being written, an empty new segment, or a segment renamed
+        # (closed) between listing and opening.
+        pass
+    return batches
+
+
+def read_arrow(path: str, include_open: bool = True) -> pa.Table:
+    """
+    Read the Arrow IPC segments of an arrows directory, e.g. "data/trades.arrows", as
+    a single Table backed by memory maps of the segment files.
+
+    Parameters
+    ----------
+    path: str
+        The arrows directory.
+    include_open: bool
+        Whether to include the rows of the segment still being written.
+
+    Returns
+    -------
+    pa.Table: The rows of all segments, oldest first.
+    """
+    tables = []
+    for segment in list_segments(path, include_open):
+        batches = read_segment(segment)
+        if not batches and segment.endswith(".open"):
+            batches = read_segment(segment[:-len(".open")])
+        if batches:
+            tables.append(pa.Table.from_batches(batches))
+    if not tables:
+        return pa.table({})
+    return pa.concat_tables(tables, promote_options="default")
+
+
+# File stem and time column of the output of each channel of KrackedWriter. Stems with
+# {symbol} are written per symbol, unless parquet_partitioning puts all symbols in one
+# dataset named without it (e.g. L2_orderbook.parquet).
+CHANNELS = {
+    "L1": ("L1", "timestamp"),
+    "L2": ("L2_{symbol}_orderbook", "ts_recv"),
+    "L2_deltas": ("L2_{symbol}_deltas", "ts_recv"),
+    "L2_keyframes": ("L2_{symbol}_keyframes", "ts_recv"),
+    "L3": ("L3_ticks", "ts_event"),
+    "OHLC": ("OHLC", "timestamp"),
+    "OHLC_bars": ("OHLC_bars", "interval_begin"),
+    "OHLC_live": ("OHLC_live", "interval_begin"),
+    "trades": ("trades", "ts_event"),
+}
+
+# Key columns of the channels holding one row per key, the last row of a key winning.
+CHANNEL_KEYS = {
+    "OHLC_bars": ["symbol", "interval", "interval_begin"],
+}
+
+# SQL tables of each channel, in the order they are looked for.
+CHANNEL_TABLES = {
+    "L1": ["L1"],
+    "L2": ["L2", "L2_long", "L2_blob"],
+    "L2_deltas": ["L2_deltas"],
+    "L2_keyframes": ["L2_keyframes", "L2_keyframes_blob"],
+    "L3": ["L3"],
+    "OHLC": ["OHLC"],
+    "OHLC_bars": ["OHLC_bars"],
+    "OHLC_live": ["OHLC_live"],
+    "trades": ["trades"],
+}
+
+
+def _filter_frame(df, symbols, start, end, time_column, columns) -> pd.DataFrame:
+    """Select symbols, a time range and columns from a DataFrame read without pushdown."""
+    mask = np.ones(len(df), dtype=bool)
+    if symbols is not None and "symbol" in df.columns:
+        mask &= df["symbol"].isin(symbols).to_numpy()
+    if (start is not None or end is not None) and time_column in df.columns:
+        times = to_ns(df[time_column])
+        if start is not None:
+            mask &= times >= _utc(start).value
+        if end is not None:
+            mask &= times <= _utc(end).value
+    df = df[mask] if not mask.all() else df
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df.reset_index(drop=True)
+
+
+class KrackedReader:
+    """
+    Reads back the outputs of a KrackedWriter without knowing which output mode each
+    channel used.
+
+    The output directory is searched for the parquet datasets, arrow segments, CSV
+    files and SQL tables of a channel, and every one found is read. Symbol and time
+    filters are pushed down wherever the format allows it: into the partition and
+    row group pruning of the parquet datasets (see read_parquet), into the WHERE
+    clause of the SQL tables (see KrackedDB.read), and into the choice of files for
+    the per-symbol L2 outputs. Arrow segments and CSV files are filtered as they are
+    streamed.
+
+    Parameters
+    ----------
+    output_directory: str
+        The directory the KrackedWriter wrote into.
+    db_name: str
+        The SQLite database file name within output_directory.
+    """
+
+    def __init__(self, output_directory: str = ".", db_name: str = "kracked_outputs.db"):
+        self.output_directory = output_directory
+        self.db_name = db_name
+        self._db = None
+
+    def _files(self, channel: str, suffix: str) -> List[Tuple[str, Union[str, None]]]:
+        """Return the (path, symbol) of the outputs of a channel ending in suffix."""
+        def _exists(path):
+            # CSV outputs may only have rotated parts left.
+            return os.path.exists(path) or (suffix == ".csv" and len(csv_parts(path)) > 0)
+
+        stem = CHANNELS[channel][0]
+        if "{symbol}" not in stem:
+            path = os.path.join(self.output_directory, stem + suffix)
+            return [(path, None)] if _exists(path) else []
+
+        files = []
+        shared = os.path.join(self.output_directory, stem.replace("{symbol}_", "") + suffix)
+        if _exists(shared):
+            files.append((shared, None))
+        prefix, postfix = stem.split("{symbol}")
+        pattern = re.compile(re.escape(prefix) + "(.+)" + re.escape(postfix) + r"(-\d{8}T\d{6}-\d{9})?" + re.escape(suffix))
+        symbols = []
+        for name in sorted(os.listdir(self.output_directory)):
+            match = pattern.fullmatch(name)
+            if match is not None and match.group(1) not in symbols:
+                symbols.append(match.group(1))
+        for ssymbol in symbols:
+            files.append((os.path.join(self.output_directory, prefix + ssymbol + postfix + suffix), ssymbol.replace("_", "/")))
+        return files
+
+    def _tables(self, channel: str) -> List[str]:
+        """Return the SQL tables of a channel in the database."""
+        path = os.path.join(self.output_directory, self.db_name)
+        if not os.path.exists(path):
+            return []
+        con = sqlite3.connect(path)
+        existing = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        con.close()
+        return [table for table in CHANNEL_TABLES[channel] if table in existing]
+
+    def sources(self, channel: str) -> List[Tuple[str, str]]:
+        """
+        Return the (format, path or table name) of every output of a channel, in the
+        order read() reads them. Per-symbol outputs are listed once per symbol.
+        """
+        if channel not in CHANNELS:
+            raise ValueError(f"Invalid channel: {channel}, select from {list(CHANNELS)}")
+        found = []
+        for fmt, suffix in [("parquet", ".parquet"), ("arrow", ".arrows"), ("csv", ".csv")]:
+            found += [(fmt, path) for path, _ in self._files(channel, suffix)]
+        found += [("sql", table) for table in self._tables(channel)]
+        return found
+
+    def channels(self) -> dict:
+        """Return {channel: [formats]} of the channels with outputs in the directory."""
+        found = {}
+        for channel in CHANNELS:
+            formats = list(dict.fromkeys(fmt for fmt, _ in self.sources(channel)))
+            if formats:
+                found[channel] = formats
+        return found
+
+    def read(
+        self,
+        channel: str,
+        symbols: Union[List[str], str, None] = None,
+        start=None,
+        end=None,
+        columns: Union[List[str], None] = None,
+        batches: bool = False,
+        batch_size: int = 100_000,
+    ):
+        """
+        Read the rows of a channel for some symbols and a time range, from all of its
+        outputs.
+
+        Parameters
+        ----------
+        channel: str
+            One of CHANNELS, e.g. "trades" or "L2".
+        symbols: List[str], str or None
+            The symbols to read (e.g. "BTC/USD"), or None for all.
+        start, end: datetime-like, epoch ns or None
+            Inclusive bounds on the time column of the channel (CHANNELS). Naive times
+            are taken as UTC.
+        columns: List[str] or None
+            Columns to read, or None for all. The symbol column is added to outputs
+            that are written per symbol.
+        batches: bool
+            If True, return an iterator of DataFrames of at most about batch_size rows,
+            so outputs larger than memory can be processed a batch at a time. Rows of
+            the channels in CHANNEL_KEYS are only deduplicated when batches is False.
+        batch_size: int
+            The number of rows per batch.
+
+        Returns
+        -------
+        pd.DataFrame, or an iterator of DataFrames if batches is True.
+        """
+        if channel not in CHANNELS:
+            raise ValueError(f"Invalid channel: {channel}, select from {list(CHANNELS)}")
+        if type(symbols) == str:
+            symbols = [symbols]
+
+        frames = self._scan(channel, symbols, start, end, columns, batch_size)
+        if batches:
+            return frames
+        frames = [df for df in frames if len(df)]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(frames, ignore_index=True)
+
+        keys = CHANNEL_KEYS.get(channel)
+        if keys is not None and all(k in df.columns for k in keys):
+            # E.g. a bar appended to OHLC_bars.csv again after a restart.
+            df = df.drop_duplicates(keys, keep="last").reset_index(drop=True)
+        return df
+
+    def _scan(self, channel, symbols, start, end, columns, batch_size) -> Iterator[pd.DataFrame]:
+        time_column = CHANNELS[channel][1]
+
+        def _with_symbol(df, symbol):
+            if symbol is not None and "symbol" not in df.columns and (columns is None or "symbol" in columns):
+                df.insert(0, "symbol", symbol)
+            return df
+
+        def _wanted(symbol):
+            return symbol is None or symbols is None or symbol in symbols
+
+        for path, symbol in self._files(channel, ".parquet"):
+            if not _wanted(symbol):
+                continue
+            dataset, expr, read_columns = _parquet_scan(path, symbols, start, end, columns, time_column)
+            for batch in dataset.to_batches(columns=read_columns, filter=expr, batch_size=batch_size):
+                if batch.num_rows:
+                    yield _with_symbol(_parquet_frame(pa.Table.from_batches([batch]), is_partitioned(path), columns), symbol)
+
+        for path, symbol in self._files(channel, ".arrows"):
+            if not _wanted(symbol):
+                continue
+            for segment in list_segments(path):
+                for batch in read_segment(segment):
+                    df = _filter_frame(batch.to_pandas(), symbols, start, end, time_column, columns)
+                    if len(df):
+                        yield _with_symbol(df, symbol)
+
+        for path, symbol in self._files(channel, ".csv"):
+            if not _wanted(symbol):
+                continue
+            for part in csv_parts(path):
+                for chunk in pd.read_csv(part, chunksize=batch_size):
+                    df = _filter_frame(chunk, symbols, start, end, time_column, columns)
+                    if len(df):
+                        yield _with_symbol(df, symbol)
+
+        for table in self._tables(channel):
+            yield from self._scan_sql(table, symbols, start, end, columns, batch_size)
+
+    def _connect(self):
+        if self._db is None:
+            # Read-only and with manual indexes, so the reader never takes the write
+            # lock of a database a KrackedWriter is filling.
+            self._db = KrackedDB(os.path.join(self.output_directory, self.db_name),
+                                 index_mode="manual", read_only=True)
+            self._db.connect()
+        return self._db
+
+    def _scan_sql(self, table, symbols, start, end, columns, batch_size) -> Iterator[pd.DataFrame]:
+        db = self._connect()
+        # Compare the bounds in the format the timestamps were stored in.
+        time_column = SQL_TIME_COLUMNS.get(table, "ts_recv")
+        stored = db.cur.execute(f"SELECT typeof({time_column}) FROM {table} LIMIT 1").fetchone()
+        db.timestamp_format = "ns" if stored is not None and stored[0] == "integer" else "iso"
+
+        if table in ["L2_long", "L2_blob"]:
+            # Books are reassembled per symbol.
+            if symbols is None:
+                symbols = [row[0] for row in db.cur.execute(f"SELECT DISTINCT symbol FROM {table}")]
+            for symbol in symbols:
+                df = db.read_L2(symbol, layout=table[len("L2_"):], start=start, end=end)
+                if len(df):
+                    yield df if columns is None else df[[c for c in columns if c in df.columns]]
+            return
+
+        packed = table == "L2_keyframes_blob"
+        for df in db.read(table, symbols, start, end, None if packed else columns, chunksize=batch_size):
+            if packed:
+                depth = int(df["depth"].iloc[0]) if len(df) else 0
+                levels = pd.DataFrame(L2_unpack_blobs(df["book"].tolist(), depth), columns=L2_level_columns(depth))
+                df = pd.concat([df[["symbol", "timestamp", "ts_recv", "seq"]], levels], axis=1)
+            if columns is not None:
+                df = df[[c for c in columns if c in df.columns]]
+            if len(df):
+                yield df
+
+    def close(self):
+        """Close the SQLite connection, if one was opened."""
+        if self._db is not None and self._db.con is not None:
+            self._db.safe_disconnect()
+        self._db = None
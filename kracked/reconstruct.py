@@ -0,0 +1,221 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from typing import Union, Tuple
+
+from kracked.io import L2_level_columns, L2_unpack_blobs, csv_parts
+from kracked.reader import read_parquet, to_ns
+
+
+def load_L2_deltas(
+    output_directory: str,
+    symbol: str,
+    output_mode: str = "parquet",
+    db_name: str = "kracked_outputs.db",
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Load the delta and keyframe logs written by KrakenL2(log_mode="delta") for one symbol.
+
+    Parameters
+    ----------
+    output_directory: str
+        The directory the KrackedWriter wrote into.
+    symbol: str
+        The symbol to load, e.g. "BTC/USD".
+    output_mode: str
+        The output mode the L2 feed used, "parquet", "csv" or "sql".
+    db_name: str
+        The SQLite database name, for the "sql" output mode.
+
+    Returns
+    -------
+    (pd.DataFrame, pd.DataFrame): The deltas and the keyframes.
+    """
+    ssymbol = symbol.replace("/", "_")
+
+    if output_mode == "parquet" and os.path.isdir(f"{output_directory}/L2_deltas.parquet"):
+        # Written with parquet_partitioning, one dataset for all symbols.
+        deltas = read_parquet(f"{output_directory}/L2_deltas.parquet", symbols=[symbol])
+        keyframes = read_parquet(f"{output_directory}/L2_keyframes.parquet", symbols=[symbol])
+
+    elif output_mode == "parquet":
+        deltas = pq.read_table(f"{output_directory}/L2_{ssymbol}_deltas.parquet").to_pandas()
+        keyframes = pq.read_table(f"{output_directory}/L2_{ssymbol}_keyframes.parquet").to_pandas()
+
+    elif output_mode == "csv":
+        deltas = pd.concat([
+            pd.read_csv(path, engine="pyarrow") for path in csv_parts(f"{output_directory}/L2_{ssymbol}_deltas.csv")
+        ], ignore_index=True)
+        keyframes = pd.concat([
+            pd.read_csv(path, engine="pyarrow") for path in csv_parts(f"{output_directory}/L2_{ssymbol}_keyframes.csv")
+        ], ignore_index=True)
+
+    elif output_mode == "sql":
+        con = sqlite3.connect(f"{output_directory}/{db_name}")
+        deltas = pd.read_sql_query("SELECT * FROM L2_deltas WHERE symbol = ?", con, params=(symbol,))
+        packed = con.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='L2_keyframes_blob'"
+        ).fetchone() is not None
+        if packed:
+            # Written with a "long" or "blob" L2_sql_layout.
+            rows = con.execute(
+                "SELECT timestamp, ts_recv, seq, depth, book FROM L2_keyframes_blob WHERE symbol = ?", (symbol,),
+            ).fetchall()
+            depth = rows[0][3] if rows else 0
+            keyframes = pd.DataFrame(L2_unpack_blobs([r[4] for r in rows], depth), columns=L2_level_columns(depth))
+            keyframes.insert(0, "seq", [r[2] for r in rows])
+            keyframes.insert(0, "ts_recv", [r[1] for r in rows])
+            keyframes.insert(0, "timestamp", [r[0] for r in rows])
+        else:
+            keyframes = pd.read_sql_query("SELECT * FROM L2_keyframes WHERE symbol = ?", con, params=(symbol,))
+        con.close()
+
+    else:
+        raise NotImplementedError(f"L2 output mode '{output_mode}' not implemented, select csv, parquet, or sql.")
+
+    return deltas, keyframes
+
+
+def reconstruct_L2(
+    deltas: pd.DataFrame,
+    keyframes: pd.DataFrame,
+    times=None,
+    freq: Union[str, None] = None,
+    depth: Union[int, None] = None,
+    symbol: Union[str, None] = None,
+) -> pd.DataFrame:
+    """
+    Rebuild full depth L2 books from delta logs at arbitrary times or on a fixed grid.
+
+    Rather than replaying message by message, the deltas between two consecutive
+    requested times are applied to a dense per-price quantity array in a single
+    NumPy assignment, and the top levels are read off with a nonzero scan over the
+    (price sorted) array. Each requested time starts from the latest keyframe at or
+    before it, so books are exact as long as the keyframe and the deltas after it
+    are present.
+
+    Times are matched against the receive timestamps (ts_recv), which are monotonic
+    in the sequence numbers of the updates.
+
+    Parameters
+    ----------
+    deltas: pd.DataFrame
+        Rows of side, price, qty, ts_event, ts_recv, seq as written in delta mode.
+    keyframes: pd.DataFrame
+        Keyframe rows of timestamp, ts_recv, seq and the wide level columns.
+    times: array-like or None
+        The times to rebuild the book at (datetimes, ISO strings or epoch ns).
+    freq: str or None
+        Alternatively, a pandas frequency (e.g. "1s") for a regular grid spanning the
+        first keyframe to the last delta. One of times or freq must be given.
+    depth: int or None
+        The book depth. Inferred from the keyframe columns if None.
+    symbol: str or None
+        If given, added as the symbol column of the output.
+
+    Returns
+    -------
+    pd.DataFrame: One row per requested time (the index) in the wide
+    symbol, timestamp, ts_recv, ask_px_0, ask_sz_0, bid_px_0, bid_sz_0, ... layout,
+    where timestamp and ts_recv are those of the last update applied. Times before
+    the first keyframe produce NaN levels.
+    """
+    if depth is None:
+        depth = sum(1 for c in keyframes.columns if c.startswith("ask_px_"))
+    level_columns = L2_level_columns(depth)
+
+    keyframes = keyframes.sort_values("seq", kind="stable")
+    deltas = deltas.sort_values("seq", kind="stable")
+
+    kf_seq = keyframes["seq"].to_numpy(dtype=np.int64)
+    kf_recv = to_ns(keyframes["ts_recv"])
+    kf_levels = keyframes[level_columns].to_numpy(dtype=np.float64).reshape(len(keyframes), depth, 4)
+
+    d_seq = deltas["seq"].to_numpy(dtype=np.int64)
+    d_recv = to_ns(deltas["ts_recv"])
+    d_price = deltas["price"].to_numpy(dtype=np.float64)
+    d_qty = deltas["qty"].to_numpy(dtype=np.float64)
+    d_is_bid = (deltas["side"] == "b").to_numpy()
+
+    if times is None:
+        if freq is None:
+            raise ValueError("Provide either times or freq.")
+        end = max(kf_recv[-1], d_recv[-1] if len(d_recv) else kf_recv[-1])
+        grid = pd.date_range(pd.Timestamp(kf_recv[0], tz="UTC"), pd.Timestamp(end, tz="UTC"), freq=freq)
+        times = grid.as_unit("ns").asi8
+    else:
+        times = np.sort(to_ns(times))
+
+    out = np.full((len(times), 4 * depth), np.nan)
+    last_ts = np.full(len(times), None, dtype=object)
+    last_recv = np.full(len(times), None, dtype=object)
+
+    kf_ts = keyframes["timestamp"].to_numpy()
+    kf_recv_raw = keyframes["ts_recv"].to_numpy()
+    d_ts = deltas["ts_event"].to_numpy()
+    d_recv_raw = deltas["ts_recv"].to_numpy()
+
+    # Index of the keyframe in effect at each requested time (-1 if none yet).
+    kf_index = np.searchsorted(kf_recv, times, side="right") - 1
+    # Number of deltas received at or before each requested time.
+    d_stop = np.searchsorted(d_recv, times, side="right")
+
+    for k in np.unique(kf_index[kf_index >= 0]):
+        rows = np.flatnonzero(kf_index == k)
+
+        # Deltas that apply on top of this keyframe, up to the last requested time.
+        start = np.searchsorted(d_seq, kf_seq[k], side="right")
+        stop = max(start, d_stop[rows[-1]])
+
+        for is_bid, descending in [(False, False), (True, True)]:
+            side_mask = d_is_bid[start:stop] == is_bid
+            prices = d_price[start:stop][side_mask]
+            qtys = d_qty[start:stop][side_mask]
+            positions = np.flatnonzero(side_mask) + start
+
+            px_col, sz_col = (2, 3) if is_bid else (0, 1)
+            kf_px = kf_levels[k, :, px_col]
+            kf_sz = kf_levels[k, :, sz_col]
+
+            # Dense, price sorted quantity state over every price seen in this segment.
+            universe, codes = np.unique(np.concatenate([kf_px, prices]), return_inverse=True)
+            state = np.zeros(len(universe))
+            state[codes[:depth]] = kf_sz
+            codes = codes[depth:]
+
+            applied = 0
+            for r in rows:
+                n = np.searchsorted(positions, d_stop[r])
+                if n > applied:
+                    # Last write wins within the chunk of deltas.
+                    chunk = codes[applied:n][::-1]
+                    uniq, first = np.unique(chunk, return_index=True)
+                    state[uniq] = qtys[applied:n][::-1][first]
+                    applied = n
+
+                live = np.flatnonzero(state > 0)
+                if descending:
+                    live = live[::-1]
+                live = live[:depth]
+                out[r, px_col:4 * len(live):4] = universe[live]
+                out[r, sz_col:4 * len(live):4] = state[live]
+
+        # Timestamps of the last update applied at each requested time.
+        for r in rows:
+            if d_stop[r] > start:
+                last_ts[r] = d_ts[d_stop[r] - 1]
+                last_recv[r] = d_recv_raw[d_stop[r] - 1]
+            else:
+                last_ts[r] = kf_ts[k]
+                last_recv[r] = kf_recv_raw[k]
+
+    df = pd.DataFrame(out, columns=level_columns, index=pd.to_datetime(times, utc=True))
+    df.index.name = "time"
+    df.insert(0, "ts_recv", last_recv)
+    df.insert(0, "timestamp", last_ts)
+    df.insert(0, "symbol", symbol)
+    return df
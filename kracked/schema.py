@@ -0,0 +1,220 @@
+"""
+Typed message schemas for the Kraken v2 websocket channels.
+
+The feeds can decode messages straight from the wire into these msgspec Structs
+(see BaseKrakenWS.set_decoder(use_schema=True)), which skips the intermediate
+dictionaries built by a generic JSON decoder and gives compact, slotted objects with
+attribute access. Every field has a default, so heartbeats, status messages and
+method responses on the same connection decode into the same message type with
+the unused fields left empty. Unknown fields are ignored.
+
+Requires msgspec (pip install msgspec).
+"""
+from typing import List, Union
+
+try:
+    import msgspec
+except ImportError as e:
+    raise ImportError("kracked.schema requires msgspec, install it with `pip install msgspec`.") from e
+
+
+class KrakenStruct(msgspec.Struct, gc=False):
+    """
+    Base for all message structs. The structs hold no reference cycles, so they are
+    excluded from garbage collector tracking to keep GC pauses off the websocket threads.
+    """
+
+
+# ----------------------------------------------------------------------
+# ticker (L1)
+# ----------------------------------------------------------------------
+
+class Ticker(KrakenStruct):
+    symbol: str = ""
+    bid: float = 0.0
+    bid_qty: float = 0.0
+    ask: float = 0.0
+    ask_qty: float = 0.0
+    last: float = 0.0
+    volume: float = 0.0
+    vwap: float = 0.0
+    low: float = 0.0
+    high: float = 0.0
+    change: float = 0.0
+    change_pct: float = 0.0
+
+
+class TickerMessage(KrakenStruct):
+    channel: str = ""
+    type: str = ""
+    method: str = ""
+    data: List[Ticker] = []
+
+
+# ----------------------------------------------------------------------
+# book (L2)
+# ----------------------------------------------------------------------
+
+class BookLevel(KrakenStruct):
+    price: float
+    qty: float
+
+
+class Book(KrakenStruct):
+    symbol: str = ""
+    bids: List[BookLevel] = []
+    asks: List[BookLevel] = []
+    checksum: int = 0
+    timestamp: str = ""
+
+
+class BookMessage(KrakenStruct):
+    channel: str = ""
+    type: str = ""
+    method: str = ""
+    data: List[Book] = []
+
+
+# ----------------------------------------------------------------------
+# level3 (L3)
+# ----------------------------------------------------------------------
+
+class Level3Order(KrakenStruct):
+    order_id: str
+    limit_price: float
+    order_qty: float
+    timestamp: str = ""
+    event: str = ""
+
+
+class Level3(KrakenStruct):
+    symbol: str = ""
+    bids: List[Level3Order] = []
+    asks: List[Level3Order] = []
+    checksum: int = 0
+    timestamp: str = ""
+
+
+class Level3Message(KrakenStruct):
+    channel: str = ""
+    type: str = ""
+    method: str = ""
+    data: List[Level3] = []
+
+
+# ----------------------------------------------------------------------
+# trade
+# ----------------------------------------------------------------------
+
+class Trade(KrakenStruct):
+    symbol: str = ""
+    side: str = ""
+    price: float = 0.0
+    qty: float = 0.0
+    ord_type: str = ""
+    trade_id: int = 0
+    timestamp: str = ""
+
+
+class TradeMessage(KrakenStruct):
+    channel: str = ""
+    type: str = ""
+    method: str = ""
+    data: List[Trade] = []
+
+
+# ----------------------------------------------------------------------
+# ohlc
+# ----------------------------------------------------------------------
+
+class Candle(KrakenStruct):
+    symbol: str = ""
+    open: float = 0.0
+    high: float = 0.0
+    low: float = 0.0
+    close: float = 0.0
+    trades: int = 0
+    volume: float = 0.0
+    vwap: float = 0.0
+    interval_begin: str = ""
+    interval: int = 0
+    timestamp: str = ""
+
+
+class OHLCMessage(KrakenStruct):
+    channel: str = ""
+    type: str = ""
+    method: str = ""
+    timestamp: str = ""
+    data: List[Candle] = []
+
+
+# ----------------------------------------------------------------------
+# instrument
+# ----------------------------------------------------------------------
+
+class Asset(KrakenStruct):
+    id: str = ""
+    status: str = ""
+    precision: int = 0
+    precision_display: int = 0
+    borrowable: bool = False
+    collateral_value: float = 0.0
+    margin_rate: float = 0.0
+
+
+class Pair(KrakenStruct):
+    symbol: str = ""
+    base: str = ""
+    quote: str = ""
+    status: str = ""
+    qty_precision: int = 0
+    qty_increment: float = 0.0
+    price_precision: int = 0
+    cost_precision: int = 0
+    marginable: bool = False
+    has_index: bool = False
+    cost_min: float = 0.0
+    margin_initial: float = 0.0
+    position_limit_long: int = 0
+    position_limit_short: int = 0
+    tick_size: float = 0.0
+    price_increment: float = 0.0
+    qty_min: float = 0.0
+
+
+class Instruments(KrakenStruct):
+    assets: List[Asset] = []
+    pairs: List[Pair] = []
+
+
+class InstrumentMessage(KrakenStruct):
+    channel: str = ""
+    type: str = ""
+    method: str = ""
+    # Status messages on the same connection carry a list here.
+    data: Union[Instruments, list] = []
+
+
+MESSAGE_TYPES = {
+    "ticker": TickerMessage,
+    "book": BookMessage,
+    "level3": Level3Message,
+    "trade": TradeMessage,
+    "ohlc": OHLCMessage,
+    "instrument": InstrumentMessage,
+}
+
+
+def make_struct_decoder(channel: str):
+    """
+    Return a function decoding raw messages of a Kraken v2 channel into its typed Struct.
+
+    Parameters
+    ----------
+    channel: str
+        One of "ticker", "book", "level3", "trade", "ohlc" or "instrument".
+    """
+    if channel not in MESSAGE_TYPES:
+        raise ValueError(f"Invalid channel: {channel}, select from {list(MESSAGE_TYPES)}")
+    return msgspec.json.Decoder(MESSAGE_TYPES[channel]).decode
@@ -17,6 +17,7 @@ setup(
 
     install_requires=['numpy', 'pandas', 'ccxt',
                       'websocket-client', 'toml', 'pyarrow'],
+    extras_require={'fast': ['orjson', 'msgspec']},
 
     keywords=['cryptocurrency', 'crypto', 'algorithmic trading', 'quantitative finance',
               'exchange', 'Kraken'],
@@ -0,0 +1,110 @@
+from kracked.book import L2Book
+
+import pytest
+
+
+def _levels(pairs):
+    return [{"price": p, "qty": q} for p, q in pairs]
+
+
+def test_l2_book_updates():
+    """
+    Tests insertion, replacement, removal and truncation in the L2 book engine.
+    """
+    book = L2Book(depth=3)
+    book.load_snapshot(
+        _levels([(99.0, 1.0), (98.0, 2.0), (97.0, 3.0)]),
+        _levels([(101.0, 1.0), (102.0, 2.0), (103.0, 3.0)]),
+    )
+
+    # Remove the best bid, add a new level inside the spread and replace an ask qty.
+    book.apply(
+        _levels([(99.0, 0.0), (99.5, 4.0), (96.0, 5.0)]),
+        _levels([(102.0, 7.0), (100.5, 1.5)]),
+    )
+
+    assert book.bids.prices == [99.5, 98.0, 97.0], "Bid levels not maintained correctly."
+    assert book.bids.qtys == [4.0, 2.0, 3.0], "Bid quantities not maintained correctly."
+    assert book.asks.prices == [100.5, 101.0, 102.0], "Ask levels not truncated to depth."
+    assert book.asks.qtys == [1.5, 1.0, 7.0], "Ask quantities not maintained correctly."
+    assert book.is_full(), "Book should hold the full depth."
+
+
+def test_l2_book_checksum():
+    """
+    Tests the Kraken checksum against a manually built string, before and after an update.
+    """
+    from zlib import crc32
+
+    def expected(book):
+        text = ""
+        for prices, qtys in [(book.asks.prices, book.asks.qtys), (book.bids.prices, book.bids.qtys)]:
+            for p, q in zip(prices[:10], qtys[:10]):
+                text += f"{p:.2f}".replace(".", "").lstrip("0") + f"{q:.8f}".replace(".", "").lstrip("0")
+        return crc32(text.encode("utf-8"))
+
+    book = L2Book(depth=10)
+    book.load_snapshot(
+        _levels([(100.0 - 0.25 * i, 0.5 + i) for i in range(10)]),
+        _levels([(100.5 + 0.25 * i, 1.5 + i) for i in range(10)]),
+    )
+    assert book.price_precision == 2, "Price precision not inferred from snapshot."
+    assert book.checksum() == expected(book), "Snapshot checksum incorrect."
+
+    book.apply(_levels([(100.0, 0.0), (97.5, 3.0)]), _levels([(100.75, 0.125)]))
+    assert book.checksum() == expected(book), "Checksum incorrect after cached levels changed."
+
+
+@pytest.mark.parametrize("parse_float", ["float", "decimal", "str"])
+def test_l2_book_decoded_checksum(parse_float):
+    """
+    Tests that prices and quantities decoded as float, Decimal or text, which Kraken
+    sends without trailing zeros, give the same checksum padded to the pair precision.
+    """
+    from zlib import crc32
+    from kracked.core import make_decoder
+
+    decode = make_decoder(backend="json", parse_float=parse_float)
+    message = decode(
+        '{"bids": [' + ",".join(f'{{"price": {100 - i}.1, "qty": 1.5}}' for i in range(10)) + '],'
+        ' "asks": [' + ",".join(f'{{"price": {101 + i}.25, "qty": 0.001}}' for i in range(10)) + ']}'
+    )
+    book = L2Book(depth=10, price_precision=2, qty_precision=8)
+    book.load_snapshot(message["bids"], message["asks"])
+
+    text = "".join(f"{101 + i}25" + "100000" for i in range(10))
+    text += "".join(f"{100 - i}10" + "150000000" for i in range(10))
+    assert book.bids.prices[0] == 100.1, "Decoded prices not converted to float."
+    assert book.checksum() == crc32(text.encode("utf-8")), "Checksum should be padded to the pair precision."
+
+
+def test_l3_book_events():
+    """
+    Tests order events, level FIFO queues and queue positions in the L3 book engine.
+    """
+    from kracked.book import L3Book
+
+    def _orders(rows):
+        return [{"order_id": o, "limit_price": p, "order_qty": q} for o, p, q in rows]
+
+    book = L3Book()
+    book.load_snapshot(
+        _orders([("B1", 99.0, 1.0), ("B2", 99.0, 2.0), ("B3", 98.0, 3.0)]),
+        _orders([("A1", 101.0, 1.0), ("A2", 102.0, 2.0)]),
+    )
+    assert book.best_bid() == (99.0, 3.0)
+    assert book.best_ask() == (101.0, 1.0)
+    assert book.queue_position("B2") == (1, 1.0)
+
+    book.apply_event("b", "add", "B4", 99.0, 0.5)
+    book.apply_event("b", "modify", "B1", 99.0, 0.25)    # Keeps priority.
+    book.apply_event("a", "delete", "A1", 101.0, 0.0)
+    book.apply_event("b", "modify", "B3", 99.5, 3.0)     # New price, back of the queue.
+    book.apply_event("a", "delete", "UNKNOWN", 101.0, 0.0)
+
+    assert book.bids.aggregate() == [(99.5, 3.0, 1), (99.0, 2.75, 3)]
+    assert book.asks.aggregate() == [(102.0, 2.0, 1)]
+    assert book.queue_position("B4") == (2, 2.25)
+    assert book.order("B1") == ("b", 99.0, 0.25)
+    assert book.order("A1") is None
+    assert len(book) == 5
@@ -0,0 +1,1063 @@
+from kracked.book import L2Book
+from kracked.io import KrackedWriter
+
+import numpy as np
+import pandas as pd
+import sqlite3
+import os
+import queue
+import pytest
+
+
+def _l2_payload(book, i):
+    return {
+        "channel": "L2",
+        "symbol": "BTC/USD",
+        "depth": book.depth,
+        "timestamp": f"2026-10-17T00:{i // 60:02d}:{i % 60:02d}.000000Z",
+        "ts_recv": f"2026-10-17T00:{i // 60:02d}:{i % 60:02d}.000100+00:00",
+        "book": book.snapshot(),
+    }
+
+
+def _filled_book(depth=10):
+    book = L2Book(depth)
+    book.load_snapshot(
+        [{"price": 100.0 - i, "qty": 1.0 + i} for i in range(depth)],
+        [{"price": 101.0 + i, "qty": 2.0 + i} for i in range(depth)],
+    )
+    return book
+
+
+def test_L2_array_payloads(tmp_path):
+    """
+    Tests that array-backed L2 snapshots land in the wide layout for sql and csv.
+    """
+    book = _filled_book()
+
+    for mode in ["sql", "csv"]:
+        writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path / mode), output_mode=mode)
+        for i in range(3):
+            writer._dispatch(_l2_payload(book, i))
+        writer.close()
+
+        if mode == "sql":
+            con = sqlite3.connect(str(tmp_path / mode / "kracked_outputs.db"))
+            df = pd.read_sql_query("SELECT * FROM L2", con)
+            con.close()
+        else:
+            df = pd.read_csv(str(tmp_path / mode / "L2_BTC_USD_orderbook.csv"))
+
+        assert len(df) == 3, f"Expected 3 L2 rows in {mode} mode."
+        assert np.allclose(df["ask_px_0"], 101.0), f"Best ask wrong in {mode} mode."
+        assert np.allclose(df["bid_px_9"], 91.0), f"Deepest bid wrong in {mode} mode."
+        assert np.allclose(df["bid_sz_9"], 10.0), f"Deepest bid size wrong in {mode} mode."
+
+
+class _FakeWS:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def close(self):
+        pass
+
+
+def _book_messages(n_updates, depth=10, seed=0):
+    """Synthetic Kraken v2 book snapshot followed by random level updates that keep the book full."""
+    import json
+    rng = np.random.default_rng(seed)
+    books = {"bids": [100.0 - i for i in range(depth)], "asks": [101.0 + i for i in range(depth)]}
+    messages = [json.dumps({"channel": "book", "type": "snapshot", "data": [{
+        "symbol": "BTC/USD", "checksum": 0, "timestamp": "2026-10-17T00:00:00.000000Z",
+        "bids": [{"price": p, "qty": 1.0} for p in books["bids"]],
+        "asks": [{"price": p, "qty": 1.0} for p in books["asks"]],
+    }]})]
+    for n in range(n_updates):
+        side = "bids" if n % 2 == 0 else "asks"
+        sign = -1.0 if side == "bids" else 1.0
+        prices = books[side]
+        action = n % 3
+        if action == 0:
+            # Change the size of an existing level.
+            levels = [{"price": prices[int(rng.integers(0, depth))], "qty": float(rng.integers(1, 5))}]
+        elif action == 1:
+            # Remove a level and let a new one enter at the back of the book.
+            removed = prices.pop(int(rng.integers(0, depth)))
+            prices.append(prices[-1] + sign)
+            levels = [{"price": removed, "qty": 0.0}, {"price": prices[-1], "qty": 3.0}]
+        else:
+            # Improve the best price, pushing the worst level out of the book.
+            prices.insert(0, prices[0] - 0.5 * sign)
+            prices.pop()
+            levels = [{"price": prices[0], "qty": 2.0}]
+        messages.append(json.dumps({"channel": "book", "type": "update", "data": [{
+            "symbol": "BTC/USD", "checksum": 0, "timestamp": f"2026-10-17T00:{n // 60:02d}:{n % 60:02d}.000000Z",
+            "bids": levels if side == "bids" else [],
+            "asks": levels if side == "asks" else [],
+        }]}))
+    return messages
+
+
+def test_L2_delta_logging(tmp_path):
+    """
+    Tests that delta mode writes deltas and keyframes and that replaying the deltas
+    on top of the first keyframe reproduces the live book.
+    """
+    from kracked.feeds import KrakenL2
+    from kracked.book import L2Book
+
+    feed = KrakenL2("BTC/USD", depth=10, log_book_every=7, checksum_every=0,
+                    log_mode="delta", keyframe_every=25, keyframe_interval=None)
+    feed.output_queue = queue.Queue()
+    ws = _FakeWS()
+    for message in _book_messages(60):
+        feed._on_message(ws, message)
+    feed._emit_deltas("BTC/USD")
+
+    writer = KrackedWriter(feed.output_queue, output_directory=str(tmp_path), output_mode="csv")
+    while not feed.output_queue.empty():
+        writer._dispatch(feed.output_queue.get())
+    writer.close()
+
+    deltas = pd.read_csv(str(tmp_path / "L2_BTC_USD_deltas.csv"))
+    keyframes = pd.read_csv(str(tmp_path / "L2_BTC_USD_keyframes.csv"))
+    assert list(keyframes["seq"]) == [1, 26, 51], "Keyframes not emitted every keyframe_every updates."
+    assert deltas["seq"].max() == 61, "Deltas missing for the last updates."
+
+    # Replay everything after the first keyframe.
+    book = L2Book(10)
+    first = keyframes.iloc[0]
+    book.load_snapshot(
+        [{"price": first[f"bid_px_{i}"], "qty": first[f"bid_sz_{i}"]} for i in range(10)],
+        [{"price": first[f"ask_px_{i}"], "qty": first[f"ask_sz_{i}"]} for i in range(10)],
+    )
+    for _, group in deltas[deltas["seq"] > first["seq"]].groupby("seq", sort=True):
+        levels = group.to_dict("records")
+        book.apply([l for l in levels if l["side"] == "b"], [l for l in levels if l["side"] == "a"])
+
+    assert np.allclose(book.snapshot(), feed.books["BTC/USD"].snapshot()), "Replayed book differs from live book."
+
+
+
+def test_L2_checksum_resubscribes(monkeypatch):
+    """
+    Tests that the pair precisions come from the instrument metadata unless given, and
+    that a symbol failing its checksums is only resubscribed max_resubscribes times.
+    """
+    import kracked.feeds
+    from kracked.feeds import KrakenL2
+
+    monkeypatch.setattr(kracked.feeds, "fetch_pair_precisions", lambda symbols: {"BTC/USD": (1, 8)})
+    feed = KrakenL2("BTC/USD", depth=10, log_book_every=100, qty_precision=4, max_resubscribes=2)
+    feed.output_queue = queue.Queue()
+    ws = _FakeWS()
+    feed._on_open(ws)
+    book = feed.books["BTC/USD"]
+    assert (book.price_precision, book.qty_precision) == (1, 4)
+
+    # Every message carries checksum 0, so every check fails.
+    messages = _book_messages(5)
+    for message in [messages[0], messages[1], messages[0], messages[2], messages[0]] + messages[3:]:
+        feed._on_message(ws, message)
+    assert sum('"unsubscribe"' in m for m in ws.sent) == 2
+    assert feed.unverified == {"BTC/USD"}
+
+
+
+@pytest.mark.parametrize("parse_float", ["float", "decimal", "str"])
+@pytest.mark.parametrize("mode", ["parquet", "arrow", "sql"])
+def test_L2_delta_parse_float(tmp_path, parse_float, mode):
+    """
+    Tests that delta mode writes float levels whichever way the prices were decoded.
+    """
+    from kracked.feeds import KrakenL2
+    from kracked.reader import KrackedReader
+
+    feed = KrakenL2("BTC/USD", depth=10, log_book_every=5, checksum_every=0, fetch_precision=False,
+                    log_mode="delta", keyframe_every=25, keyframe_interval=None)
+    feed.set_decoder(backend="json", parse_float=parse_float)
+    feed.output_queue = queue.Queue()
+    for message in _book_messages(20):
+        feed._on_message(_FakeWS(), message)
+    feed._emit_deltas("BTC/USD")
+
+    writer = KrackedWriter(feed.output_queue, output_directory=str(tmp_path), output_mode=mode)
+    while not feed.output_queue.empty():
+        writer._dispatch(feed.output_queue.get())
+    writer.close()
+
+    deltas = KrackedReader(str(tmp_path)).read("L2_deltas")
+    assert len(deltas) > 20 and deltas["price"].dtype == np.float64
+
+
+def _l3_messages():
+    """Synthetic Kraken v2 level3 snapshot followed by add, modify and delete events."""
+    import json
+
+    def _order(order_id, price, qty, event=None):
+        order = {"order_id": order_id, "limit_price": price, "order_qty": qty,
+                 "timestamp": "2026-10-17T00:00:00.000000Z"}
+        return order if event is None else dict(order, event=event)
+
+    return [
+        json.dumps({"channel": "level3", "type": "snapshot", "data": [{
+            "symbol": "BTC/USD", "checksum": 0,
+            "bids": [_order("B1", 99.5, 1.25), _order("B2", 99.0, 2.0)],
+            "asks": [_order("A1", 101.0, 0.5)],
+        }]}),
+        json.dumps({"channel": "level3", "type": "update", "data": [{
+            "symbol": "BTC/USD", "checksum": 0,
+            "bids": [_order("B3", 99.75, 3.0, "add"), _order("B2", 99.0, 1.5, "modify")],
+            "asks": [_order("A1", 101.0, 0.5, "delete"), _order("A2", 101.5, 0.75, "add")],
+        }]}),
+    ]
+
+
+def test_L3_str_decoder(tmp_path):
+    """
+    Tests that the L3 feed keeps float books and ticks with prices decoded as text.
+    """
+    from kracked.feeds import KrakenL3
+
+    feed = KrakenL3("BTC/USD", api_key=None, secret_key=None, log_ticks_every=100)
+    feed.set_decoder(backend="json", parse_float="str")
+    feed.output_queue = queue.Queue()
+    for message in _l3_messages():
+        feed._on_message(_FakeWS(), message)
+    feed._flush()
+
+    book = feed.books["BTC/USD"]
+    assert book.best_bid() == (99.75, 3.0) and book.best_ask() == (101.5, 0.75)
+    writer = KrackedWriter(feed.output_queue, output_directory=str(tmp_path), output_mode="parquet")
+    writer._dispatch(feed.output_queue.get())
+    writer.close()
+    df = pd.read_parquet(tmp_path / "L3_ticks.parquet")
+    assert list(df["price"]) == [99.75, 99.0, 101.0, 101.5]
+
+
+
+DECODERS = [(backend, parse_float) for backend in ["json", "msgspec", "orjson"]
+            for parse_float in ["float", "decimal", "str"] if backend != "orjson" or parse_float == "float"]
+
+
+@pytest.mark.parametrize("backend,parse_float", DECODERS)
+@pytest.mark.parametrize("mode", ["parquet", "sql"])
+def test_feeds_decoders(tmp_path, backend, parse_float, mode):
+    """
+    Tests that every feed writes float prices through every decoder backend and
+    parse_float mode.
+    """
+    import json
+    from kracked.feeds import KrakenL1, KrakenL2, KrakenL3, KrakenOHLC, KrakenTrades
+    from kracked.reader import KrackedReader
+
+    if backend != "json":
+        pytest.importorskip(backend)
+    stamp = "2026-10-17T00:00:00.000000Z"
+    ticker = {"symbol": "BTC/USD", "bid": 100.5, "bid_qty": 1.25, "ask": 101.5, "ask_qty": 0.5, "last": 101.0,
+              "volume": 10.0, "vwap": 100.75, "low": 99.5, "high": 102.5, "change": 1.5, "change_pct": 0.5}
+    trade = {"symbol": "BTC/USD", "price": 100.5, "qty": 0.25, "side": "buy", "ord_type": "limit",
+             "trade_id": 1, "timestamp": stamp}
+    candle = {"symbol": "BTC/USD", "open": 100.5, "high": 102.5, "low": 99.5, "close": 101.5, "trades": 3,
+              "volume": 1.5, "vwap": 100.75, "interval_begin": stamp, "interval": 5, "timestamp": stamp}
+    feeds = {
+        "L1": (KrakenL1("BTC/USD"), [{"channel": "ticker", "type": "update", "data": [ticker]}]),
+        "L2": (KrakenL2("BTC/USD", depth=10, log_book_every=1, checksum_every=0, fetch_precision=False),
+               [json.loads(m) for m in _book_messages(5)]),
+        "L2_deltas": (KrakenL2("BTC/USD", depth=10, log_book_every=1, checksum_every=0, fetch_precision=False,
+                               log_mode="delta"), [json.loads(m) for m in _book_messages(5)]),
+        "L3": (KrakenL3("BTC/USD", api_key=None, secret_key=None, log_ticks_every=1),
+               [json.loads(m) for m in _l3_messages()]),
+        "trades": (KrakenTrades("BTC/USD", log_trades_every=1), [{"channel": "trade", "type": "update", "data": [trade]}]),
+        "OHLC": (KrakenOHLC("BTC/USD"), [{"channel": "ohlc", "type": "update", "timestamp": stamp, "data": [candle]}]),
+    }
+
+    out = queue.Queue()
+    for feed, messages in feeds.values():
+        feed.set_decoder(backend=backend, parse_float=parse_float)
+        feed.output_queue = out
+        for message in messages:
+            feed._on_message(_FakeWS(), json.dumps(message))
+    feeds["L2_deltas"][0]._emit_deltas("BTC/USD")
+
+    # L1 and OHLC have no parquet output.
+    channel_modes = {"L1": "csv", "OHLC": "csv"} if mode == "parquet" else None
+    writer = KrackedWriter(out, output_directory=str(tmp_path), output_mode=mode, channel_modes=channel_modes)
+    while not out.empty():
+        writer._dispatch(out.get())
+    writer.close()
+
+    reader = KrackedReader(str(tmp_path))
+    for channel, column in [("L1", "bid"), ("L2", "bid_px_0"), ("L2_deltas", "price"), ("L3", "price"),
+                            ("trades", "price"), ("OHLC", "close")]:
+        df = reader.read(channel)
+        assert len(df) and df[column].dtype == np.float64, channel
+    reader.close()
+
+
+@pytest.mark.parametrize("partitioning", [False, True])
+def test_L2_reconstruction(tmp_path, partitioning):
+    """
+    Tests the vectorized reconstruction against the live book after every update.
+    """
+    from kracked.feeds import KrakenL2
+    from kracked.reconstruct import load_L2_deltas, reconstruct_L2
+
+    feed = KrakenL2("BTC/USD", depth=10, log_book_every=5, checksum_every=0,
+                    log_mode="delta", keyframe_every=40, keyframe_interval=None)
+    feed.output_queue = queue.Queue()
+    ws = _FakeWS()
+    live_books = {}
+    for message in _book_messages(150, seed=1):
+        feed._on_message(ws, message)
+        live_books[feed._seq["BTC/USD"]] = feed.books["BTC/USD"].snapshot()
+    feed._emit_deltas("BTC/USD")
+
+    writer = KrackedWriter(feed.output_queue, output_directory=str(tmp_path), output_mode="parquet",
+                           parquet_partitioning=partitioning)
+    while not feed.output_queue.empty():
+        writer._dispatch(feed.output_queue.get())
+
+    deltas, keyframes = load_L2_deltas(str(tmp_path), "BTC/USD", output_mode="parquet")
+
+    # Only compare at receive times that identify a single update.
+    recv_per_seq = deltas.groupby("seq")["ts_recv"].last()
+    recv_per_seq = recv_per_seq[~recv_per_seq.duplicated(keep=False)]
+    books = reconstruct_L2(deltas, keyframes, times=recv_per_seq.values, symbol="BTC/USD")
+    assert len(books) == len(recv_per_seq), "Expected one book per requested time."
+
+    level_columns = [c for c in books.columns if c[:4] in ("ask_", "bid_")]
+    for seq, ts_recv in recv_per_seq.items():
+        row = books.loc[pd.Timestamp(ts_recv), level_columns].to_numpy(dtype=float)
+        assert np.allclose(row, live_books[seq]), f"Reconstructed book differs at seq {seq}."
+
+
+def test_L2_schema_decoding():
+    """
+    Tests that the typed msgspec path builds the same books and payloads as the dict path.
+    """
+    pytest.importorskip("msgspec")
+    from kracked.feeds import KrakenL2
+
+    feeds = []
+    for use_schema in [False, True]:
+        feed = KrakenL2("BTC/USD", depth=10, log_book_every=3, checksum_every=0)
+        feed.set_decoder(use_schema=use_schema)
+        feed.output_queue = queue.Queue()
+        ws = _FakeWS()
+        for message in _book_messages(40, seed=2):
+            feed._on_message(ws, message)
+        feeds.append(feed)
+
+    dict_feed, struct_feed = feeds
+    assert struct_feed.use_schema
+    assert dict_feed.books["BTC/USD"].to_dict() == struct_feed.books["BTC/USD"].to_dict()
+    dict_out = list(dict_feed.output_queue.queue)
+    struct_out = list(struct_feed.output_queue.queue)
+    assert len(dict_out) == len(struct_out) > 0
+    for a, b in zip(dict_out, struct_out):
+        np.testing.assert_array_equal(a["book"], b["book"])
+
+
+def test_columnar_trades(tmp_path):
+    """
+    Tests that trades buffered in columnar form are written by every output mode.
+    """
+    import json
+    from kracked.feeds import KrakenTrades
+
+    feed = KrakenTrades("BTC/USD", log_trades_every=4)
+    feed.output_queue = queue.Queue()
+    for i in range(5):
+        feed._on_message(None, json.dumps({"channel": "trade", "type": "update", "data": [{
+            "symbol": "BTC/USD", "side": ["buy", "sell"][i % 2], "price": 100.0 + i, "qty": 0.5,
+            "ord_type": "limit", "trade_id": i, "timestamp": f"2026-10-17T00:00:0{i}.123456789Z",
+        }]}))
+
+    payload = feed.output_queue.get_nowait()
+    assert feed.output_queue.empty() and len(feed.all_trades) == 1
+    batch = payload["batch"]
+    assert batch.num_rows == 4
+    assert batch.column("side").dictionary.to_pylist() == ["buy", "sell"]
+    assert batch.column("ts_event")[0].value == pd.Timestamp("2026-10-17T00:00:00.123456789Z").value
+
+    for mode in ["sql", "csv", "parquet"]:
+        out = tmp_path / mode
+        writer = KrackedWriter(queue.Queue(), output_directory=str(out), output_mode=mode)
+        writer._dispatch(payload)
+        writer._dispatch(payload)
+        writer.close()
+        if mode == "sql":
+            con = sqlite3.connect(str(out / "kracked_outputs.db"))
+            df = pd.read_sql_query("SELECT * FROM trades", con)
+            con.close()
+            assert df["ts_event"][1] == "2026-10-17T00:00:01.123456789Z"
+        elif mode == "csv":
+            df = pd.read_csv(out / "trades.csv")
+        else:
+            df = pd.read_parquet(out / "trades.parquet")
+        assert len(df) == 8
+        assert list(df["price"][:4]) == [100.0, 101.0, 102.0, 103.0]
+
+
+def test_timed_flush():
+    """
+    Tests that buffered trades are emitted by the flush timer without further messages.
+    """
+    import json
+    from kracked.feeds import KrakenTrades
+
+    feed = KrakenTrades("BTC/USD", log_trades_every=1000, flush_interval_ms=20)
+    feed.output_queue = queue.Queue()
+    feed._start_flush_timer()
+    feed._locked_on_message(None, json.dumps({"channel": "trade", "type": "update", "data": [{
+        "symbol": "BTC/USD", "side": "buy", "price": 100.0, "qty": 0.5,
+        "ord_type": "limit", "trade_id": 1, "timestamp": "2026-10-17T00:00:00.000000Z",
+    }]}))
+
+    payload = feed.output_queue.get(timeout=2)
+    feed._stop_flush_timer()
+    assert payload["batch"].num_rows == 1
+    assert len(feed.all_trades) == 0
+
+
+def test_untimed_flush_lock():
+    """
+    Tests that messages are handled under the flush lock even without a flush timer.
+    """
+    import json
+    from kracked.feeds import KrakenTrades
+
+    feed = KrakenTrades("BTC/USD", log_trades_every=1000)
+    feed.output_queue = queue.Queue()
+    feed._start_flush_timer()
+    assert feed._flush_lock is not None and feed._flush_thread is None
+
+    seen = []
+    handle = feed._on_message
+    feed._on_message = lambda ws, message: (seen.append(feed._flush_lock.locked()), handle(ws, message))
+    feed._locked_on_message(None, json.dumps({"channel": "trade", "type": "update", "data": [{
+        "symbol": "BTC/USD", "side": "buy", "price": 100.0, "qty": 0.5,
+        "ord_type": "limit", "trade_id": 1, "timestamp": "2026-10-17T00:00:00.000000Z",
+    }]}))
+    assert seen == [True]
+
+    with feed._flush_lock:
+        feed._flush()
+    assert feed.output_queue.get(timeout=2)["batch"].num_rows == 1
+
+
+def test_sql_grouped_commits(tmp_path):
+    """
+    Tests that the writer keeps one WAL connection open and commits by row budget.
+    """
+    book = _filled_book()
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="sql",
+                           commit_every_rows=5, commit_interval=3600)
+    for i in range(12):
+        writer._dispatch(_l2_payload(book, i))
+
+    con = sqlite3.connect(str(tmp_path / "kracked_outputs.db"))
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert con.execute("SELECT COUNT(*) FROM L2").fetchone()[0] == 10
+    assert writer.commit_stats()["n_commits"] == 2
+
+    writer.close()
+    assert con.execute("SELECT COUNT(*) FROM L2").fetchone()[0] == 12
+    con.close()
+
+
+def test_writer_micro_batching(tmp_path):
+    """
+    Tests that the run loop drains the queue and writes each channel/symbol group in bulk.
+    """
+    from kracked.buffers import ColumnarBuffer, TRADE_COLUMNS
+
+    book = _filled_book()
+    q = queue.Queue()
+    for i in range(50):
+        q.put(_l2_payload(book, i))
+    for i in range(3):
+        trades = ColumnarBuffer(TRADE_COLUMNS)
+        trades.append(("2026-10-17T00:00:00Z", 0, "BTC/USD", 100.0 + i, 1.0, ["buy", "sell"][i % 2], "limit", i))
+        q.put({"channel": "trades", "batch": trades.to_record_batch()})
+    q.put(None)
+
+    writer = KrackedWriter(q, output_directory=str(tmp_path), output_mode="sql",
+                           channel_modes={"trades": "csv"})
+    calls = []
+    write_L2_rows = writer._write_L2_rows
+    writer._write_L2_rows = lambda *args: calls.append(len(args[-1])) or write_L2_rows(*args)
+    writer.run()
+
+    assert calls == [50]
+    con = sqlite3.connect(str(tmp_path / "kracked_outputs.db"))
+    assert con.execute("SELECT COUNT(*) FROM L2").fetchone()[0] == 50
+    con.close()
+    trades = pd.read_csv(tmp_path / "trades.csv")
+    assert list(trades["side"]) == ["buy", "sell", "buy"]
+    assert list(trades["price"]) == [100.0, 101.0, 102.0]
+
+
+def test_L2_parquet_stream(tmp_path):
+    """
+    Tests that L2 parquet output is streamed in row groups and files only appear once
+    closed, by row count or by age.
+    """
+    import pyarrow.parquet as pq
+
+    book = _filled_book()
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="parquet",
+                           convert_to_parquet_every=10, parquet_rows_per_file=20)
+    for i in range(25):
+        writer._dispatch(_l2_payload(book, i))
+
+    root = tmp_path / "L2_BTC_USD_orderbook.parquet"
+    assert len(pd.read_parquet(root)) == 20
+    writer.close()
+
+    files = sorted(root.glob("*.parquet"))
+    assert len(files) == 2 and not any(f.name.startswith(".") for f in files)
+    df = pd.read_parquet(root)
+    assert len(df) == 25
+    assert df["ask_px_0"].dtype == np.float64
+    assert {pq.ParquetFile(f).num_row_groups for f in files} <= {1, 2}
+
+    # Files of slow symbols are closed once parquet_max_file_seconds old.
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path / "slow"), output_mode="parquet",
+                           convert_to_parquet_every=10, parquet_max_file_seconds=60)
+    for i in range(3):
+        writer._dispatch(_l2_payload(book, i))
+    root = tmp_path / "slow" / "L2_BTC_USD_orderbook.parquet"
+    writer._maybe_close_parquet()
+    assert not root.exists() or not list(root.glob("*.parquet"))
+    writer._l2_streams["BTC/USD"]._started_at -= 60
+    writer._maybe_close_parquet()
+    assert len(pd.read_parquet(root)) == 3
+    writer.close()
+
+
+def test_parquet_compaction(tmp_path):
+    """
+    Tests that small trade files are merged into one sorted file with the same rows.
+    """
+    from kracked.buffers import ColumnarBuffer, TRADE_COLUMNS
+    from kracked.compact import compact_dataset
+
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="parquet")
+    for i in range(6):
+        trades = ColumnarBuffer(TRADE_COLUMNS)
+        symbol = ["ETH/USD", "BTC/USD"][i % 2]
+        trades.append((f"2026-10-17T00:00:0{5 - i}Z", 0, symbol, 100.0 + i, 1.0, "buy", "limit", i))
+        writer._dispatch({"channel": "trades", "batch": trades.to_record_batch()})
+
+    root = tmp_path / "trades.parquet"
+    before = pd.read_parquet(root)
+    assert len(list(root.glob("*.parquet"))) == 6
+
+    assert compact_dataset(str(root), min_age=0) == 6
+    assert len(list(root.glob("*.parquet"))) == 1
+
+    after = pd.read_parquet(root)
+    assert list(after["symbol"]) == ["BTC/USD"] * 3 + ["ETH/USD"] * 3
+    assert after.groupby("symbol")["ts_event"].apply(lambda s: s.is_monotonic_increasing).all()
+    assert sorted(after["trade_id"]) == sorted(before["trade_id"])
+
+
+def test_parquet_partitioning(tmp_path):
+    """
+    Tests the symbol=/date= layout of partitioned trades and that the reader prunes
+    by symbol and time.
+    """
+    import os
+    from kracked.buffers import ColumnarBuffer, TRADE_COLUMNS
+    from kracked.reader import read_parquet
+
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="parquet",
+                           parquet_partitioning=True)
+    trades = ColumnarBuffer(TRADE_COLUMNS)
+    for i, (day, symbol) in enumerate([(16, "BTC/USD"), (17, "BTC/USD"), (17, "ETH/USD"), (17, "BTC/USD")]):
+        trades.append((f"2026-10-{day}T12:00:0{i}Z", 0, symbol, 100.0 + i, 1.0, "buy", "limit", i))
+    writer._dispatch({"channel": "trades", "batch": trades.to_record_batch()})
+
+    root = tmp_path / "trades.parquet"
+    assert sorted(os.listdir(root)) == ["symbol=BTC_USD", "symbol=ETH_USD"]
+    assert sorted(os.listdir(root / "symbol=BTC_USD")) == ["date=2026-10-16", "date=2026-10-17"]
+
+    df = read_parquet(str(root), symbols=["BTC/USD"], start="2026-10-17")
+    assert list(df["trade_id"]) == [1, 3]
+    assert list(df["symbol"]) == ["BTC/USD"] * 2
+    assert "date" not in df.columns
+
+    df = read_parquet(str(root), end="2026-10-17T12:00:02", columns=["trade_id"])
+    assert sorted(df["trade_id"]) == [0, 1, 2]
+    assert list(df.columns) == ["trade_id"]
+
+
+def test_arrow_segments(tmp_path):
+    """
+    Tests that trades are readable from the open Arrow IPC segment, rotated, and
+    converted to parquet.
+    """
+    import os
+    from kracked.buffers import ColumnarBuffer, TRADE_COLUMNS
+    from kracked.convert import convert_segments
+    from kracked.reader import read_arrow
+
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="arrow",
+                           arrow_rows_per_segment=4)
+    for i in range(5):
+        trades = ColumnarBuffer(TRADE_COLUMNS)
+        trades.append((f"2026-10-17T00:00:0{i}Z", 0, ["BTC/USD", "ETH/USD"][i % 2], 100.0 + i, 1.0, "buy", "limit", i))
+        trades.append((f"2026-10-17T00:00:0{i}Z", 0, "BTC/USD", 100.0 + i, 2.0, "sell", "market", 10 + i))
+        writer._dispatch({"channel": "trades", "batch": trades.to_record_batch()})
+
+    root = tmp_path / "trades.arrows"
+    names = sorted(os.listdir(root))
+    assert len(names) == 3 and names[-1].endswith(".arrows.open")
+    assert read_arrow(str(root)).column("trade_id").to_pylist() == [0, 10, 1, 11, 2, 12, 3, 13, 4, 14]
+    assert len(read_arrow(str(root), include_open=False)) == 8
+
+    assert convert_segments(str(root)) == 2
+    writer.close()
+    assert convert_segments(str(root)) == 1
+    assert os.listdir(root) == []
+
+    df = pd.read_parquet(tmp_path / "trades.parquet")
+    assert sorted(df["trade_id"]) == [0, 1, 2, 3, 4, 10, 11, 12, 13, 14]
+    assert set(df["symbol"]) == {"BTC/USD", "ETH/USD"}
+
+
+def test_live_book(tmp_path):
+    """
+    Tests that the memory-mapped live book follows the feed's book.
+    """
+    from kracked.feeds import KrakenL2
+    from kracked.livebook import LiveBook, live_book_path
+
+    feed = KrakenL2("BTC/USD", depth=10, log_book_every=1, checksum_every=0, append_book=False,
+                    log_for_webapp=True, output_directory=str(tmp_path))
+    feed.output_queue = queue.Queue()
+    ws = _FakeWS()
+    messages = _book_messages(20, seed=2)
+    feed._on_message(ws, messages[0])
+    feed._on_message(ws, messages[1])
+
+    reader = LiveBook.open(live_book_path(str(tmp_path), "BTC/USD"))
+    assert reader.symbol == "BTC/USD" and reader.depth == 10
+
+    n_writes = reader.n_writes
+    for message in messages[2:]:
+        feed._on_message(ws, message)
+        levels, ts_event, _, seq = reader.read()
+        assert np.array_equal(levels.reshape(-1), feed.books["BTC/USD"].snapshot())
+        assert ts_event == str(feed._last_timestamp["BTC/USD"]) and seq % 2 == 0
+
+    assert reader.n_writes == n_writes + len(messages) - 2
+    assert reader.to_dict()["bids"] == feed.books["BTC/USD"].to_dict()["bids"]
+    assert feed.output_queue.empty()
+
+    # Recreating the book resets it in place for the mapped reader instead of truncating.
+    size = os.path.getsize(reader.path)
+    LiveBook.create(reader.path, "BTC/USD", 5).close()
+    assert os.path.getsize(reader.path) == size
+    levels, _, _, new_seq = reader.read()
+    assert new_seq == seq + 2 and reader.n_writes == 0 and not levels.any()
+
+
+def test_output_queue_policies():
+    """
+    Tests the block, drop_oldest and coalesce policies of a full OutputQueue.
+    """
+    from kracked.queues import OutputQueue
+
+    q = OutputQueue(maxsize=3, policies={"trades": "drop_oldest"})
+    q.put({"channel": "L2", "symbol": "BTC/USD", "book": 0})
+    q.put({"channel": "L2", "symbol": "ETH/USD", "book": 0})
+    q.put({"channel": "trades", "batch": 0})
+
+    # Full: the BTC/USD book is replaced in place, the oldest trades payload dropped.
+    q.put({"channel": "L2", "symbol": "BTC/USD", "book": 1})
+    q.put({"channel": "trades", "batch": 1})
+    with pytest.raises(queue.Full):
+        q.put({"channel": "L1", "rows": []}, timeout=0.01)
+    q.put(None)
+
+    stats = q.stats()
+    assert stats["coalesced"] == {"L2": 1} and stats["dropped"] == {"trades": 1}
+    assert stats["blocked"] == {"L1": 1} and stats["high_water"] == 4
+
+    items = [q.get_nowait() for _ in range(4)]
+    assert [item and item.get("book", item.get("batch")) for item in items] == [1, 0, 1, None]
+    assert q.empty()
+
+
+def test_csv_sinks(tmp_path):
+    """
+    Tests that CSV files stay open and buffered until flushed, and that rotation keeps
+    every row with one header per part.
+    """
+    from kracked.io import csv_parts
+
+    book = _filled_book()
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="csv",
+                           csv_flush_interval=0.0, csv_rotate_bytes=2000)
+    path = str(tmp_path / "L2_BTC_USD_orderbook.csv")
+
+    writer._dispatch(_l2_payload(book, 0))
+    assert os.path.getsize(path) == 0
+    writer._maybe_flush_csv()
+    assert len(pd.read_csv(path)) == 1
+
+    for i in range(1, 10):
+        writer._dispatch(_l2_payload(book, i))
+    writer.close()
+
+    parts = csv_parts(path)
+    assert len(parts) > 2 and parts[-1] == path
+    df = pd.concat([pd.read_csv(part) for part in parts], ignore_index=True)
+    assert len(df) == 10 and np.allclose(df["ask_px_0"], 101.0)
+
+
+@pytest.mark.parametrize("layout", ["long", "blob"])
+def test_L2_sql_layouts(tmp_path, layout):
+    """
+    Tests that depth 1000 books round trip through the long and blob SQL layouts.
+    """
+    book = L2Book(1000)
+    book.load_snapshot(
+        [{"price": 5000.0 - i, "qty": 1.0 + i} for i in range(1000)],
+        [{"price": 5001.0 + i, "qty": 2.0 + i} for i in range(1000)],
+    )
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="sql",
+                           L2_sql_layout=layout)
+    payloads = [_l2_payload(book, i) for i in range(3)]
+    book.apply([{"price": 5000.0, "qty": 0.0}], [])
+    payloads.append(_l2_payload(book, 3))
+    writer._dispatch_many(payloads)
+    writer.commit()
+    df = writer.db.read_L2("BTC/USD", layout=layout, depth=1000)
+    with pytest.raises(ValueError, match="unknown L2 layout 'tall'"):
+        writer.db.read_L2("BTC/USD", layout="tall")
+    writer.close()
+
+    assert list(df["ts_recv"]) == [p["ts_recv"] for p in payloads]
+    assert list(df["timestamp"]) == [p["timestamp"] for p in payloads]
+    levels = df.drop(columns=["symbol", "timestamp", "ts_recv"]).to_numpy()
+    assert np.array_equal(levels, np.vstack([p["book"] for p in payloads]))
+    assert levels[3, 4 * 999 + 2] == 0.0 and levels[3, 2] == 4999.0
+
+
+def test_timestamp_formats(tmp_path):
+    """
+    Tests that epoch ns receive timestamps are written as ISO text by default and as
+    integers with timestamp_format="ns", and as typed timestamp columns in parquet.
+    """
+    ts_recv = 1_792_195_200_123_456_789  # 2026-10-17T00:00:00.123456789Z
+    l1 = {"channel": "L1", "rows": [[ts_recv, "BTC/USD"] + [1.5] * 11]}
+    book = _filled_book()
+    l2 = dict(_l2_payload(book, 0), ts_recv=ts_recv)
+
+    iso = KrackedWriter(queue.Queue(), output_directory=str(tmp_path / "iso"), output_mode="sql")
+    iso._dispatch_many([l1, l2])
+    iso.close()
+    con = sqlite3.connect(tmp_path / "iso" / "kracked_outputs.db")
+    assert con.execute("SELECT timestamp, bid FROM L1").fetchone() == ("2026-10-17T00:00:00.123456789Z", 1.5)
+    assert con.execute("SELECT ts_recv FROM L2").fetchone() == ("2026-10-17T00:00:00.123456789Z",)
+    con.close()
+
+    ns = KrackedWriter(queue.Queue(), output_directory=str(tmp_path / "ns"), output_mode="sql",
+                       channel_modes={"L2": "parquet"}, timestamp_format="ns")
+    ns._dispatch_many([l1, l2])
+    ns.close()
+    con = sqlite3.connect(tmp_path / "ns" / "kracked_outputs.db")
+    assert con.execute("SELECT timestamp, typeof(timestamp) FROM L1").fetchone() == (ts_recv, "integer")
+    con.close()
+    df = pd.read_parquet(tmp_path / "ns" / "L2_BTC_USD_orderbook.parquet")
+    assert str(df["timestamp"].dtype) == "datetime64[ns, UTC]"
+    assert df["ts_recv"].iloc[0].value == ts_recv
+
+    # Batch CSVs share the ISO form of the row CSVs, and parquet is typed in both modes.
+    from kracked.buffers import ColumnarBuffer, TRADE_COLUMNS
+    trades = ColumnarBuffer(TRADE_COLUMNS)
+    trades.append(("2026-10-17T00:00:00.5Z", ts_recv, "BTC/USD", 100.0, 1.0, "buy", "limit", 1))
+    payloads = [l1, l2, {"channel": "trades", "batch": trades.to_record_batch()}]
+    iso = KrackedWriter(queue.Queue(), output_directory=str(tmp_path / "csv"), output_mode="csv",
+                        channel_modes={"L2": "parquet"})
+    iso._dispatch_many(payloads)
+    iso.close()
+    lines = (tmp_path / "csv" / "trades.csv").read_text().splitlines()
+    assert lines[1].startswith("2026-10-17T00:00:00.500000000Z,2026-10-17T00:00:00.123456789Z,BTC/USD,")
+    assert '"' not in "".join(lines)
+    df = pd.read_parquet(tmp_path / "csv" / "L2_BTC_USD_orderbook.parquet")
+    assert str(df["ts_recv"].dtype) == "datetime64[ns, UTC]"
+
+    with pytest.raises(ValueError):
+        KrackedWriter(queue.Queue(), output_directory=str(tmp_path), timestamp_format="ms")
+
+
+@pytest.mark.parametrize("timestamp_format", ["iso", "ns"])
+def test_sql_time_range_reads(tmp_path, timestamp_format):
+    """
+    Tests that KrackedDB.read selects symbols and time ranges, uses the (symbol, time)
+    index once created but never creates it itself.
+    """
+    start = 1_792_195_200_000_000_000  # 2026-10-17T00:00:00Z
+    rows = [[start + i * 10**9, symbol] + [float(i)] * 11 for i in range(10) for symbol in ["BTC/USD", "ETH/USD"]]
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="sql",
+                           timestamp_format=timestamp_format)
+    writer._dispatch_many([{"channel": "L1", "rows": rows}])
+    writer.commit()
+
+    df = writer.db.read("L1", "BTC/USD", "2026-10-17T00:00:02", start + 5 * 10**9, columns=["timestamp", "bid"])
+    assert list(df.columns) == ["timestamp", "bid"]
+    assert list(df["bid"]) == [2.0, 3.0, 4.0, 5.0]
+    assert len(writer.db.read("L1", ["BTC/USD", "ETH/USD"], end="2026-10-17T00:00:01")) == 4
+
+    indexes = "SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'L1_symbol_time'"
+    assert writer.db.cur.execute(indexes).fetchall() == []
+    writer.db.create_indexes()
+    plan = writer.db.cur.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM L1 WHERE symbol = ? AND timestamp >= ?", ("BTC/USD", 0),
+    ).fetchall()
+    assert "L1_symbol_time" in str(plan)
+    with pytest.raises(ValueError):
+        writer.db.read("L1", columns=["bid; DROP TABLE L1"])
+    writer.close()
+
+
+
+def test_sql_column_types(tmp_path):
+    """
+    Tests that prices and quantities are declared real and counts integer, and that
+    appending to a parquet dataset holding ISO text timestamps fails clearly.
+    """
+    from kracked.io import KrackedDB
+
+    db = KrackedDB(str(tmp_path / "types.db"), index_mode="manual")
+    db.connect()
+    db.create_table("L2", depth=2)
+    db.create_table("OHLC", depth=None)
+    types = dict((row[1], row[2].lower()) for row in db.cur.execute("PRAGMA table_info(L2)"))
+    assert types["symbol"] == "text" and types["ts_recv"] == "text" and types["bid_px_0"] == "real"
+    types = dict((row[1], row[2].lower()) for row in db.cur.execute("PRAGMA table_info(OHLC)"))
+    assert types["close"] == "real" and types["trades"] == "integer"
+    db.safe_disconnect()
+
+    # Older versions wrote the L2 parquet timestamps as ISO text.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    root = tmp_path / "L2_BTC_USD_orderbook.parquet"
+    root.mkdir()
+    pq.write_table(pa.table({"timestamp": ["2026-10-17T00:00:00.000000Z"], "ts_recv": ["2026-10-17T00:00:00.000100Z"]}),
+                   str(root / "old.parquet"))
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="parquet")
+    with pytest.raises(ValueError, match="migrate"):
+        writer._dispatch(_l2_payload(_filled_book(), 1))
+    writer.close()
+
+
+def test_kracked_reader(tmp_path):
+    """
+    Tests that KrackedReader finds and filters the outputs of every mode a writer used.
+    """
+    from kracked.buffers import ColumnarBuffer, TRADE_COLUMNS
+    from kracked.reader import KrackedReader
+
+    start = 1_792_195_200_000_000_000  # 2026-10-17T00:00:00Z
+    trades = ColumnarBuffer(TRADE_COLUMNS)
+    for i in range(6):
+        trades.append([f"2026-10-17T00:00:0{i}.000000Z", start + i * 10**9, ["BTC/USD", "ETH/USD"][i % 2],
+                       100.0 + i, 0.5, "buy", "limit", i])
+    book = _filled_book()
+    payloads = [
+        {"channel": "trades", "batch": trades.to_record_batch()},
+        {"channel": "L1", "rows": [[start + i * 10**9, "BTC/USD"] + [float(i)] * 11 for i in range(4)]},
+    ] + [dict(_l2_payload(book, i), symbol=symbol, ts_recv=start + i * 10**9) for i in range(4) for symbol in ["BTC/USD", "ETH/USD"]]
+
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="sql",
+                           channel_modes={"trades": "parquet", "L2": "csv"})
+    writer._dispatch_many(payloads)
+    writer.close()
+
+    reader = KrackedReader(str(tmp_path))
+    assert reader.channels() == {"L1": ["sql"], "L2": ["csv"], "trades": ["parquet"]}
+
+    df = reader.read("trades", "ETH/USD", start="2026-10-17T00:00:02", columns=["price"])
+    assert list(df.columns) == ["price"] and list(df["price"]) == [103.0, 105.0]
+
+    df = reader.read("L2", ["ETH/USD"], end=start + 2 * 10**9)
+    assert list(df["symbol"]) == ["ETH/USD"] * 3 and df["ask_px_0"][0] == 101.0
+
+    df = reader.read("L1", "BTC/USD", start=start + 10**9, end="2026-10-17T00:00:02")
+    assert list(df["bid"]) == [1.0, 2.0]
+
+    batches = list(reader.read("L2", batches=True, batch_size=3))
+    assert [len(b) for b in batches] == [3, 1, 3, 1]
+    reader.close()
+
+
+def test_kracked_reader_live(tmp_path):
+    """
+    Tests that KrackedReader reads next to a writer holding an open transaction,
+    without creating indexes, and that ISO end bounds include the rows equal to them.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from kracked.reader import KrackedReader, read_parquet
+
+    start = 1_792_195_200_000_000_000  # 2026-10-17T00:00:00Z
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="sql")
+    writer._dispatch_many([{"channel": "L1", "rows": [[start + i * 10**9, "BTC/USD"] + [float(i)] * 11 for i in range(4)]}])
+    writer.commit()
+    writer._dispatch_many([{"channel": "L1", "rows": [[start + 9 * 10**9, "BTC/USD"] + [9.0] * 11]}])
+
+    reader = KrackedReader(str(tmp_path))
+    df = reader.read("L1", "BTC/USD", end="2026-10-17T00:00:02")
+    assert list(df["bid"]) == [0.0, 1.0, 2.0]
+    reader.close()
+    indexes = "SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'L1_symbol_time'"
+    assert writer.db.cur.execute(indexes).fetchall() == []
+    writer.close()
+
+    # Datasets written before timestamps were stored as timestamps hold ISO text.
+    path = tmp_path / "old.parquet"
+    path.mkdir()
+    pq.write_table(pa.table({"ts_event": [f"2026-10-17T00:00:0{i}.000000000Z" for i in range(4)],
+                             "price": [float(i) for i in range(4)]}), str(path / "part-0.parquet"))
+    df = read_parquet(str(path), end="2026-10-17T00:00:02", time_column="ts_event")
+    assert list(df["price"]) == [0.0, 1.0, 2.0]
+
+
+def test_parquet_manifest(tmp_path):
+    """
+    Tests that the parquet manifest tracks the files of a dataset through writes and
+    compaction, and that the reader skips the files it rules out.
+    """
+    import json
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from kracked.buffers import ColumnarBuffer, TRADE_COLUMNS
+    from kracked.compact import compact_dataset
+    from kracked.reader import read_parquet
+
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="parquet",
+                           parquet_manifest=True)
+    for hour, symbol in [(10, "BTC/USD"), (11, "ETH/USD"), (12, "BTC/USD")]:
+        trades = ColumnarBuffer(TRADE_COLUMNS)
+        for i in range(3):
+            trades.append((f"2026-10-17T{hour}:00:0{i}Z", 0, symbol, 100.0 + i, 1.0, "buy", "limit", hour * 10 + i))
+        writer._dispatch({"channel": "trades", "batch": trades.to_record_batch()})
+
+    # Each write appends to the journal, folded into the manifest on close.
+    root = tmp_path / "trades.parquet"
+    assert len((root / "_manifest.journal").read_text().splitlines()) == 3
+    writer.close()
+    assert not (root / "_manifest.journal").exists()
+    files = json.loads((root / "_manifest.json").read_text())["files"]
+    assert sorted(files) == sorted(f.name for f in root.glob("*.parquet"))
+    entry = next(e for e in files.values() if e["symbols"] == ["ETH/USD"])
+    assert entry["rows"] == 3
+    assert entry["ts_event"] == [pd.Timestamp("2026-10-17T11:00:00Z").value, pd.Timestamp("2026-10-17T11:00:02Z").value]
+
+    # Rewrite the 10:00 file with rows inside the query window. The manifest still
+    # rules it out, so the reader never opens it.
+    first = next(name for name, e in files.items() if e["ts_event"][0] == pd.Timestamp("2026-10-17T10:00:00Z").value)
+    table = pq.read_table(root / first)
+    inside = pa.array([pd.Timestamp("2026-10-17T12:00:01Z").value] * 3, pa.timestamp("ns", tz="UTC"))
+    pq.write_table(table.set_column(0, "ts_event", inside), root / first)
+    df = read_parquet(str(root), start="2026-10-17T11:30:00")
+    assert sorted(df["trade_id"]) == [120, 121, 122]
+
+    assert compact_dataset(str(root), min_age=0) == 3
+    files = json.loads((root / "_manifest.json").read_text())["files"]
+    assert sorted(files) == sorted(f.name for f in root.glob("*.parquet"))
+    assert [e["rows"] for e in files.values()] == [9] and files[next(iter(files))]["symbols"] == ["BTC/USD", "ETH/USD"]
+
+
+def _ohlc_update(begin, close, i):
+    end = begin.replace(":00:00", ":05:00")
+    return {"channel": "OHLC", "mode": "update", "interval": 5, "rows": [
+        [end, "BTC/USD", 100.0, 110.0, 90.0, close, 1.0 + i, 100.0, i, begin, f"2026-10-17T00:0{i}:00.000000Z"],
+    ]}
+
+
+@pytest.mark.parametrize("mode,live", [("sql", False), ("sql", True), ("csv", False), ("csv", True)])
+def test_ohlc_final_bars(tmp_path, mode, live):
+    """
+    Tests that ohlc_storage="final" keeps only the last state of each bar, whether its
+    interval_begin has 6 (ccxt) or 9 (websocket) fractional digits.
+    """
+    from kracked.reader import KrackedReader
+
+    first, second = "2026-10-17T00:00:00.000000Z", "2026-10-17T01:00:00.000000Z"
+    payloads = [_ohlc_update(first if i == 0 else "2026-10-17T00:00:00.000000000Z", 100.0 + i, i) for i in range(3)]
+    payloads += [_ohlc_update(second, 200.0 + i, 3 + i) for i in range(2)]
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode=mode,
+                           ohlc_storage="final", ohlc_live=live)
+    for payload in payloads:
+        writer._dispatch(payload)
+    writer.commit()
+    writer.flush_csv()
+
+    reader = KrackedReader(str(tmp_path))
+    bars = reader.read("OHLC_bars")
+    if live:
+        assert list(bars["close"]) == [102.0]
+        assert list(reader.read("OHLC_live")["close"]) == [201.0]
+    elif mode == "sql":
+        assert list(bars["close"]) == [102.0, 201.0]
+    reader.close()
+    writer.close()
+
+    bars = KrackedReader(str(tmp_path)).read("OHLC_bars", "BTC/USD", start="2026-10-17T00:30:00")
+    assert list(bars["close"]) == [201.0] and list(bars["trades"]) == [4] and list(bars["interval"]) == [5]
+    assert not os.path.exists(tmp_path / "OHLC.csv")
+
+
+@pytest.mark.parametrize("layout", ["long", "blob"])
+def test_sql_book_index_on_close(tmp_path, layout):
+    """
+    Tests that the book indexes of the long and blob L2 layouts are deferred to close()
+    with sql_index_mode="on_close".
+    """
+    book = _filled_book()
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="sql", L2_sql_layout=layout)
+    for i in range(3):
+        writer._dispatch(_l2_payload(book, i))
+    writer.commit()
+    indexes = "SELECT name FROM sqlite_master WHERE type = 'index'"
+    assert writer.db.cur.execute(indexes).fetchall() == []
+    db_name = writer.db.db_name
+    writer.close()
+
+    with sqlite3.connect(db_name) as con:
+        assert (f"L2_{layout}_book",) in con.execute(indexes).fetchall()
+
+
+def test_sql_lock_retry(tmp_path):
+    """
+    Tests that the KrackedWriter retries SQL writes failing with "database is locked"
+    instead of dying.
+    """
+    writer = KrackedWriter(queue.Queue(), output_directory=str(tmp_path), output_mode="sql",
+                           sql_retry_wait=0)
+    rows = [[1_792_195_200_000_000_000, "BTC/USD"] + [1.0] * 11]
+    calls = []
+    write_group = writer._write_group
+
+    def locked_once(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        write_group(*args)
+
+    writer._write_group = locked_once
+    writer._dispatch_many([{"channel": "L1", "rows": rows}])
+    writer.commit()
+    assert len(calls) == 2 and writer.failed_writes == 0
+    assert len(writer.db.read("L1")) == 1
+    writer.close()